@@ -23,7 +23,7 @@ from ui.database import init_db
 init_db()
 
 # Import Brain
-from brain_learning import LearningBrain
+from brain_learning import LearningBrain, DEFAULT_STORE_PATH
 from multimodal_voice_integration import MultimodalVoiceIntegrator
 
 # --- LOGGER SETUP ---
@@ -107,7 +107,7 @@ def initialize_session_tracking():
 @st.cache_resource
 def initialize_brain_components():
     """Initialize AI brain components (cached to prevent reinitalization)."""
-    learning_brain = LearningBrain()
+    learning_brain = LearningBrain(store_path=DEFAULT_STORE_PATH)
     multimodal_voice_integrator = MultimodalVoiceIntegrator()
     logger.info("Brain components initialized and cached")
     return learning_brain, multimodal_voice_integrator
@@ -3,9 +3,81 @@ AI Brain Module - Combines multiple AI models and internet knowledge
 """
 import asyncio
 import json
-from typing import Any, Dict, List
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
 from datetime import datetime
 
+from page_fetch import get_page_fetcher
+from prompt_cache import (
+    anthropic_request, openai_messages, openai_stream_kwargs,
+    report_usage, usage_from_anthropic, usage_from_google, usage_from_openai,
+)
+from provider_clients import OPENAI_COMPATIBLE_BASE_URLS, get_client
+from response_cache import get_response_cache, replay_chunks, request_key
+from search_cache import cached_search
+
+# The provider SDKs are blocking, so each model runs on a worker thread;
+# the pool bounds how many provider calls are in flight at once (hedges included).
+MAX_PROVIDER_WORKERS = 16
+_provider_executor = ThreadPoolExecutor(max_workers=MAX_PROVIDER_WORKERS, thread_name_prefix="brain-provider")
+
+# Brain Mode SLA defaults (seconds); None disables a limit
+DEFAULT_DEADLINE = 45.0
+DEFAULT_PROVIDER_TIMEOUT = 30.0
+# A provider is hedged once it has this many samples and a p95 above the threshold
+HEDGE_MIN_SAMPLES = 5
+HEDGE_P95_THRESHOLD = 8.0
+LATENCY_WINDOW = 100
+
+
+class ProviderLatencyTracker:
+    """Rolling window of successful response times per provider"""
+    
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, provider: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+    
+    def count(self, provider: str) -> int:
+        with self._lock:
+            return len(self._samples.get(provider, ()))
+    
+    def quantile(self, provider: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+    
+    def hedge_delay(self, provider: str) -> Optional[float]:
+        """Seconds to wait before sending a duplicate request, or None to not hedge.
+
+        Only tail-heavy providers are hedged; the duplicate goes out once the
+        first attempt has outlived the provider's median latency.
+        """
+        if self.count(provider) < HEDGE_MIN_SAMPLES:
+            return None
+        p95 = self.quantile(provider, 0.95)
+        if p95 is None or p95 < HEDGE_P95_THRESHOLD:
+            return None
+        with self._lock:
+            return statistics.median(self._samples[provider])
+    
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+latency_tracker = ProviderLatencyTracker()
+
 
 class AIBrain:
     """
@@ -21,14 +93,17 @@ class AIBrain:
         try:
             from duckduckgo_search import DDGS  # type: ignore
             
+            def fetch():
+                with DDGS() as ddgs:
+                    return list(ddgs.text(query, max_results=num_results))
+            
             results = []
-            with DDGS() as ddgs:
-                for result in ddgs.text(query, max_results=num_results):
-                    results.append({
-                        'title': result.get('title', ''),
-                        'url': result.get('href', ''),
-                        'snippet': result.get('body', '')
-                    })
+            for result in cached_search(query, fetch, mode="web", max_results=num_results):
+                results.append({
+                    'title': result.get('title', ''),
+                    'url': result.get('href', ''),
+                    'snippet': result.get('body', '')
+                })
             return results
         except ImportError:
             return [{"error": "DuckDuckGo search not available. Install: pip install duckduckgo-search"}]
@@ -37,43 +112,29 @@ class AIBrain:
     
     def scrape_webpage(self, url: str) -> str:
         """Extract text content from a webpage"""
-        try:
-            import requests  # type: ignore
-            from bs4 import BeautifulSoup  # type: ignore
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Get text
-            text = soup.get_text()
-            
-            # Clean up text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
-            
-            # Limit to first 2000 characters
-            return text[:2000]
-        except Exception as e:
-            return f"Failed to scrape webpage: {str(e)}"
+        return self.scrape_webpages([url])[0]
+    
+    def scrape_webpages(self, urls: List[str], max_chars: int = 2000) -> List[str]:
+        """Extract text from several webpages concurrently, in the order given"""
+        texts = get_page_fetcher().fetch_texts(urls, max_chars=max_chars)
+        return [text if text is not None else "Failed to scrape webpage" for text in texts]
     
-    def gather_internet_context(self, query: str) -> str:
-        """Gather context from internet for the query"""
+    def gather_internet_context(self, query: str, deep: bool = False) -> str:
+        """Gather context from internet for the query; ``deep`` also reads the result pages"""
         if not self.internet_enabled:
             return ""
         
         # Search internet
         search_results = self.search_internet(query, num_results=3)
         
+        # Deep grounding: fetch every result page at once rather than one by one
+        excerpts: Dict[str, str] = {}
+        if deep:
+            urls = [r['url'] for r in search_results if 'error' not in r and r.get('url')]
+            for url, text in zip(urls, get_page_fetcher().fetch_texts(urls, max_chars=1500)):
+                if text:
+                    excerpts[url] = text
+        
         context = "\n\n--- INTERNET KNOWLEDGE ---\n"
         
         for i, result in enumerate(search_results, 1):
@@ -83,117 +144,368 @@ class AIBrain:
                 
             context += f"\n{i}. {result['title']}\n"
             context += f"   {result['snippet']}\n"
+            if result['url'] in excerpts:
+                context += f"   Page excerpt: {excerpts[result['url']]}\n"
             context += f"   Source: {result['url']}\n"
         
         return context
     
-    async def query_model(
+    def _stream_provider(
         self,
         provider: str,
         model_name: str,
         prompt: str,
         api_key: str,
-        config: Dict[str, Any]
-    ) -> Dict[str, str]:
-        """Query a single AI model"""
-        try:
-                        # Validate prompt is not empty
-            if not prompt or not prompt.strip():
-                return {
-                    "provider": provider,
-                    "model": model_name,
-                    "response": "Error: Prompt cannot be empty",
-                    "success": False
-                }
-            if provider == "google":
-                from google import genai
-                client = genai.Client(api_key=api_key)
-                
-                # New SDK doesn't accept config dict directly
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=[{"role": "user", "parts": [{"text": prompt}]}]
-                )
-                return {
-                    "provider": provider,
-                    "model": model_name,
-                    "response": response.text,
-                    "success": True
-                }
+        config: Dict[str, Any],
+        usage: Optional[Dict[str, int]] = None
+    ) -> Iterator[str]:
+        """Blocking generator of text chunks from a provider's streaming API
+        
+        Token usage (including prompt-cache hits) is written into ``usage``
+        when the provider reports it.
+        """
+        if usage is None:
+            usage = {}
+        if provider == "google":
+            client = get_client(provider, api_key)
             
-            elif provider in ["openai", "together", "xai", "deepseek"]:
-                from openai import OpenAI
-                
-                base_urls = {
-                    "together": "https://api.together.xyz/v1",
-                    "xai": "https://api.x.ai/v1",
-                    "deepseek": "https://api.deepseek.com"
-                }
-                
-                client = OpenAI(
-                    api_key=api_key,
-                    base_url=base_urls.get(provider)
-                )
-                
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=config.get("temperature", 0.7),
-                    max_tokens=config.get("max_output_tokens", 1024)
-                )
-                
-                return {
-                    "provider": provider,
-                    "model": model_name,
-                    "response": response.choices[0].message.content,
-                    "success": True
-                }
+            # New SDK doesn't accept config dict directly
+            for chunk in client.models.generate_content_stream(
+                model=model_name,
+                contents=[{"role": "user", "parts": [{"text": prompt}]}]
+            ):
+                if getattr(chunk, "usage_metadata", None):
+                    usage.update(usage_from_google(chunk.usage_metadata))
+                if chunk.text:
+                    yield chunk.text
+        
+        elif provider in OPENAI_COMPATIBLE_BASE_URLS:
+            client = get_client(provider, api_key)
             
-            elif provider == "anthropic":
-                from anthropic import Anthropic
-                client = Anthropic(api_key=api_key)
-                
-                response = client.messages.create(
-                    model=model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=config.get("max_output_tokens", 1024),
-                    temperature=config.get("temperature", 0.7)
-                )
-                
-                return {
-                    "provider": provider,
-                    "model": model_name,
-                    "response": response.content[0].text,
-                    "success": True
-                }
-                
+            stream = client.chat.completions.create(
+                model=model_name,
+                messages=openai_messages(turn=prompt),
+                temperature=config.get("temperature", 0.7),
+                max_tokens=config.get("max_output_tokens", 1024),
+                stream=True,
+                **openai_stream_kwargs(provider)
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage.update(usage_from_openai(chunk.usage))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        
+        elif provider == "anthropic":
+            client = get_client(provider, api_key)
+            
+            # Prompts that may be re-sent (hedged providers) are marked cacheable
+            with client.messages.stream(
+                model=model_name,
+                max_tokens=config.get("max_output_tokens", 1024),
+                temperature=config.get("temperature", 0.7),
+                **anthropic_request(turn=prompt, cache_turn=config.get("cache_prompt", False))
+            ) as stream:
+                for text in stream.text_stream:
+                    yield text
+                usage.update(usage_from_anthropic(stream.get_final_message().usage) or {})
+        
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+    
+    def _run_provider(
+        self,
+        provider: str,
+        model_name: str,
+        prompt: str,
+        api_key: str,
+        config: Dict[str, Any],
+        on_chunk: Optional[Callable[[str], None]] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """Drain one provider's stream on a worker thread, reporting chunks as they arrive
+        
+        With ``config["cache_responses"]`` an identical earlier answer is
+        replayed through ``on_chunk`` instead of calling the provider.
+        """
+        start = time.perf_counter()
+        cache_key = None
+        if config.get("cache_responses") and prompt and prompt.strip():
+            cache_key = self._response_cache_key(provider, model_name, prompt, config)
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                return self._replay_cached(provider, model_name, cached, on_chunk, start)
+        first_token = None
+        parts: List[str] = []
+        usage: Dict[str, int] = {}
+        interrupted = False
+        try:
+            # Validate prompt is not empty
+            if not prompt or not prompt.strip():
+                raise ValueError("Prompt cannot be empty")
+            for text in self._stream_provider(provider, model_name, prompt, api_key, config, usage):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                parts.append(text)
+                if on_chunk is not None:
+                    on_chunk(text)
+                if cancel is not None and cancel.is_set():
+                    interrupted = True
+                    break
+            success, response = True, "".join(parts)
         except Exception as e:
-            return {
-                "provider": provider,
-                "model": model_name,
-                "response": f"Error: {str(e)}",
-                "success": False
-            }
+            success, response = False, f"Error: {str(e)}"
+        response_time = time.perf_counter() - start
+        report_usage(provider, model_name, usage or None, response_time, success=success)
+        # Answers cut short by a deadline or a winning hedge are never cached
+        if cache_key is not None and success and not interrupted:
+            get_response_cache().put(cache_key, response, provider, model_name)
+        return {
+            "provider": provider,
+            "model": model_name,
+            "response": response,
+            "success": success,
+            "response_time": response_time,
+            "first_token_time": first_token
+        }
     
-    async def query_multiple_models(
+    @staticmethod
+    def _response_cache_key(provider: str, model_name: str, prompt: str, config: Dict[str, Any]) -> str:
+        return request_key(
+            provider, model_name, openai_messages(turn=prompt),
+            {"temperature": config.get("temperature", 0.7), "max_tokens": config.get("max_output_tokens", 1024)}
+        )
+    
+    @staticmethod
+    def _replay_cached(
+        provider: str,
+        model_name: str,
+        response: str,
+        on_chunk: Optional[Callable[[str], None]],
+        start: float
+    ) -> Dict[str, Any]:
+        """Result for a cached answer, streamed through ``on_chunk`` like a live one"""
+        if on_chunk is not None:
+            for text in replay_chunks(response):
+                on_chunk(text)
+        elapsed = time.perf_counter() - start
+        return {
+            "provider": provider,
+            "model": model_name,
+            "response": response,
+            "success": True,
+            "response_time": elapsed,
+            "first_token_time": elapsed,
+            "cached": True
+        }
+    
+    async def query_model(
         self,
+        provider: str,
+        model_name: str,
+        prompt: str,
+        api_key: str,
+        config: Dict[str, Any],
+        on_chunk: Optional[Callable[[str], None]] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """Query a single AI model without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _provider_executor,
+            self._run_provider, provider, model_name, prompt, api_key, config, on_chunk, cancel
+        )
+    
+    async def _query_with_policy(
+        self,
+        model_info: Dict[str, Any],
         query: str,
-        models: List[Dict[str, Any]],
-        config: Dict[str, Any]
-    ) -> List[Dict[str, str]]:
-        """Query multiple AI models in parallel"""
-        tasks = []
-        for model_info in models:
-            task = self.query_model(
-                provider=model_info["provider"],
+        config: Dict[str, Any],
+        sink: Callable[[int], Callable[[str], None]],
+        timeout: Optional[float],
+        hedge: bool
+    ) -> Dict[str, Any]:
+        """One model under a per-provider timeout, with an optional hedged duplicate"""
+        loop = asyncio.get_running_loop()
+        provider = model_info["provider"]
+        stop = threading.Event()  # stops this model's attempts, also when the task is cancelled
+        
+        def launch(attempt: int) -> asyncio.Task:
+            return asyncio.create_task(self.query_model(
+                provider=provider,
                 model_name=model_info["model"],
                 prompt=query,
                 api_key=model_info["api_key"],
-                config=config
+                config=attempt_config,
+                on_chunk=sink(attempt),
+                cancel=stop
+            ))
+        
+        started = loop.time()
+        timeout_at = started + timeout if timeout is not None else None
+        hedge_at = None
+        if hedge:
+            delay = latency_tracker.hedge_delay(provider)
+            if delay is not None:
+                hedge_at = started + delay
+        # A hedged duplicate re-sends the same prompt, so let it hit the prompt cache
+        attempt_config = dict(config, cache_prompt=True) if hedge_at is not None else config
+        
+        pending = {launch(0)}
+        attempts = 1
+        failure: Optional[Dict[str, Any]] = None
+        try:
+            while pending:
+                wake_points = [t for t in (timeout_at, hedge_at) if t is not None]
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(0.0, min(wake_points) - loop.time()) if wake_points else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    result = task.result()
+                    if result["success"]:
+                        # Cache replays say nothing about the provider's latency
+                        if not result.get("cached"):
+                            latency_tracker.record(provider, result["response_time"])
+                        result["attempts"] = attempts
+                        result["hedged"] = attempts > 1
+                        return result
+                    failure = result
+                if hedge_at is not None and loop.time() >= hedge_at:
+                    hedge_at = None
+                    if pending:
+                        pending.add(launch(attempts))
+                        attempts += 1
+                if timeout_at is not None and loop.time() >= timeout_at and pending:
+                    return {
+                        "provider": provider,
+                        "model": model_info["model"],
+                        "response": f"Error: timed out after {timeout:.0f}s",
+                        "success": False,
+                        "timed_out": True,
+                        "response_time": loop.time() - started,
+                        "first_token_time": None,
+                        "attempts": attempts,
+                        "hedged": attempts > 1
+                    }
+            failure["attempts"] = attempts
+            failure["hedged"] = attempts > 1
+            return failure
+        finally:
+            stop.set()
+    
+    async def stream_multiple_models(
+        self,
+        query: str,
+        models: List[Dict[str, Any]],
+        config: Dict[str, Any],
+        deadline: Optional[float] = DEFAULT_DEADLINE,
+        provider_timeout: Optional[float] = DEFAULT_PROVIDER_TIMEOUT,
+        quorum: Optional[int] = None,
+        hedge: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Query models concurrently and yield their output as one interleaved stream.
+
+        Events are ``{"type": "chunk", "index", "provider", "model", "text"}``
+        for each streamed piece and ``{"type": "result", "index", "result"}``
+        once a model finishes; ``index`` is the model's position in ``models``.
+
+        The stream ends early once ``quorum`` models have succeeded or the
+        overall ``deadline`` passes. Models still running at that point get a
+        result with ``late=True`` holding whatever they had streamed so far.
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        
+        def chunk_sink(index: int, model_info: Dict[str, Any]) -> Callable[[int], Callable[[str], None]]:
+            def for_attempt(attempt: int) -> Callable[[str], None]:
+                def emit(text: str):
+                    # Called on a worker thread; hop back onto the event loop
+                    loop.call_soon_threadsafe(events.put_nowait, {
+                        "type": "chunk",
+                        "index": index,
+                        "attempt": attempt,
+                        "provider": model_info["provider"],
+                        "model": model_info["model"],
+                        "text": text
+                    })
+                return emit
+            return for_attempt
+        
+        async def run(index: int, model_info: Dict[str, Any]):
+            result = await self._query_with_policy(
+                model_info, query, config, chunk_sink(index, model_info), provider_timeout, hedge
             )
-            tasks.append(task)
+            events.put_nowait({"type": "result", "index": index, "result": result})
         
-        results = await asyncio.gather(*tasks)
+        tasks = [asyncio.create_task(run(i, model_info)) for i, model_info in enumerate(models)]
+        deadline_at = loop.time() + deadline if deadline is not None else None
+        stream_owner: Dict[int, int] = {}  # index -> attempt whose chunks are forwarded
+        partial: Dict[int, List[str]] = {}
+        finished = set()
+        successes = 0
+        try:
+            while len(finished) < len(tasks):
+                if quorum is not None and successes >= quorum:
+                    break
+                try:
+                    remaining = deadline_at - loop.time() if deadline_at is not None else None
+                    if remaining is not None and remaining <= 0:
+                        break
+                    event = await asyncio.wait_for(events.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                index = event["index"]
+                if event["type"] == "chunk":
+                    if index in finished or stream_owner.setdefault(index, event["attempt"]) != event["attempt"]:
+                        continue
+                    partial.setdefault(index, []).append(event["text"])
+                else:
+                    finished.add(index)
+                    if event["result"]["success"]:
+                        successes += 1
+                yield event
+            
+            # Quorum reached or deadline passed: report stragglers as late
+            for index, model_info in enumerate(models):
+                if index in finished:
+                    continue
+                yield {"type": "result", "index": index, "result": {
+                    "provider": model_info["provider"],
+                    "model": model_info["model"],
+                    "response": "".join(partial.get(index, [])),
+                    "success": False,
+                    "late": True,
+                    "response_time": None,
+                    "first_token_time": None
+                }}
+        finally:
+            # Cancelling a model's task stops its worker threads reading their streams
+            for task in tasks:
+                task.cancel()
+    
+    async def query_multiple_models(
+        self,
+        query: str,
+        models: List[Dict[str, Any]],
+        config: Dict[str, Any],
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+        deadline: Optional[float] = DEFAULT_DEADLINE,
+        provider_timeout: Optional[float] = DEFAULT_PROVIDER_TIMEOUT,
+        quorum: Optional[int] = None,
+        hedge: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Query multiple AI models in parallel, results in the order of ``models``"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(models)
+        async for event in self.stream_multiple_models(
+            query, models, config,
+            deadline=deadline, provider_timeout=provider_timeout, quorum=quorum, hedge=hedge
+        ):
+            if on_event is not None:
+                on_event(event)
+            if event["type"] == "result":
+                results[event["index"]] = event["result"]
         return results
     
     def synthesize_responses(
@@ -215,13 +527,22 @@ class AIBrain:
         synthesis += "## AI Model Responses\n\n"
         
         successful_responses = [r for r in model_responses if r.get("success")]
+        late_responses = [r for r in model_responses if r.get("late")]
         
         for i, response in enumerate(successful_responses, 1):
             synthesis += f"### {i}. {response['provider'].upper()} - {response['model']}\n"
             synthesis += f"{response['response']}\n\n"
         
+        # Models still answering when the quorum or deadline was reached
+        if late_responses:
+            synthesis += "\n## Late Responses (not included above)\n"
+            for response in late_responses:
+                preview = response.get('response', '').strip()
+                preview = f": {preview[:200]}..." if preview else ""
+                synthesis += f"- {response['provider']}/{response['model']} ⏱ late{preview}\n"
+        
         # Add failed models if any
-        failed_responses = [r for r in model_responses if not r.get("success")]
+        failed_responses = [r for r in model_responses if not r.get("success") and not r.get("late")]
         if failed_responses:
             synthesis += "\n## Failed Queries\n"
             for response in failed_responses:
@@ -231,6 +552,8 @@ class AIBrain:
         synthesis += "\n---\n\n"
         synthesis += f"**Total models consulted:** {len(model_responses)}\n"
         synthesis += f"**Successful responses:** {len(successful_responses)}\n"
+        if late_responses:
+            synthesis += f"**Late responses:** {len(late_responses)}\n"
         synthesis += f"**Internet search:** {'✓ Enabled' if internet_context else '✗ Disabled'}\n"
         
         return synthesis
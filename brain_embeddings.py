@@ -0,0 +1,260 @@
+"""
+Dense embedding index for learned knowledge (CPU-only, optional NumPy)
+Vectors live in a float32 matrix that can be memory-mapped to disk, and
+queries are scored with batched cosine similarity. Without NumPy the
+index is unavailable and LearningBrain falls back to BM25 alone.
+"""
+import logging
+import os
+import zlib
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from brain_index import tokenize
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_AVAILABLE = np is not None
+DEFAULT_DIM = 384
+INITIAL_CAPACITY = 1024
+SEARCH_BLOCK_ROWS = 65536  # rows scored per matmul, bounds temporary memory
+LOCAL_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+HASHING_FEATURES_VERSION = 1  # bump when HashingEmbedder's features change
+
+
+class HashingEmbedder:
+    """Offline embedder: signed feature hashing of stemmed words, word bigrams and char trigrams."""
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+        self.identity = f"hashing-v{HASHING_FEATURES_VERSION}"
+
+    def _features(self, text: str) -> List[str]:
+        words = tokenize(text)
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        # Character trigrams catch spelling variants the stemmer misses
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def __call__(self, texts: Sequence[str]) -> "np.ndarray":
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            # crc32 rather than hash(): stable across processes, so stored vectors stay valid
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features),
+                                 dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], (hashes % self.dim).astype(np.intp), signs)
+        return normalize_rows(matrix)
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model on CPU; only uses weights already on disk."""
+
+    def __init__(self, model_name: str = LOCAL_MODEL_NAME):
+        from sentence_transformers import SentenceTransformer  # type: ignore
+        self.model = SentenceTransformer(model_name, device="cpu", local_files_only=True)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.identity = f"sentence-transformers:{model_name}"
+
+    def __call__(self, texts: Sequence[str]) -> "np.ndarray":
+        vectors = self.model.encode(list(texts), batch_size=32, convert_to_numpy=True,
+                                    normalize_embeddings=True, show_progress_bar=False)
+        return vectors.astype(np.float32, copy=False)
+
+
+def get_default_embedder() -> Callable[[Sequence[str]], "np.ndarray"]:
+    """Local model when it is installed and cached, otherwise the hashing vectorizer."""
+    try:
+        return SentenceTransformerEmbedder()
+    except Exception as e:
+        logger.info(f"Using hashing embedder ({e.__class__.__name__}: local model unavailable)")
+        return HashingEmbedder()
+
+
+def embedder_identity(embedder: Callable) -> str:
+    """Name that changes whenever an embedder would produce different vectors."""
+    identity = getattr(embedder, "identity", None)
+    if not identity:
+        identity = getattr(embedder, "__qualname__", None) or type(embedder).__qualname__
+    return "".join(identity.split())
+
+
+def normalize_rows(matrix: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    return matrix / norms
+
+
+class EmbeddingIndex:
+    """Append-only float32 vector index with cosine top-k.
+
+    With ``path`` the matrix is a memory-mapped file (``path``) plus a
+    line-per-row key file (``path + '.keys'``), so vectors are embedded once
+    and reused across restarts. The key file's header records the
+    embedder identity and dimension; files written by another embedder are
+    discarded and re-embedded. Rows whose key is not passed to ``retain``
+    are ignored by searches.
+    """
+
+    def __init__(self, embedder: Optional[Callable] = None, path: Optional[str] = None):
+        if np is None:
+            raise RuntimeError("EmbeddingIndex requires numpy")
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.header = f"embedder={embedder_identity(self.embedder)} dim={self.dim}"
+        self.path = path
+        self._keys: List[Hashable] = []
+        self._rows: Dict[Hashable, int] = {}
+        self._active = np.zeros(0, dtype=bool)
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        if path:
+            self._open(path)
+        else:
+            self._reserve(INITIAL_CAPACITY)
+
+    def __len__(self) -> int:
+        return int(self._active[:len(self._keys)].sum())
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows
+
+    # --- Storage ---
+    @property
+    def _keys_path(self) -> str:
+        return self.path + ".keys"
+
+    def _open(self, path: str):
+        keys: List[str] = []
+        if os.path.exists(path) and os.path.exists(self._keys_path):
+            with open(self._keys_path, "r", encoding="utf-8") as f:
+                header = f.readline().strip()
+                if header == self.header:
+                    keys = [line.rstrip("\n") for line in f]
+        rows_on_disk = os.path.getsize(path) // (4 * self.dim) if os.path.exists(path) else 0
+        if not keys or rows_on_disk < len(keys):
+            # Missing, truncated, or written by another embedder: start over
+            keys = []
+            with open(self._keys_path, "w", encoding="utf-8") as f:
+                f.write(f"{self.header}\n")
+            with open(path, "wb"):
+                pass
+        self._keys = keys
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._reserve(max(INITIAL_CAPACITY, len(keys)))
+        self._active[:len(keys)] = True
+
+    def _reserve(self, rows: int):
+        capacity = self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, INITIAL_CAPACITY)
+        if self.path:
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+            with open(self.path, "r+b") as f:
+                f.truncate(new_capacity * self.dim * 4)
+            self._matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+        else:
+            grown = np.zeros((new_capacity, self.dim), dtype=np.float32)
+            grown[:capacity] = self._matrix
+            self._matrix = grown
+        active = np.zeros(new_capacity, dtype=bool)
+        active[:capacity] = self._active
+        self._active = active
+
+    # --- Updates ---
+    def add_many(self, items: Iterable[Tuple[str, str]]) -> int:
+        """Embed and append (key, text) pairs not already indexed, in one batch. Returns rows added."""
+        pending: Dict[str, str] = {}
+        for key, text in items:
+            if key in self._rows:
+                self._active[self._rows[key]] = True
+            else:
+                pending.setdefault(key, text)
+        if not pending:
+            return 0
+
+        vectors = np.asarray(self.embedder(list(pending.values())), dtype=np.float32)
+        start = len(self._keys)
+        end = start + len(pending)
+        self._reserve(end)
+        self._matrix[start:end] = vectors
+        self._active[start:end] = True
+        for offset, key in enumerate(pending):
+            self._rows[key] = start + offset
+        self._keys.extend(pending)
+
+        if self.path:
+            # Vectors first, keys second: a crash in between only leaves unreferenced rows
+            self._matrix.flush()
+            with open(self._keys_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key in pending)
+        return len(pending)
+
+    def add(self, key: str, text: str) -> bool:
+        return self.add_many([(key, text)]) == 1
+
+    def retain(self, keys: Iterable[Hashable]):
+        """Restrict searches to ``keys``; other rows stay on disk but are skipped."""
+        self._active[:] = False
+        rows = [self._rows[key] for key in keys if key in self._rows]
+        if rows:
+            self._active[np.asarray(rows, dtype=np.intp)] = True
+
+    def discard(self, key: Hashable):
+        row = self._rows.get(key)
+        if row is not None:
+            self._active[row] = False
+
+    # --- Queries ---
+    def search_batch(self, queries: Sequence[str], k: int = 3) -> List[List[Tuple[Hashable, float]]]:
+        """Top-k (key, cosine) pairs per query, best first."""
+        count = len(self._keys)
+        if not queries or k <= 0 or count == 0:
+            return [[] for _ in queries]
+        q = np.asarray(self.embedder(list(queries)), dtype=np.float32)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.intp)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, count)
+            scores = q @ self._matrix[start:end].T
+            inactive = ~self._active[start:end]
+            if inactive.any():
+                scores[:, inactive] = -np.inf
+            take = min(k, end - start)
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([
+                (self._keys[rows[i]], float(scores[i]))
+                for i in order if np.isfinite(scores[i]) and scores[i] > 0
+            ])
+        return results
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Hashable, float]]:
+        return self.search_batch([query], k)[0]
+
+    def close(self):
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._active = np.zeros(0, dtype=bool)
@@ -0,0 +1,134 @@
+"""
+Inverted keyword index with BM25 ranking for learned knowledge
+Used by LearningBrain.get_related_knowledge to find relevant past answers.
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'is', 'are', 'was',
+    'were', 'what', 'how', 'why', 'when', 'where', 'who', 'with', 'from', 'that', 'this',
+    'these', 'those', 'into', 'about', 'also', 'of', 'it', 'its', 'be', 'by', 'as', 'do',
+    'does', 'can', 'you', 'your', 'i', 'me', 'my', 'we', 'our', 'they', 'their', 'he', 'she',
+    'his', 'her', 'them', 'there', 'then', 'than', 'so', 'if', 'not', 'no', 'yes', 'will',
+    'would', 'should', 'could', 'have', 'has', 'had', 'been', 'being', 'which', 'some', 'any',
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Longest first; (suffix, replacement). A light Porter-style stripper: it only
+# has to map query and document words onto the same stem, not be linguistic.
+_SUFFIX_RULES = (
+    ("ational", "ate"), ("ization", "ize"), ("fulness", "ful"), ("iveness", "ive"),
+    ("ousness", "ous"), ("tional", "tion"), ("ements", "e"), ("ations", "ate"),
+    ("ation", "ate"), ("ement", "e"), ("ments", ""), ("ingly", ""), ("ness", ""),
+    ("ment", ""), ("ings", ""), ("edly", ""), ("ies", "y"), ("ied", "y"),
+    ("ing", ""), ("ers", ""), ("est", ""), ("ed", ""), ("er", ""), ("ly", ""),
+    ("es", ""), ("s", ""),
+)
+_MIN_STEM = 3
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Strip a common English suffix, keeping at least a three-letter stem."""
+    if len(word) <= _MIN_STEM or word.isdigit():
+        return word
+    for suffix, replacement in _SUFFIX_RULES:
+        if word.endswith(suffix):
+            base = word[:-len(suffix)]
+            if len(base) >= _MIN_STEM:
+                if suffix == "s" and base.endswith("s"):
+                    return word  # "class", "glass"
+                # "running" -> "runn" -> "run"
+                if replacement == "" and len(base) > _MIN_STEM and base[-1] == base[-2] and base[-1] not in "lsz":
+                    base = base[:-1]
+                return base + replacement
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords and single characters removed, stemmed."""
+    return [stem(t) for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """In-memory inverted index scored with Okapi BM25."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._doc_terms: Dict[Hashable, Tuple[str, ...]] = {}
+        self._doc_len: Dict[Hashable, int] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._doc_len
+
+    def add(self, doc_id: Hashable, text: str):
+        """Index (or re-index) a document."""
+        if doc_id in self._doc_len:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        self._doc_terms[doc_id] = tuple(counts)
+        self._doc_len[doc_id] = len(tokens)
+        self._total_len += len(tokens)
+
+    def add_many(self, docs: Iterable[Tuple[Hashable, str]]):
+        for doc_id, text in docs:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: Hashable):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+
+    def clear(self):
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_len.clear()
+        self._total_len = 0
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Hashable, float]]:
+        """Top-k (doc_id, score) pairs, best first."""
+        n_docs = len(self._doc_len)
+        if not n_docs or k <= 0:
+            return []
+        avgdl = self._total_len / n_docs or 1.0
+        k1, b = self.k1, self.b
+        norm = k1 * (1.0 - b)
+        scale = k1 * b / avgdl
+        doc_len = self._doc_len
+        scores: Dict[Hashable, float] = {}
+        get_score = scores.get
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf_k1 = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)) * (k1 + 1.0)
+            for doc_id, tf in postings.items():
+                scores[doc_id] = get_score(doc_id, 0.0) + idf_k1 * tf / (tf + norm + scale * doc_len[doc_id])
+
+        if not scores:
+            return []
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -2,16 +2,30 @@
 Enhanced AI Brain with Learning Capabilities
 Learns from model responses and improves over time
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime
 from dataclasses import dataclass, asdict
+import hashlib
 import json
+import logging
+import threading
+
+from brain_embeddings import EMBEDDINGS_AVAILABLE, EmbeddingIndex, get_default_embedder
+from brain_index import BM25Index
+from brain_store import LearningStore
+from search_cache import cached_search
+
+logger = logging.getLogger(__name__)
 
 # Limits to avoid unbounded growth
 MAX_HISTORY = 200
 MAX_KB_PER_TOPIC = 20
 SUCCESS_RATE_WEIGHT = 10  # weight multiplier for global success rate
 STATE_VERSION = 1
+DEFAULT_STORE_PATH = "learning_brain.db"
+VECTOR_FILE_SUFFIX = ".vectors"
+RRF_K = 60  # reciprocal rank fusion constant for merging keyword and vector hits
+MIN_SIMILARITY = 0.2  # cosine floor for vector-only hits
 
 
 def search_internet(query: str, max_results: int = 5) -> List[Dict[str, str]]:
@@ -19,15 +33,18 @@ def search_internet(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     try:
         from duckduckgo_search import DDGS  # type: ignore
         
-        with DDGS() as ddgs:
-            results = []
-            for result in ddgs.text(query, max_results=max_results):
-                results.append({
-                    'title': result.get('title', ''),
-                    'snippet': result.get('body', ''),
-                    'url': result.get('href', '')
-                })
-            return results
+        def fetch():
+            with DDGS() as ddgs:
+                return list(ddgs.text(query, max_results=max_results))
+        
+        results = []
+        for result in cached_search(query, fetch, mode="web", max_results=max_results):
+            results.append({
+                'title': result.get('title', ''),
+                'snippet': result.get('body', ''),
+                'url': result.get('href', '')
+            })
+        return results
     except ImportError:
         return [{'title': 'Error', 'snippet': 'DuckDuckGo search requires: pip install duckduckgo-search', 'url': ''}]
     except Exception as e:
@@ -68,11 +85,162 @@ class ConversationRecord:
 class LearningBrain:
     """AI Brain that learns from multiple models and internet"""
     
-    def __init__(self):
+    def __init__(self, store_path: Optional[str] = None, embedder: Optional[Callable] = None,
+                 semantic: bool = True):
         self.knowledge_base: Dict[str, List[KnowledgeEntry]] = {}  # Learned facts indexed by topic
         self.model_performance = {}  # Track success rates
         self.topic_expertise = {}  # Which models excel at which topics
         self.conversation_history: List[ConversationRecord] = []
+        # Optional SQLite store: topics are loaded on first use and every
+        # learning step writes only the rows it touched.
+        self.store: Optional[LearningStore] = None
+        self._loaded_topics = set()
+        # BM25 index over unique entries (query + answers), built on first recall
+        self._index = BM25Index()
+        self._indexed_entries: Dict[int, KnowledgeEntry] = {}
+        self._indexed_keys: Dict[tuple, int] = {}
+        self._fingerprints: Dict[str, int] = {}
+        self._next_doc_id = 0
+        self._index_ready = False
+        # The brain is shared across sessions: recall runs on pipeline threads
+        # while other sessions learn, so both indexes are only touched under this
+        self._index_lock = threading.RLock()
+        # Optional dense index (needs numpy); vectors are memory-mapped next to the store
+        self.semantic = semantic and EMBEDDINGS_AVAILABLE
+        self._embedder = embedder
+        self._embeddings: Optional[EmbeddingIndex] = None
+        if store_path:
+            self.attach_store(store_path)
+
+    def attach_store(self, path: str):
+        """Back this brain with a SQLite store; small tables load now, topics lazily."""
+        self.store = LearningStore(path)
+        self._loaded_topics = set()
+        self._reset_index()
+        self.knowledge_base = {}
+        self.topic_expertise = {}
+        self.model_performance = self.store.load_model_performance()
+        self.conversation_history = [
+            ConversationRecord(**record) for record in self.store.load_conversation_history(MAX_HISTORY)
+        ]
+
+    def _ensure_topic_loaded(self, topic: str):
+        if self.store is None or topic in self._loaded_topics:
+            return
+        self._loaded_topics.add(topic)
+        entries = self.store.load_topic(topic)
+        if entries:
+            self.knowledge_base[topic] = [KnowledgeEntry(**entry) for entry in entries]
+        expertise = self.store.load_topic_expertise(topic)
+        if expertise:
+            self.topic_expertise[topic] = expertise
+
+    def _reset_index(self):
+        with self._index_lock:
+            self._index.clear()
+            self._indexed_entries = {}
+            self._indexed_keys = {}
+            self._fingerprints = {}
+            self._next_doc_id = 0
+            self._index_ready = False
+            if self._embeddings is not None:
+                self._embeddings.close()
+                self._embeddings = None
+
+    @staticmethod
+    def _entry_fingerprint(entry: KnowledgeEntry) -> str:
+        return hashlib.sha1(f"{entry.query}\0{entry.timestamp}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _entry_text(entry: KnowledgeEntry) -> str:
+        # The question is repeated so it outweighs long answers
+        return f"{entry.query}\n{entry.query}\n" + "\n".join(entry.answers)
+
+    def _index_entry(self, entry: KnowledgeEntry) -> bool:
+        # The same entry is stored under every keyword of its query
+        key = (entry.query, entry.timestamp)
+        if key in self._indexed_keys:
+            return False
+        # Ids come from a counter so pruned entries never free an id for reuse
+        doc_id = self._next_doc_id
+        self._next_doc_id += 1
+        self._indexed_keys[key] = doc_id
+        self._indexed_entries[doc_id] = entry
+        self._fingerprints[self._entry_fingerprint(entry)] = doc_id
+        self._index.add(doc_id, self._entry_text(entry))
+        return True
+
+    def _prune_index(self, trimmed: List[KnowledgeEntry]):
+        """Drop trimmed entries that no topic holds any more from both indexes."""
+        if not self._index_ready or not trimmed:
+            return
+        keys = {(entry.query, entry.timestamp) for entry in trimmed}
+        if self.store is not None:
+            # The store also covers topics that are not loaded
+            live = self.store.stored_entries(keys)
+        else:
+            live = {(e.query, e.timestamp) for entries in self.knowledge_base.values() for e in entries}
+        with self._index_lock:
+            removed = 0
+            for key in keys - live:
+                doc_id = self._indexed_keys.pop(key, None)
+                if doc_id is None:
+                    continue
+                entry = self._indexed_entries.pop(doc_id)
+                self._fingerprints.pop(self._entry_fingerprint(entry), None)
+                self._index.remove(doc_id)
+                removed += 1
+            if removed and self._embeddings is not None:
+                self._embeddings.retain(self._fingerprints)
+
+    def _ensure_index(self):
+        if self._index_ready:
+            return
+        with self._index_lock:
+            # Concurrent first recalls build the index once
+            if self._index_ready:
+                return
+            if self.store is not None:
+                for entry in self.store.load_unique_entries():
+                    self._index_entry(KnowledgeEntry(**entry))
+            else:
+                for entries in list(self.knowledge_base.values()):
+                    for entry in list(entries):
+                        self._index_entry(entry)
+            self._build_embeddings()
+            self._index_ready = True
+
+    def _build_embeddings(self):
+        if not self.semantic:
+            return
+        try:
+            if self._embedder is None:
+                self._embedder = get_default_embedder()
+            path = self.store.path + VECTOR_FILE_SUFFIX if self.store is not None else None
+            self._embeddings = EmbeddingIndex(self._embedder, path=path)
+            # Only entries not already in the vector file get embedded
+            self._embeddings.add_many(
+                (key, self._entry_text(self._indexed_entries[doc_id])) for key, doc_id in self._fingerprints.items()
+            )
+            self._embeddings.retain(self._fingerprints)
+        except Exception as e:
+            logger.warning(f"Embedding index disabled: {e}")
+            self._embeddings = None
+            self.semantic = False
+
+    def _embed_entry(self, entry: KnowledgeEntry):
+        if self._embeddings is None:
+            return
+        try:
+            self._embeddings.add(self._entry_fingerprint(entry), self._entry_text(entry))
+        except Exception as e:
+            logger.warning(f"Failed to embed knowledge entry: {e}")
+
+    def _ensure_all_loaded(self):
+        if self.store is None:
+            return
+        for topic in set(self.store.topics()) | set(self.store.load_all_expertise()):
+            self._ensure_topic_loaded(topic)
         
     def _extract_keywords(self, text: str) -> List[str]:
         """Extract simple keywords by filtering stopwords and short tokens."""
@@ -111,10 +279,17 @@ class LearningBrain:
         keywords = self._extract_keywords(query)
         if not keywords:
             keywords = ['general']
+        for keyword in keywords:
+            self._ensure_topic_loaded(keyword)
         now_ts = datetime.now().isoformat()
         successful_models: List[str] = []
         successful_answers: List[str] = []
         success_count = 0
+        # Delta for the store: only what this call touches
+        new_entries = []
+        trimmed_entries: List[KnowledgeEntry] = []
+        expertise_hits = []
+        touched_providers = set()
 
         for response in model_responses:
             provider = response.get('provider', 'unknown')
@@ -131,6 +306,7 @@ class LearningBrain:
 
             perf = self.model_performance[provider]
             perf['total'] += 1
+            touched_providers.add(provider)
             
             # Track response time metrics
             if response_time > 0:
@@ -155,6 +331,7 @@ class LearningBrain:
                 for keyword in keywords:
                     expertise = self.topic_expertise.setdefault(keyword, {})
                     expertise[provider] = expertise.get(provider, 0) + 1
+                    expertise_hits.append((keyword, provider, 1))
 
         if successful_answers:
                 unique_models = list(dict.fromkeys(successful_models))
@@ -169,21 +346,43 @@ class LearningBrain:
                     if kb_entries and kb_entries[-1].query == entry.query and kb_entries[-1].answers == entry.answers:
                         continue
                     kb_entries.append(entry)
-                if len(kb_entries) > MAX_KB_PER_TOPIC:
-                    self.knowledge_base[keyword] = kb_entries[-MAX_KB_PER_TOPIC:]
+                    new_entries.append((keyword, asdict(entry)))
+                    with self._index_lock:
+                        if self._index_ready and self._index_entry(entry):
+                            self._embed_entry(entry)
+                    if len(kb_entries) > MAX_KB_PER_TOPIC:
+                        trimmed_entries.extend(kb_entries[:-MAX_KB_PER_TOPIC])
+                        self.knowledge_base[keyword] = kb_entries[-MAX_KB_PER_TOPIC:]
 
-        self.conversation_history.append(ConversationRecord(
+        record = ConversationRecord(
             query=query,
             timestamp=now_ts,
             models=[r.get('provider', 'unknown') for r in model_responses],
             success_count=success_count
-        ))
+        )
+        self.conversation_history.append(record)
         if len(self.conversation_history) > MAX_HISTORY:
             self.conversation_history = self.conversation_history[-MAX_HISTORY:]
+
+        if self.store is not None:
+            try:
+                self.store.record_learning(
+                    new_entries,
+                    expertise_hits,
+                    {provider: self.model_performance[provider] for provider in touched_providers},
+                    asdict(record),
+                    max_per_topic=MAX_KB_PER_TOPIC,
+                    max_history=MAX_HISTORY,
+                )
+            except Exception as e:
+                logger.error(f"Failed to persist learning delta: {e}")
+        self._prune_index(trimmed_entries)
     
     def recommend_models(self, query: str, available_models: List[str]) -> List[str]:
         """Recommend best models for a query using topic hits + global success rate."""
         keywords = self._extract_keywords(query)
+        for keyword in keywords:
+            self._ensure_topic_loaded(keyword)
         model_scores = {model: 0.0 for model in available_models}
 
         for model in available_models:
@@ -205,11 +404,14 @@ class LearningBrain:
         summary = []
         for model, perf in self.model_performance.items():
             success_rate = (perf['success'] / perf['total'] * 100) if perf['total'] else 0
-            top_topics = []
-            for topic, providers in self.topic_expertise.items():
-                if providers.get(model):
-                    top_topics.append((topic, providers[model]))
-            top_topics.sort(key=lambda x: x[1], reverse=True)
+            if self.store is not None:
+                top_topics = self.store.provider_top_topics(model, 5)
+            else:
+                top_topics = []
+                for topic, providers in self.topic_expertise.items():
+                    if providers.get(model):
+                        top_topics.append((topic, providers[model]))
+                top_topics.sort(key=lambda x: x[1], reverse=True)
             summary.append({
                 'model': model,
                 'success_rate': round(success_rate, 1),
@@ -221,20 +423,33 @@ class LearningBrain:
         return summary
     
     def get_related_knowledge(self, query: str, limit: int = 3) -> List[Dict]:
-        """Retrieve related knowledge from past conversations"""
-        keywords = self._extract_keywords(query)
-        related = []
-        
-        for keyword in keywords:
-            if keyword in self.knowledge_base:
-                related.extend(self.knowledge_base[keyword][-limit:])
-        related.sort(key=lambda x: x.timestamp if hasattr(x, 'timestamp') else '', reverse=True)
-        return [asdict(entry) for entry in related[:limit]]
+        """Retrieve the most relevant past knowledge.
+
+        Ranked by BM25 over queries and answers, fused with cosine similarity
+        from the embedding index when it is available.
+        """
+        self._ensure_index()
+        with self._index_lock:
+            if self._embeddings is None:
+                hits = self._index.search(query, k=limit)
+                return [asdict(self._indexed_entries[doc_id]) for doc_id, _ in hits]
+
+            # Reciprocal rank fusion over a deeper candidate list from each ranker
+            depth = max(limit * 3, 10)
+            fused: Dict[int, float] = {}
+            for rank, (doc_id, _) in enumerate(self._index.search(query, k=depth)):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank)
+            for rank, (key, similarity) in enumerate(self._embeddings.search(query, k=depth)):
+                doc_id = self._fingerprints.get(key)
+                if doc_id is not None and similarity >= MIN_SIMILARITY:
+                    fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank)
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+            return [asdict(self._indexed_entries[doc_id]) for doc_id, _ in ranked]
     
     def get_learning_stats(self) -> Dict:
         """Get statistics about what the brain has learned"""
         stats = {
-            'total_topics': len(self.knowledge_base),
+            'total_topics': self.store.topic_total() if self.store is not None else len(self.knowledge_base),
             'total_conversations': len(self.conversation_history),
             'models_tracked': len(self.model_performance),
             'model_performance': {},
@@ -264,8 +479,12 @@ class LearningBrain:
             }
         
         # Top topics
-        top_topics = sorted(self.knowledge_base.items(), key=lambda x: len(x[1]), reverse=True)[:10]
-        stats['top_topics'] = [{'topic': topic, 'count': len(entries)} for topic, entries in top_topics]
+        if self.store is not None:
+            top_counts = self.store.topic_counts(limit=10)
+        else:
+            top_topics = sorted(self.knowledge_base.items(), key=lambda x: len(x[1]), reverse=True)[:10]
+            top_counts = [(topic, len(entries)) for topic, entries in top_topics]
+        stats['top_topics'] = [{'topic': topic, 'count': count} for topic, count in top_counts]
         
         return stats
     
@@ -308,6 +527,8 @@ class LearningBrain:
         self.model_performance[provider]['total'] += 1
         if success:
             self.model_performance[provider]['success'] += 1
+        if self.store is not None:
+            self.store.save_model_performance(provider, self.model_performance[provider])
 
     def reset_learning(self):
         """Reset all learned data."""
@@ -315,9 +536,14 @@ class LearningBrain:
         self.model_performance = {}
         self.topic_expertise = {}
         self.conversation_history = []
+        self._reset_index()
+        if self.store is not None:
+            self.store.replace_all({}, {}, {}, [])
+            self._loaded_topics = set()
     
     def export_knowledge(self) -> str:
         """Export all learned knowledge as JSON"""
+        self._ensure_all_loaded()
         export_data = {
               'knowledge_base': {
                  topic: [asdict(entry) for entry in entries]
@@ -344,6 +570,16 @@ class LearningBrain:
             self.topic_expertise = data.get('topic_expertise', {})
             history = data.get('conversation_history', [])
             self.conversation_history = [ConversationRecord(**record) for record in history]
+            self._reset_index()
+            if self.store is not None:
+                self.store.replace_all(
+                    {topic: [asdict(e) for e in entries] for topic, entries in self.knowledge_base.items()},
+                    self.topic_expertise,
+                    self.model_performance,
+                    [asdict(record) for record in self.conversation_history],
+                )
+                # The store now mirrors memory; nothing left to lazy-load
+                self._loaded_topics = set(self.knowledge_base) | set(self.topic_expertise)
             return True
         except Exception:
             return False
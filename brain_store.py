@@ -0,0 +1,224 @@
+"""
+SQLite persistence for LearningBrain
+Stores knowledge, topic expertise, model stats and history as rows so each
+learning step writes only what it touched, and topics load on demand.
+"""
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS knowledge
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, query TEXT,
+        answers_json TEXT, timestamp TEXT, models_json TEXT)""",
+    "CREATE INDEX IF NOT EXISTS idx_knowledge_topic ON knowledge (topic, id)",
+    "CREATE INDEX IF NOT EXISTS idx_knowledge_entry ON knowledge (timestamp, query)",
+    """CREATE TABLE IF NOT EXISTS topic_expertise
+       (topic TEXT NOT NULL, provider TEXT NOT NULL, hits INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (topic, provider))""",
+    """CREATE TABLE IF NOT EXISTS model_performance
+       (provider TEXT PRIMARY KEY, stats_json TEXT)""",
+    """CREATE TABLE IF NOT EXISTS conversation_history
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT, timestamp TEXT,
+        models_json TEXT, success_count INTEGER)""",
+)
+
+
+class LearningStore:
+    """Row-level store backing a LearningBrain; safe to share across threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Reads ---
+    def load_topic(self, topic: str) -> List[Dict[str, Any]]:
+        """Knowledge rows for one topic, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, answers_json, timestamp, models_json FROM knowledge "
+                "WHERE topic = ? ORDER BY id ASC", (topic,)
+            ).fetchall()
+        return [
+            {'query': q, 'answers': json.loads(a), 'timestamp': ts, 'models_used': json.loads(m)}
+            for q, a, ts, m in rows
+        ]
+
+    def load_unique_entries(self) -> List[Dict[str, Any]]:
+        """Every stored knowledge entry once (entries are duplicated per topic), oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, answers_json, timestamp, models_json FROM knowledge "
+                "GROUP BY query, timestamp ORDER BY MIN(id)"
+            ).fetchall()
+        return [
+            {'query': q, 'answers': json.loads(a), 'timestamp': ts, 'models_used': json.loads(m)}
+            for q, a, ts, m in rows
+        ]
+
+    def stored_entries(self, keys: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+        """The (query, timestamp) pairs from ``keys`` that some topic still holds."""
+        found = set()
+        with self._lock:
+            for query, timestamp in set(keys):
+                if self._conn.execute(
+                    "SELECT 1 FROM knowledge WHERE timestamp = ? AND query = ? LIMIT 1", (timestamp, query)
+                ).fetchone():
+                    found.add((query, timestamp))
+        return found
+
+    def load_topic_expertise(self, topic: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT provider, hits FROM topic_expertise WHERE topic = ?", (topic,)
+            ).fetchall()
+        return dict(rows)
+
+    def load_all_expertise(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT topic, provider, hits FROM topic_expertise").fetchall()
+        expertise: Dict[str, Dict[str, int]] = {}
+        for topic, provider, hits in rows:
+            expertise.setdefault(topic, {})[provider] = hits
+        return expertise
+
+    def load_model_performance(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT provider, stats_json FROM model_performance").fetchall()
+        return {provider: json.loads(stats) for provider, stats in rows}
+
+    def load_conversation_history(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, timestamp, models_json, success_count FROM conversation_history "
+                "ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        rows.reverse()
+        return [
+            {'query': q, 'timestamp': ts, 'models': json.loads(m), 'success_count': sc}
+            for q, ts, m, sc in rows
+        ]
+
+    def provider_top_topics(self, provider: str, limit: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT topic, hits FROM topic_expertise WHERE provider = ? AND hits > 0 "
+                "ORDER BY hits DESC LIMIT ?", (provider, limit)
+            ).fetchall()
+
+    def topics(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT topic FROM knowledge")]
+
+    def topic_counts(self, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(topic, entries) pairs, largest first."""
+        sql = "SELECT topic, COUNT(*) AS n FROM knowledge GROUP BY topic ORDER BY n DESC"
+        params: Tuple = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def topic_total(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(DISTINCT topic) FROM knowledge").fetchone()[0]
+
+    # --- Writes ---
+    def record_learning(
+        self,
+        entries: Iterable[Tuple[str, Dict[str, Any]]],
+        expertise_hits: Iterable[Tuple[str, str, int]],
+        performance: Dict[str, Dict[str, Any]],
+        conversation: Optional[Dict[str, Any]],
+        max_per_topic: int,
+        max_history: int,
+    ):
+        """Apply the delta from one learning step in a single transaction."""
+        entries = list(entries)
+        with self._lock, self._conn:
+            for topic, entry in entries:
+                self._conn.execute(
+                    "INSERT INTO knowledge (topic, query, answers_json, timestamp, models_json) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (topic, entry['query'], json.dumps(entry['answers']),
+                     entry['timestamp'], json.dumps(entry['models_used']))
+                )
+            for topic in {topic for topic, _ in entries}:
+                self._conn.execute(
+                    "DELETE FROM knowledge WHERE topic = ? AND id NOT IN "
+                    "(SELECT id FROM knowledge WHERE topic = ? ORDER BY id DESC LIMIT ?)",
+                    (topic, topic, max_per_topic)
+                )
+            self._conn.executemany(
+                "INSERT INTO topic_expertise (topic, provider, hits) VALUES (?, ?, ?) "
+                "ON CONFLICT (topic, provider) DO UPDATE SET hits = hits + excluded.hits",
+                list(expertise_hits)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO model_performance (provider, stats_json) VALUES (?, ?)",
+                [(provider, json.dumps(stats)) for provider, stats in performance.items()]
+            )
+            if conversation is not None:
+                self._conn.execute(
+                    "INSERT INTO conversation_history (query, timestamp, models_json, success_count) "
+                    "VALUES (?, ?, ?, ?)",
+                    (conversation['query'], conversation['timestamp'],
+                     json.dumps(conversation['models']), conversation['success_count'])
+                )
+                self._conn.execute(
+                    "DELETE FROM conversation_history WHERE id NOT IN "
+                    "(SELECT id FROM conversation_history ORDER BY id DESC LIMIT ?)",
+                    (max_history,)
+                )
+
+    def save_model_performance(self, provider: str, stats: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO model_performance (provider, stats_json) VALUES (?, ?)",
+                (provider, json.dumps(stats))
+            )
+
+    def replace_all(
+        self,
+        knowledge_base: Dict[str, List[Dict[str, Any]]],
+        topic_expertise: Dict[str, Dict[str, int]],
+        model_performance: Dict[str, Dict[str, Any]],
+        conversation_history: List[Dict[str, Any]],
+    ):
+        """Overwrite the whole store (used by import and reset)."""
+        with self._lock, self._conn:
+            for table in ("knowledge", "topic_expertise", "model_performance", "conversation_history"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.executemany(
+                "INSERT INTO knowledge (topic, query, answers_json, timestamp, models_json) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(topic, e['query'], json.dumps(e['answers']), e['timestamp'], json.dumps(e['models_used']))
+                 for topic, entries in knowledge_base.items() for e in entries]
+            )
+            self._conn.executemany(
+                "INSERT INTO topic_expertise (topic, provider, hits) VALUES (?, ?, ?)",
+                [(topic, provider, hits)
+                 for topic, providers in topic_expertise.items() for provider, hits in providers.items()]
+            )
+            self._conn.executemany(
+                "INSERT INTO model_performance (provider, stats_json) VALUES (?, ?)",
+                [(provider, json.dumps(stats)) for provider, stats in model_performance.items()]
+            )
+            self._conn.executemany(
+                "INSERT INTO conversation_history (query, timestamp, models_json, success_count) "
+                "VALUES (?, ?, ?, ?)",
+                [(r['query'], r['timestamp'], json.dumps(r['models']), r['success_count'])
+                 for r in conversation_history]
+            )
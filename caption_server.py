@@ -0,0 +1,224 @@
+"""
+Shared captioning model server
+One process loads the captioning model and serves every Streamlit worker
+over local HTTP, with the same contract as a hosted caption API:
+POST an image as the ``image`` multipart field, get ``{"caption": ...}``
+back. Requests that arrive within a few milliseconds of each other, from
+any worker, are captioned in one batched forward pass.
+
+    python caption_server.py --port 8765 --backend int8
+
+Workers use it when CAPTION_SERVER_URL points at it (for example
+http://127.0.0.1:8765/caption).
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Callable, List, Optional, Sequence
+
+from captioning import DEFAULT_MODEL_ID, CaptionEngine, caption_backend, get_caption_cache, load_blip
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BATCH_SIZE = 8
+MAX_WAIT_SECONDS = 0.02  # how long the first request of a batch waits for company
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+REQUEST_TIMEOUT = 60
+
+
+class DynamicBatcher:
+    """Collects concurrent requests into batches for one captioning function."""
+
+    def __init__(self, caption_batch: Callable[[Sequence[Any]], List[Optional[str]]],
+                 max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT_SECONDS):
+        self.caption_batch = caption_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "errors": 0}
+        self._worker = threading.Thread(target=self._run, name="caption-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, image: Any) -> "Future[Optional[str]]":
+        future: "Future[Optional[str]]" = Future()
+        self._queue.put((image, future))
+        return future
+
+    def caption(self, image: Any, timeout: float = REQUEST_TIMEOUT) -> Optional[str]:
+        return self.submit(image).result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+        try:
+            captions = self.caption_batch([image for image, _ in batch])
+        except Exception as e:
+            logger.error(f"Caption batch failed: {e}")
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), caption in zip(batch, captions):
+            future.set_result(caption)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_batch_size"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+
+
+def decode_image(data: bytes) -> Any:
+    from PIL import Image
+    return Image.open(BytesIO(data)).convert("RGB")
+
+
+def multipart_field(content_type: str, body: bytes, name: str) -> Optional[bytes]:
+    """Raw bytes of one field of a multipart/form-data body."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    if not message.is_multipart():
+        return None
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == name:
+            return part.get_payload(decode=True)
+    return None
+
+
+class CaptionRequestHandler(BaseHTTPRequestHandler):
+    server: "CaptionServer"
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._reply(200, {"status": "ok", "model": self.server.model_tag, **self.server.batcher.stats()})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("", "/caption"):
+            self._reply(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length or length > MAX_UPLOAD_BYTES:
+            self._reply(413 if length else 400, {"error": "missing or oversized upload"})
+            return
+        body = self.rfile.read(length)
+        data = multipart_field(self.headers.get("Content-Type", ""), body, "image")
+        if not data:
+            self._reply(400, {"error": "expected an 'image' multipart field"})
+            return
+        try:
+            image = self.server.decode(data)
+        except Exception as e:
+            self._reply(400, {"error": f"unreadable image: {e}"})
+            return
+        try:
+            caption = self.server.batcher.caption(image)
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(200, {"caption": caption})
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class CaptionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, batcher: DynamicBatcher, decode: Callable[[bytes], Any] = decode_image,
+                 model_tag: str = DEFAULT_MODEL_ID):
+        super().__init__(address, CaptionRequestHandler)
+        self.batcher = batcher
+        self.decode = decode
+        self.model_tag = model_tag
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/caption"
+
+
+def build_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, backend: Optional[str] = None,
+                 max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT_SECONDS) -> CaptionServer:
+    """Server around one model load; the model is loaded before the first request is accepted."""
+    backend = backend or caption_backend()
+    resources = load_blip(DEFAULT_MODEL_ID, backend=backend)
+    model_tag = f"{DEFAULT_MODEL_ID}:{backend}"
+    engine = CaptionEngine(lambda: resources, get_caption_cache(), model_tag=model_tag,
+                           max_batch_size=max_batch_size)
+    batcher = DynamicBatcher(engine.caption_batch, max_batch_size=max_batch_size, max_wait=max_wait)
+    return CaptionServer((host, port), batcher, model_tag=model_tag)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared captioning model server")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", choices=["torch", "int8"], default=None,
+                        help="Model backend (default: CAPTION_BACKEND or torch)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_SECONDS * 1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = build_server(args.host, args.port, args.backend, args.max_batch, args.max_wait_ms / 1000)
+    logger.info(f"Caption server ({server.model_tag}) listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+
+
+if __name__ == "__main__":
+    main()
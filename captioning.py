@@ -0,0 +1,314 @@
+"""
+Batched, cached image captioning
+All images of a turn are captioned in one padded forward pass, captions
+are cached on disk by image content hash (so reruns and re-uploads cost
+nothing), and a process-wide semaphore bounds concurrent inference across
+Streamlit sessions. The model loader is injected, so this module does not
+depend on Streamlit or on how the model is cached.
+
+On CPU-only hosts the model can be loaded with dynamic int8 quantization
+of its Linear layers (CAPTION_BACKEND=int8), which roughly halves resident
+memory and speeds up generation; tests/benchmark_captioning.py compares
+latency, memory and caption agreement against the full-precision model.
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_ID = "Salesforce/blip-image-captioning-base"
+DEFAULT_DISK_PATH = "caption_cache.db"
+MAX_MEMORY_ENTRIES = 1024
+MAX_BATCH_SIZE = 8  # images per forward pass; bounds peak activation memory
+MAX_CONCURRENT_INFERENCE = 1  # forward passes in flight across all sessions
+MAX_NEW_TOKENS = 50
+BACKENDS = ("torch", "int8")
+DEFAULT_BACKEND = "torch"
+
+Loader = Callable[[], Tuple[Any, Any, Any]]  # -> (processor, model, device)
+
+# Shared by every engine in the process: CPU inference does not get faster
+# by running several passes at once, it just multiplies memory
+_inference_slots = threading.BoundedSemaphore(MAX_CONCURRENT_INFERENCE)
+
+
+def image_hash(image: Any) -> str:
+    """Content hash of the decoded pixels, so re-encoded copies of an image share a caption."""
+    hasher = hashlib.sha256()
+    if hasattr(image, "convert"):
+        rgb = image.convert("RGB")
+        hasher.update(f"{rgb.size[0]}x{rgb.size[1]}".encode("ascii"))
+        hasher.update(rgb.tobytes())
+    elif isinstance(image, (bytes, bytearray)):
+        hasher.update(image)
+    else:
+        raise TypeError(f"Cannot hash image of type {type(image).__name__}")
+    return hasher.hexdigest()
+
+
+class CaptionCache:
+    """Thread-safe caption store: memory LRU over a SQLite table, keyed by (model, image hash)."""
+
+    def __init__(self, disk_path: Optional[str] = DEFAULT_DISK_PATH, max_entries: int = MAX_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        if disk_path:
+            try:
+                self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self._disk.execute("PRAGMA journal_mode=WAL")
+                with self._disk:
+                    self._disk.execute(
+                        "CREATE TABLE IF NOT EXISTS caption_cache "
+                        "(key TEXT PRIMARY KEY, caption TEXT, created_at REAL)"
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Caption cache disk tier disabled: {e}")
+                self._disk = None
+
+    @staticmethod
+    def key(model_tag: str, digest: str) -> str:
+        return f"{model_tag}:{digest}"
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+        missing = [key for key in keys if key not in found]
+        if missing and self._disk is not None:
+            try:
+                with self._disk_lock:
+                    placeholders = ",".join("?" * len(missing))
+                    rows = self._disk.execute(
+                        f"SELECT key, caption FROM caption_cache WHERE key IN ({placeholders})", missing
+                    ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Caption cache read failed: {e}")
+                rows = []
+            with self._lock:
+                for key, caption in rows:
+                    found[key] = caption
+                    self._memory_put(key, caption)
+        return found
+
+    def put_many(self, captions: Dict[str, str]):
+        if not captions:
+            return
+        with self._lock:
+            for key, caption in captions.items():
+                self._memory_put(key, caption)
+        if self._disk is not None:
+            try:
+                now = time.time()
+                with self._disk_lock, self._disk:
+                    self._disk.executemany(
+                        "INSERT OR REPLACE INTO caption_cache (key, caption, created_at) VALUES (?, ?, ?)",
+                        [(key, caption, now) for key, caption in captions.items()]
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Caption cache write failed: {e}")
+
+    def _memory_put(self, key: str, caption: str):
+        self._memory[key] = caption
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            with self._disk_lock, self._disk:
+                self._disk.execute("DELETE FROM caption_cache")
+
+    def close(self):
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+
+def caption_backend() -> str:
+    """Backend named by CAPTION_BACKEND, or the full-precision default."""
+    backend = os.getenv("CAPTION_BACKEND", DEFAULT_BACKEND).strip().lower()
+    if backend not in BACKENDS:
+        logger.warning(f"Unknown caption backend {backend!r}, using {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    return backend
+
+
+def caption_server_url() -> Optional[str]:
+    """URL of a shared caption server (see caption_server.py), when CAPTION_SERVER_URL is set."""
+    return os.getenv("CAPTION_SERVER_URL", "").strip() or None
+
+
+def caption_threads() -> int:
+    """Intra-op threads for CPU inference: CAPTION_THREADS, else the CPUs this process may use."""
+    configured = os.getenv("CAPTION_THREADS", "")
+    if configured.isdigit() and int(configured) > 0:
+        return int(configured)
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def configure_cpu_threads(threads: int):
+    """One pool of intra-op threads per pass; inter-op parallelism only adds contention for generate()."""
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set before the first parallel op of the process
+        pass
+
+
+def quantize_int8(model: Any) -> Any:
+    """Dynamic int8 quantization of every Linear layer (weights int8, activations quantized per batch)."""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_blip(model_id: str = DEFAULT_MODEL_ID, backend: str = DEFAULT_BACKEND,
+              threads: Optional[int] = None) -> Tuple[Any, Any, str]:
+    """Load (processor, model, device), preferring the local model cache over a download.
+
+    ``int8`` applies only on CPU; with CUDA available the full-precision
+    model is used on the GPU.
+    """
+    from transformers import BlipForConditionalGeneration, BlipProcessor
+    import torch
+
+    def load_with_fallback(cls):
+        try:
+            return cls.from_pretrained(model_id, local_files_only=True)
+        except Exception:
+            return cls.from_pretrained(model_id, local_files_only=False)
+
+    processor = load_with_fallback(BlipProcessor)
+    model = load_with_fallback(BlipForConditionalGeneration)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if device == "cpu":
+        configure_cpu_threads(threads or caption_threads())
+        if backend == "int8":
+            model = quantize_int8(model)
+    elif backend == "int8":
+        logger.info("int8 captioning is CPU-only; using the full-precision model on CUDA")
+    model.to(device)
+    return processor, model.eval(), device
+
+
+def _no_grad():
+    try:
+        import torch  # type: ignore
+        return torch.inference_mode()
+    except ImportError:
+        return contextlib.nullcontext()
+
+
+class CaptionEngine:
+    """Captions many images per forward pass, skipping any whose caption is cached."""
+
+    def __init__(self, loader: Loader, cache: Optional[CaptionCache] = None, model_tag: str = DEFAULT_MODEL_ID,
+                 max_batch_size: int = MAX_BATCH_SIZE, max_new_tokens: int = MAX_NEW_TOKENS):
+        self.loader = loader
+        self.cache = cache if cache is not None else CaptionCache()
+        self.model_tag = f"{model_tag}:{max_new_tokens}"
+        self.max_batch_size = max_batch_size
+        self.max_new_tokens = max_new_tokens
+        self._stats_lock = threading.Lock()
+        self._stats = {"images": 0, "cache_hits": 0, "forward_passes": 0, "captioned": 0}
+
+    def caption(self, image: Any) -> Optional[str]:
+        return self.caption_batch([image])[0]
+
+    def caption_batch(self, images: Sequence[Any]) -> List[Optional[str]]:
+        """Captions in input order; None where an image could not be captioned."""
+        if not images:
+            return []
+        keys = [self.cache.key(self.model_tag, image_hash(image)) for image in images]
+        captions = self.cache.get_many(list(dict.fromkeys(keys)))
+        self._count(images=len(images), cache_hits=sum(1 for key in keys if key in captions))
+
+        # Identical images in one upload are captioned once
+        pending: Dict[str, Any] = {}
+        for key, image in zip(keys, images):
+            if key not in captions:
+                pending.setdefault(key, image)
+        if pending:
+            with _inference_slots:
+                # Another session may have captioned these while we waited
+                captions.update(self.cache.get_many(list(pending)))
+                todo = [(key, image) for key, image in pending.items() if key not in captions]
+                if todo:
+                    fresh = self._infer(todo)
+                    self.cache.put_many(fresh)
+                    captions.update(fresh)
+        return [captions.get(key) for key in keys]
+
+    def _infer(self, items: List[Tuple[str, Any]]) -> Dict[str, str]:
+        processor, model, device = self.loader()
+        fresh: Dict[str, str] = {}
+        for start in range(0, len(items), self.max_batch_size):
+            chunk = items[start:start + self.max_batch_size]
+            pixels = [image.convert("RGB") if hasattr(image, "convert") else image for _, image in chunk]
+            inputs = processor(images=pixels, return_tensors="pt", padding=True).to(device)
+            with _no_grad():
+                output_ids = model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+            texts = processor.batch_decode(output_ids, skip_special_tokens=True)
+            self._count(forward_passes=1, captioned=len(chunk))
+            for (key, _), text in zip(chunk, texts):
+                text = text.strip()
+                if text:
+                    fresh[key] = text
+        return fresh
+
+    def _count(self, **deltas: int):
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+_engines: Dict[Tuple[int, str], CaptionEngine] = {}
+_engines_lock = threading.Lock()
+_shared_cache: Optional[CaptionCache] = None
+
+
+def get_caption_cache() -> CaptionCache:
+    """Process-wide caption cache shared by every engine."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _engines_lock:
+            if _shared_cache is None:
+                _shared_cache = CaptionCache()
+    return _shared_cache
+
+
+def get_caption_engine(loader: Loader, model_tag: str = DEFAULT_MODEL_ID) -> CaptionEngine:
+    """Process-wide engine for a model loader; ``model_tag`` keeps each backend's captions apart."""
+    key = (id(loader), model_tag)
+    engine = _engines.get(key)
+    if engine is None:
+        cache = get_caption_cache()
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = CaptionEngine(loader, cache, model_tag=model_tag)
+    return engine
@@ -0,0 +1,229 @@
+"""
+Document ingestion and chunk retrieval
+Large PDFs are extracted page-parallel across a process pool (each worker
+parses the file once and extracts a range of pages), with progress
+reported as pages finish. Extracted pages are split into overlapping
+word-window chunks, indexed per conversation with BM25, and each question
+retrieves only its top-k chunks, so long documents fit in the prompt
+without sending the whole text. Short documents are still sent whole.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from brain_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+PARALLEL_MIN_PAGES = 32  # below this, process start-up costs more than it saves
+PAGES_PER_TASK = 8  # granularity of work items and progress updates
+MAX_WORKERS = 4
+CHUNK_WORDS = 300
+CHUNK_OVERLAP = 60
+TOP_K = 6
+FULL_TEXT_WORDS = 3000  # documents up to this size are sent whole
+MAX_CONVERSATIONS = 32
+
+Progress = Callable[[int, int], None]  # (pages done, total pages)
+
+
+# --- Extraction ---
+_worker_reader = None
+
+
+def _init_worker(data: bytes):
+    global _worker_reader
+    import PyPDF2
+    _worker_reader = PyPDF2.PdfReader(BytesIO(data))
+
+
+def _extract_range(start: int, end: int) -> List[Tuple[int, str]]:
+    return [(i, _worker_reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def extract_pdf_pages(data: bytes, progress: Optional[Progress] = None,
+                      workers: Optional[int] = None) -> List[str]:
+    """Text of every page, in order; long documents are extracted in parallel processes."""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(BytesIO(data))
+    total = len(reader.pages)
+    workers = workers or min(MAX_WORKERS, os.cpu_count() or 1)
+    if total < PARALLEL_MIN_PAGES or workers <= 1:
+        pages = []
+        for page in reader.pages:
+            pages.append(page.extract_text() or "")
+            if progress and (len(pages) % PAGES_PER_TASK == 0 or len(pages) == total):
+                progress(len(pages), total)
+        return pages
+
+    import multiprocessing
+    pages = [""] * total
+    done = 0
+    # spawn, not fork: the app process is multi-threaded
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(data,)) as pool:
+        futures = [pool.submit(_extract_range, start, min(start + PAGES_PER_TASK, total))
+                   for start in range(0, total, PAGES_PER_TASK)]
+        for future in as_completed(futures):
+            for index, text in future.result():
+                pages[index] = text
+                done += 1
+            if progress:
+                progress(done, total)
+    return pages
+
+
+def format_pages(pages: Sequence[str]) -> str:
+    return "".join(f"\n--- Page {i} ---\n{text}" for i, text in enumerate(pages, 1))
+
+
+# --- Chunking ---
+@dataclass
+class Chunk:
+    index: int
+    first_page: int
+    last_page: int
+    text: str
+
+    @property
+    def pages(self) -> str:
+        if self.first_page == self.last_page:
+            return f"p. {self.first_page}"
+        return f"pp. {self.first_page}-{self.last_page}"
+
+
+def chunk_pages(pages: Sequence[str], chunk_words: int = CHUNK_WORDS,
+                overlap: int = CHUNK_OVERLAP) -> List[Chunk]:
+    """Overlapping word windows across page boundaries, each tagged with the pages it spans."""
+    words: List[str] = []
+    page_of: List[int] = []
+    for number, text in enumerate(pages, 1):
+        page_words = text.split()
+        words.extend(page_words)
+        page_of.extend([number] * len(page_words))
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        end = min(start + chunk_words, len(words))
+        chunks.append(Chunk(len(chunks), page_of[start], page_of[end - 1], " ".join(words[start:end])))
+        if end == len(words):
+            break
+    return chunks
+
+
+class DocumentIndex:
+    """BM25 index over one document's chunks."""
+
+    def __init__(self, pages: Sequence[str], chunk_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP):
+        self.chunks = chunk_pages(pages, chunk_words, overlap)
+        self.words = sum(len(text.split()) for text in pages)
+        self.full_text = format_pages(pages) if self.words <= FULL_TEXT_WORDS else None
+        self._index = BM25Index()
+        self._index.add_many((chunk.index, chunk.text) for chunk in self.chunks)
+        self._lock = threading.Lock()
+
+    def search(self, question: str, k: int = TOP_K) -> List[Chunk]:
+        """Top-k chunks in document order; the opening chunks when nothing matches."""
+        with self._lock:
+            hits = self._index.search(question, k=k)
+        chosen = sorted(index for index, _ in hits) or list(range(min(k, len(self.chunks))))
+        return [self.chunks[index] for index in chosen]
+
+    def context(self, question: str, k: int = TOP_K) -> str:
+        """Prompt text for a question: the whole document if short, otherwise its best chunks."""
+        if self.full_text is not None:
+            return self.full_text
+        parts = [f"\n[Excerpt, {chunk.pages}]\n{chunk.text}" for chunk in self.search(question, k)]
+        return (f"(Top {len(parts)} of {len(self.chunks)} excerpts relevant to the question)"
+                + "".join(parts))
+
+
+class DocumentStore:
+    """Document indexes per conversation, keyed by document content hash; least recent conversations are dropped."""
+
+    def __init__(self, max_conversations: int = MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, Dict[str, DocumentIndex]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, conversation_id: Optional[str], digest: str,
+                     pages: Callable[[], Sequence[str]]) -> DocumentIndex:
+        key = str(conversation_id)
+        with self._lock:
+            documents = self._conversations.setdefault(key, {})
+            self._conversations.move_to_end(key)
+            index = documents.get(digest)
+        if index is None:
+            index = DocumentIndex(pages())
+            with self._lock:
+                documents = self._conversations.setdefault(key, {})
+                index = documents.setdefault(digest, index)
+                while len(self._conversations) > self.max_conversations:
+                    self._conversations.popitem(last=False)
+        return index
+
+    def forget(self, conversation_id: Optional[str]):
+        with self._lock:
+            self._conversations.pop(str(conversation_id), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "conversations": len(self._conversations),
+                "documents": sum(len(docs) for docs in self._conversations.values()),
+            }
+
+
+class ProgressBoard:
+    """Thread-safe progress of several extractions, read from the script thread to draw one bar.
+
+    Reporters also accept an optional partial result (such as the transcript
+    so far), kept per item for display alongside the bar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: Dict[str, Tuple[int, int, str]] = {}
+        self._partials: Dict[str, str] = {}
+
+    def reporter(self, name: str, unit: str = "pages") -> Callable[..., None]:
+        def report(done: int, total: int, partial: Optional[str] = None):
+            with self._lock:
+                self._items[name] = (done, total, unit)
+                if partial:
+                    self._partials[name] = partial
+        return report
+
+    def partials(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._partials)
+
+    def snapshot(self) -> Optional[Tuple[float, str]]:
+        """(fraction done, label), or None before any progress is reported."""
+        with self._lock:
+            items = dict(self._items)
+        if not items:
+            return None
+        done = sum(d for d, _, _ in items.values())
+        total = sum(t for _, t, _ in items.values()) or 1
+        label = ", ".join(f"{name}: {d}/{t} {unit}" for name, (d, t, unit) in items.items())
+        return done / total, label
+
+
+_store: Optional[DocumentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    """Process-wide document indexes shared by every session."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DocumentStore()
+    return _store
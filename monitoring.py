@@ -77,7 +77,9 @@ def track_request(provider, model, success, latency, token_usage=None, session_i
         model (str): The model name used.
         success (bool): Whether the request was successful.
         latency (float): Time taken in seconds.
-        token_usage (dict, optional): Token usage stats.
+        token_usage (dict, optional): Token usage stats. When it has
+            ``cache_hit_rate`` (share of prompt tokens served from the
+            provider's prompt cache) the rate is also logged top-level.
         session_id (str, optional): User session identifier.
     """
     data = {
@@ -88,6 +90,7 @@ def track_request(provider, model, success, latency, token_usage=None, session_i
         "success": success,
         "latency": latency,
         "token_usage": token_usage,
+        "cache_hit_rate": (token_usage or {}).get("cache_hit_rate"),
         "session_id": session_id
     }
     # Bind json_data to extra so the filter catches it
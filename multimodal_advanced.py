@@ -224,12 +224,13 @@ class DocumentProcessor:
     """Advanced document processing"""
     
     @staticmethod
-    def extract_text_from_pdf(file_path: str) -> Tuple[str, Dict]:
-        """Extract text from PDF with metadata"""
+    def extract_text_from_pdf(file_path: str, progress=None) -> Tuple[str, Dict]:
+        """Extract text from PDF with metadata; long PDFs are extracted page-parallel"""
         try:
             import PyPDF2
+            from io import BytesIO
+            from document_ingest import extract_pdf_pages, format_pages
             
-            text_parts = []
             metadata = {
                 "pages": 0,
                 "title": "",
@@ -238,21 +239,19 @@ class DocumentProcessor:
             }
             
             with open(file_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                metadata["pages"] = len(reader.pages)
-                
-                # Extract metadata
-                if reader.metadata:
-                    metadata["title"] = reader.metadata.get('/Title', '')
-                    metadata["author"] = reader.metadata.get('/Author', '')
-                    metadata["created"] = reader.metadata.get('/CreationDate', '')
-                
-                # Extract text
-                for page_num, page in enumerate(reader.pages):
-                    text_parts.append(f"\n--- Page {page_num + 1} ---\n")
-                    text_parts.append(page.extract_text())
-            
-            return "".join(text_parts), metadata
+                data = f.read()
+            reader = PyPDF2.PdfReader(BytesIO(data))
+            metadata["pages"] = len(reader.pages)
+            
+            # Extract metadata
+            if reader.metadata:
+                metadata["title"] = reader.metadata.get('/Title', '')
+                metadata["author"] = reader.metadata.get('/Author', '')
+                metadata["created"] = reader.metadata.get('/CreationDate', '')
+            
+            # Extract text
+            pages = extract_pdf_pages(data, progress=progress)
+            return format_pages(pages), metadata
         except ImportError:
             raise Exception("PyPDF2 required: pip install PyPDF2")
         except Exception as e:
@@ -412,50 +411,22 @@ class VideoProcessor:
     def get_video_info(file_path: str) -> Dict[str, Any]:
         """Extract video information"""
         try:
-            from moviepy.editor import VideoFileClip
+            from video_analysis import probe
             
-            video = VideoFileClip(file_path)
-            
-            info = {
-                "duration": video.duration,
-                "fps": video.fps,
-                "resolution": video.size,
-                "width": video.w,
-                "height": video.h,
-                "frame_count": int(video.fps * video.duration),
-            }
-            
-            video.close()
-            return info
+            return probe(file_path).to_dict()
         except Exception as e:
             return {"error": str(e)}
     
     @staticmethod
-    def extract_frames(file_path: str, num_frames: int = 5) -> List[bytes]:
-        """Extract key frames from video"""
+    def extract_frames(file_path: str, num_frames: int = 5, scene_detection: bool = False) -> List[bytes]:
+        """Extract key frames from video, seeking to keyframes instead of decoding the whole file"""
         try:
-            from moviepy.editor import VideoFileClip
-            from PIL import Image
-            import numpy as np
+            from video_analysis import analyze_video
             
-            video = VideoFileClip(file_path)
-            duration = video.duration
-            
-            frames_bytes = []
-            for i in range(num_frames):
-                t = (i * duration) / num_frames
-                frame = video.get_frame(t)
-                
-                # Convert numpy array to PIL Image
-                img = Image.fromarray(np.uint8(frame))
-                
-                # Convert to bytes
-                buffer = io.BytesIO()
-                img.save(buffer, format='PNG')
-                frames_bytes.append(buffer.getvalue())
-            
-            video.close()
-            return frames_bytes
+            positions = None if scene_detection else [i / num_frames for i in range(num_frames)]
+            analysis = analyze_video(file_path, num_frames=num_frames, scene_detection=scene_detection,
+                                     max_frame_side=None, positions=positions)
+            return [frame.png() for frame in analysis.frames]
         except Exception as e:
             raise Exception(f"Failed to extract frames: {str(e)}")
     
@@ -463,52 +434,56 @@ class VideoProcessor:
     def create_video_thumbnail(file_path: str, time_offset: float = 5.0) -> bytes:
         """Create thumbnail from video at specific time"""
         try:
-            from moviepy.editor import VideoFileClip
-            from PIL import Image
-            import numpy as np
+            from video_analysis import analyze_video
             
-            video = VideoFileClip(file_path)
-            
-            # Ensure time_offset is within video duration
-            time_offset = min(time_offset, video.duration - 0.1)
-            
-            frame = video.get_frame(time_offset)
-            img = Image.fromarray(np.uint8(frame))
-            
-            # Resize to thumbnail size
-            img.thumbnail((320, 240), Image.Resampling.LANCZOS)
+            # analyze_video keeps time_offset within the video duration
+            analysis = analyze_video(file_path, times=[time_offset], max_frame_side=320)
+            if not analysis.frames:
+                raise Exception(f"no frame at {time_offset}s")
             
             buffer = io.BytesIO()
-            img.save(buffer, format='PNG')
-            
-            video.close()
+            analysis.frames[0].thumbnail((320, 240)).save(buffer, format='PNG')
             return buffer.getvalue()
         except Exception as e:
             raise Exception(f"Failed to create thumbnail: {str(e)}")
     
+    @staticmethod
+    def analyze(file_path: str, num_frames: int = 5, scene_detection: bool = False) -> Dict[str, Any]:
+        """Info, frames and thumbnails from a single probe and one seek per frame"""
+        try:
+            from video_analysis import analyze_video
+            
+            analysis = analyze_video(file_path, num_frames=num_frames, scene_detection=scene_detection)
+            return {
+                "info": analysis.info.to_dict(),
+                "frame_times": [frame.time for frame in analysis.frames],
+                "frames": [frame.png() for frame in analysis.frames],
+                "thumbnails": analysis.thumbnails(),
+            }
+        except Exception as e:
+            raise Exception(f"Failed to analyze video: {str(e)}")
+    
     @staticmethod
     def compress_video(file_path: str, quality: str = "medium") -> bytes:
         """Compress video for faster processing"""
+        result = VideoProcessor.transcode_video(file_path, quality)
         try:
-            from moviepy.editor import VideoFileClip
-            
-            quality_settings = {
-                "low": {"bitrate": "500k", "fps": 15},
-                "medium": {"bitrate": "2000k", "fps": 24},
-                "high": {"bitrate": "5000k", "fps": 30},
-            }
-            
-            settings = quality_settings.get(quality, quality_settings["medium"])
-            
-            video = VideoFileClip(file_path)
-            
-            # This is a placeholder - actual compression would require ffmpeg integration
-            # For now, just return the original file info
-            
-            video.close()
+            return result.read()
+        finally:
+            result.close()
+    
+    @staticmethod
+    def transcode_video(file_path: str, quality: str = "medium", bitrate: Optional[str] = None,
+                        fps: Optional[float] = None, max_height: Optional[int] = None):
+        """Transcode with ffmpeg to a low/medium/high preset (bitrate, fps and height targets).
+        
+        Returns a video_analysis.TranscodeResult whose output is a spooled temp
+        file, with input/output sizes, compression ratio and wall time.
+        """
+        try:
+            from video_analysis import transcode
             
-            with open(file_path, 'rb') as f:
-                return f.read()
+            return transcode(file_path, quality, bitrate=bitrate, fps=fps, max_height=max_height)
         except Exception as e:
             raise Exception(f"Failed to compress video: {str(e)}")
 
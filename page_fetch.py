@@ -0,0 +1,259 @@
+"""
+Concurrent page fetching for search grounding
+Fetches several result pages at once over one long-lived aiohttp
+connection pool (with per-host limits) and stream-parses each body,
+stopping as soon as enough text has been extracted. Falls back to a
+thread pool over a shared requests.Session when aiohttp is unavailable.
+"""
+import asyncio
+import codecs
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import aiohttp  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+DEFAULT_MAX_CHARS = 2000
+MAX_BYTES = 1024 * 1024  # stop reading a body after this much, text or not
+CHUNK_SIZE = 16 * 1024
+DEFAULT_TIMEOUT = 10.0
+MAX_CONNECTIONS = 20
+MAX_PER_HOST = 2
+
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head', 'meta', 'link', 'iframe'}
+VOID_TAGS = {'meta', 'link', 'br', 'img', 'input', 'hr', 'area', 'base', 'col', 'embed', 'source', 'wbr'}
+
+
+class StreamingTextExtractor(HTMLParser):
+    """Incremental HTML-to-text that reports when it has collected enough."""
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.length = 0
+        self._skip_depth = 0
+
+    @property
+    def done(self) -> bool:
+        return self.length >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS and tag not in VOID_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and tag not in VOID_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        text = ' '.join(data.split())
+        if text:
+            self.parts.append(text)
+            self.length += len(text) + 1
+
+    def text(self) -> str:
+        return ' '.join(self.parts)[:self.max_chars]
+
+
+def _is_html(content_type: Optional[str]) -> bool:
+    return not content_type or 'html' in content_type or content_type.startswith('text/')
+
+
+class PageFetcher:
+    """Long-lived fetcher; aiohttp work runs on a private event-loop thread.
+
+    Streamlit runs each turn in a fresh ``asyncio.run``, which would tear
+    down a pool bound to that loop, so the session lives on its own loop and
+    callers submit work to it from any thread.
+    """
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, max_per_host: int = MAX_PER_HOST,
+                 user_agent: str = USER_AGENT):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.headers = {'User-Agent': user_agent}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session = None
+        self._requests_session = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {'pages': 0, 'failures': 0, 'bytes': 0, 'early_cutoffs': 0}
+
+    # --- Public API ---
+    def fetch_texts(self, urls: Sequence[str], max_chars: int = DEFAULT_MAX_CHARS,
+                    timeout: float = DEFAULT_TIMEOUT) -> List[Optional[str]]:
+        """Extracted text for each URL (None where the fetch failed), in input order.
+
+        All pages are fetched concurrently, so the call takes about as long as
+        the slowest page, bounded by ``timeout``.
+        """
+        if not urls:
+            return []
+        if aiohttp is None:
+            return self._fetch_texts_threaded(urls, max_chars, timeout)
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._fetch_all(urls, max_chars, timeout), loop)
+        try:
+            return future.result(timeout + 5)
+        except Exception as e:
+            future.cancel()
+            logger.error(f"Page fetch batch failed: {e}")
+            return [None] * len(urls)
+
+    def fetch_text(self, url: str, max_chars: int = DEFAULT_MAX_CHARS,
+                   timeout: float = DEFAULT_TIMEOUT) -> Optional[str]:
+        return self.fetch_texts([url], max_chars, timeout)[0]
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+            session, self._session = self._session, None
+            executor, self._executor = self._executor, None
+            requests_session, self._requests_session = self._requests_session, None
+        if loop is not None:
+            if session is not None:
+                asyncio.run_coroutine_threadsafe(session.close(), loop).result(5)
+            loop.call_soon_threadsafe(loop.stop)
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if requests_session is not None:
+            requests_session.close()
+
+    # --- aiohttp path ---
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="page-fetch", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _get_session(self):
+        # Only called on the fetcher loop, so no lock is needed
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections, limit_per_host=self.max_per_host,
+                ttl_dns_cache=300, enable_cleanup_closed=True
+            )
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        return self._session
+
+    async def _fetch_all(self, urls: Sequence[str], max_chars: int, timeout: float) -> List[Optional[str]]:
+        session = self._get_session()
+        tasks = [asyncio.ensure_future(self._fetch_one(session, url, max_chars, timeout)) for url in urls]
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        return [task.result() if task in done and not task.exception() else None for task in tasks]
+
+    async def _fetch_one(self, session, url: str, max_chars: int, timeout: float) -> Optional[str]:
+        start = time.perf_counter()
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=min(timeout, 5.0))
+            async with session.get(url, timeout=client_timeout, allow_redirects=True) as response:
+                response.raise_for_status()
+                if not _is_html(response.content_type):
+                    raise ValueError(f"unsupported content type {response.content_type}")
+                decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+                parser = StreamingTextExtractor(max_chars)
+                received = 0
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    received += len(chunk)
+                    parser.feed(decoder.decode(chunk))
+                    if parser.done or received >= MAX_BYTES:
+                        # Dropping out of the context manager closes the connection without reading the rest
+                        self.stats['early_cutoffs'] += 1
+                        break
+                else:
+                    parser.feed(decoder.decode(b'', final=True))
+                parser.close()
+            self.stats['pages'] += 1
+            self.stats['bytes'] += received
+            logger.info(f"Fetched {parser.length} chars from {url} in {time.perf_counter() - start:.2f}s")
+            return parser.text()
+        except Exception as e:
+            self.stats['failures'] += 1
+            logger.error(f"Content fetch error for {url}: {e}")
+            return None
+
+    # --- requests fallback ---
+    def _fetch_texts_threaded(self, urls: Sequence[str], max_chars: int, timeout: float) -> List[Optional[str]]:
+        with self._lock:
+            if self._executor is None:
+                import requests  # type: ignore
+                self._requests_session = requests.Session()
+                self._requests_session.headers.update(self.headers)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="page-fetch")
+        futures = [self._executor.submit(self._fetch_one_blocking, url, max_chars, timeout) for url in urls]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout + 5))
+            except Exception:
+                results.append(None)
+        return results
+
+    def _fetch_one_blocking(self, url: str, max_chars: int, timeout: float) -> Optional[str]:
+        try:
+            with self._requests_session.get(url, timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                if not _is_html(response.headers.get('Content-Type', '').split(';')[0].strip()):
+                    raise ValueError("unsupported content type")
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+                parser = StreamingTextExtractor(max_chars)
+                received = 0
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    received += len(chunk)
+                    parser.feed(decoder.decode(chunk))
+                    if parser.done or received >= MAX_BYTES:
+                        break
+                parser.close()
+            self.stats['pages'] += 1
+            self.stats['bytes'] += received
+            return parser.text()
+        except Exception as e:
+            self.stats['failures'] += 1
+            logger.error(f"Content fetch error for {url}: {e}")
+            return None
+
+
+_fetcher: Optional[PageFetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def get_page_fetcher() -> PageFetcher:
+    """Process-wide fetcher whose connection pool is reused across turns."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = PageFetcher()
+    return _fetcher
+
+
+def fetch_page_texts(urls: Sequence[str], max_chars: int = DEFAULT_MAX_CHARS,
+                     timeout: float = DEFAULT_TIMEOUT) -> List[Optional[str]]:
+    return get_page_fetcher().fetch_texts(urls, max_chars, timeout)
+
+
+def attach_page_excerpts(results: List[Dict], url_key: str = 'href', max_pages: int = 5,
+                         max_chars: int = DEFAULT_MAX_CHARS, timeout: float = DEFAULT_TIMEOUT) -> List[Dict]:
+    """Add a ``content`` excerpt to the top ``max_pages`` results, fetched concurrently."""
+    targets = [r for r in results[:max_pages] if r.get(url_key)]
+    texts = fetch_page_texts([r[url_key] for r in targets], max_chars, timeout)
+    for result, text in zip(targets, texts):
+        if text:
+            result['content'] = text
+    return results
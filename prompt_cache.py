@@ -0,0 +1,238 @@
+"""
+Provider prompt-prefix caching
+Request builders lay every prompt out the same way: the stable prefix
+first (system instruction, then uploaded documents, then conversation
+history) and the volatile turn last (search results and the question).
+Anthropic gets explicit cache_control breakpoints on that layout; the
+OpenAI-compatible and Gemini APIs cache matching prefixes on their own.
+Cached-token counts from each response are normalized and reported to
+monitoring.track_request with the request's cache hit rate.
+"""
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+MAX_BREAKPOINTS = 4  # Anthropic accepts at most four per request
+# OpenAI-compatible providers known to accept stream_options.include_usage
+STREAM_USAGE_PROVIDERS = {"openai", "deepseek"}
+DOCUMENTS_HEADER = "Reference material provided by the user:"
+
+
+def documents_text(attachments: Sequence[Tuple[str, str]]) -> str:
+    """Attachment sections rendered in a fixed order, so identical uploads give identical text."""
+    sections = [f"{label}:\n{text}" for label, text in attachments if text]
+    if not sections:
+        return ""
+    return DOCUMENTS_HEADER + "\n\n" + "\n\n".join(sections)
+
+
+def _history(history: Sequence[Dict]) -> List[Dict]:
+    return [{"role": m["role"], "content": m["content"]} for m in history if "role" in m and "content" in m]
+
+
+# --- Request layouts ---
+def openai_messages(system_instruction: str = "", attachments: Sequence[Tuple[str, str]] = (),
+                    history: Sequence[Dict] = (), turn: str = "") -> List[Dict]:
+    """Chat messages with the stable prefix first; OpenAI caches prefixes of 1024+ tokens automatically."""
+    messages: List[Dict] = []
+    if system_instruction:
+        messages.append({"role": "system", "content": system_instruction})
+    documents = documents_text(attachments)
+    if documents:
+        messages.append({"role": "system", "content": documents})
+    messages.extend(_history(history))
+    messages.append({"role": "user", "content": turn})
+    return messages
+
+
+def anthropic_request(system_instruction: str = "", attachments: Sequence[Tuple[str, str]] = (),
+                      history: Sequence[Dict] = (), turn: str = "",
+                      cache_turn: bool = False) -> Dict[str, Any]:
+    """``system`` and ``messages`` arguments with cache breakpoints after each stable segment.
+
+    Breakpoints go after the system instruction, the documents, any history
+    summary and the last history message, so the next turn reads everything
+    before its new messages from the cache. ``cache_turn`` also marks the
+    current turn, for prompts sent more than once (retries, hedged requests).
+    Anthropic only caches prefixes above a model-specific minimum size;
+    shorter marked segments are simply processed normally.
+    """
+    breakpoints = 0
+
+    def block(text: str, cache: bool) -> Dict[str, Any]:
+        nonlocal breakpoints
+        content: Dict[str, Any] = {"type": "text", "text": text}
+        if cache and breakpoints < MAX_BREAKPOINTS:
+            content["cache_control"] = dict(CACHE_CONTROL)
+            breakpoints += 1
+        return content
+
+    system: List[Dict[str, Any]] = []
+    if system_instruction:
+        system.append(block(system_instruction, True))
+    documents = documents_text(attachments)
+    if documents:
+        system.append(block(documents, True))
+
+    # Anthropic takes user/assistant turns only, starting with the user;
+    # system notes in the history (the rolling summary) join the system prompt
+    formatted = _history(history)
+    for note in (m for m in formatted if m["role"] == "system"):
+        system.append(block(note["content"], True))
+    turns = [m for m in formatted if m["role"] in ("user", "assistant")]
+    while turns and turns[0]["role"] != "user":
+        turns.pop(0)
+    messages: List[Dict[str, Any]] = []
+    for index, message in enumerate(turns):
+        cache = index == len(turns) - 1
+        if messages and messages[-1]["role"] == message["role"]:
+            # Consecutive same-role messages are merged into one turn
+            messages[-1]["content"].append(block(message["content"], cache))
+        else:
+            messages.append({"role": message["role"], "content": [block(message["content"], cache)]})
+    if messages and messages[-1]["role"] == "user":
+        messages[-1]["content"].append(block(turn, cache_turn))
+    else:
+        messages.append({"role": "user", "content": [block(turn, cache_turn)]})
+
+    request: Dict[str, Any] = {"messages": messages}
+    if system:
+        request["system"] = system
+    return request
+
+
+def google_system_instruction(system_instruction: str = "",
+                              attachments: Sequence[Tuple[str, str]] = ()) -> str:
+    """System instruction followed by the documents; Gemini caches repeated prefixes implicitly."""
+    return "\n\n".join(part for part in (system_instruction, documents_text(attachments)) if part)
+
+
+def openai_stream_kwargs(provider: str) -> Dict[str, Any]:
+    """Extra streaming arguments that make the last chunk carry token usage."""
+    if provider in STREAM_USAGE_PROVIDERS:
+        return {"stream_options": {"include_usage": True}}
+    return {}
+
+
+# --- Usage normalization ---
+def _get(obj: Any, name: str, default: Any = None) -> Any:
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def _as_int(value: Any) -> int:
+    return value if isinstance(value, int) else 0
+
+
+def usage_from_openai(usage: Any) -> Optional[Dict[str, int]]:
+    """OpenAI reports cached prompt tokens in prompt_tokens_details; DeepSeek as cache hit tokens."""
+    if usage is None:
+        return None
+    cached = _as_int(_get(_get(usage, "prompt_tokens_details"), "cached_tokens"))
+    cached = cached or _as_int(_get(usage, "prompt_cache_hit_tokens"))
+    return {
+        "input_tokens": _as_int(_get(usage, "prompt_tokens")),
+        "cached_tokens": cached,
+        "cache_write_tokens": 0,
+        "output_tokens": _as_int(_get(usage, "completion_tokens")),
+    }
+
+
+def usage_from_anthropic(usage: Any) -> Optional[Dict[str, int]]:
+    """Anthropic's input_tokens excludes cache reads and writes, so they are added back."""
+    if usage is None:
+        return None
+    cached = _as_int(_get(usage, "cache_read_input_tokens"))
+    written = _as_int(_get(usage, "cache_creation_input_tokens"))
+    return {
+        "input_tokens": _as_int(_get(usage, "input_tokens")) + cached + written,
+        "cached_tokens": cached,
+        "cache_write_tokens": written,
+        "output_tokens": _as_int(_get(usage, "output_tokens")),
+    }
+
+
+def usage_from_google(usage_metadata: Any) -> Optional[Dict[str, int]]:
+    if usage_metadata is None:
+        return None
+    return {
+        "input_tokens": _as_int(_get(usage_metadata, "prompt_token_count")),
+        "cached_tokens": _as_int(_get(usage_metadata, "cached_content_token_count")),
+        "cache_write_tokens": 0,
+        "output_tokens": _as_int(_get(usage_metadata, "candidates_token_count")),
+    }
+
+
+def cache_hit_rate(usage: Optional[Dict[str, int]]) -> Optional[float]:
+    if not usage or not usage.get("input_tokens"):
+        return None
+    return usage.get("cached_tokens", 0) / usage["input_tokens"]
+
+
+# --- Reporting ---
+class PromptCacheStats:
+    """Running cached/total prompt token counts per provider."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, provider: str, usage: Dict[str, int]):
+        with self._lock:
+            totals = self._totals.setdefault(
+                provider, {"requests": 0, "input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0}
+            )
+            totals["requests"] += 1
+            for key in ("input_tokens", "cached_tokens", "cache_write_tokens"):
+                totals[key] += usage.get(key, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {provider: dict(totals) for provider, totals in self._totals.items()}
+        for totals in snapshot.values():
+            totals["hit_rate"] = cache_hit_rate(totals) or 0.0
+        return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+
+cache_stats = PromptCacheStats()
+
+
+def report_usage(provider: str, model: str, usage: Optional[Dict[str, int]], latency: float,
+                 success: bool = True, session_id: Optional[str] = None):
+    """Record a response's token usage and send it, with its cache hit rate, to monitoring."""
+    if usage:
+        cache_stats.record(provider, usage)
+        usage = dict(usage, cache_hit_rate=cache_hit_rate(usage))
+    track_request = _get_tracker()
+    if track_request is None:
+        return
+    try:
+        track_request(provider, model, success, latency, token_usage=usage, session_id=session_id)
+    except Exception as e:
+        logger.debug(f"Usage not reported to monitoring: {e}")
+
+
+_tracker: Any = None
+
+
+def _get_tracker():
+    """monitoring.track_request, or None when monitoring cannot be imported (checked once)."""
+    global _tracker
+    if _tracker is None:
+        try:
+            from monitoring import track_request
+            _tracker = track_request
+        except Exception as e:
+            logger.debug(f"Monitoring unavailable, usage is kept in-process only: {e}")
+            _tracker = False
+    return _tracker or None
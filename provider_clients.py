@@ -0,0 +1,185 @@
+"""
+Shared provider client registry
+One long-lived SDK client per (provider, API key, base URL), reused by
+Brain Mode and the chat handlers so each turn skips client construction
+and reuses warm keep-alive HTTP connections. Works with or without Streamlit.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OPENAI_COMPATIBLE_BASE_URLS = {
+    "openai": None,
+    "together": "https://api.together.xyz/v1",
+    "xai": "https://api.x.ai/v1",
+    "deepseek": "https://api.deepseek.com"
+}
+
+MAX_CLIENTS = 32
+# Connection pool per client; idle sockets are kept warm between turns
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 120.0  # seconds
+REQUEST_TIMEOUT = 120.0
+
+
+def _http_client(sdk_module: Any) -> Optional[Any]:
+    """Keep-alive httpx client in the SDK's own flavour, or None to use the SDK default."""
+    factory = getattr(sdk_module, "DefaultHttpxClient", None)
+    if factory is None:
+        return None
+    try:
+        import httpx  # type: ignore
+        return factory(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=REQUEST_TIMEOUT,
+        )
+    except Exception as e:
+        logger.debug(f"Falling back to default HTTP client: {e}")
+        return None
+
+
+def _build_openai(api_key: str, base_url: Optional[str]) -> Any:
+    import openai
+    kwargs: Dict[str, Any] = {"api_key": api_key}
+    if base_url:
+        kwargs["base_url"] = base_url
+    http_client = _http_client(openai)
+    if http_client is not None:
+        kwargs["http_client"] = http_client
+    return openai.OpenAI(**kwargs)
+
+
+def _build_anthropic(api_key: str, base_url: Optional[str]) -> Any:
+    import anthropic
+    kwargs: Dict[str, Any] = {"api_key": api_key}
+    if base_url:
+        kwargs["base_url"] = base_url
+    http_client = _http_client(anthropic)
+    if http_client is not None:
+        kwargs["http_client"] = http_client
+    return anthropic.Anthropic(**kwargs)
+
+
+def _build_google_genai(api_key: str, base_url: Optional[str]) -> Any:
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+_BUILDERS = {
+    "openai": _build_openai,
+    "anthropic": _build_anthropic,
+    "google": _build_google_genai,
+}
+
+
+def client_kind(provider: str) -> str:
+    """SDK family used for a provider name ("together" -> "openai")."""
+    if provider in OPENAI_COMPATIBLE_BASE_URLS:
+        return "openai"
+    if provider in _BUILDERS:
+        return provider
+    raise ValueError(f"Unsupported provider: {provider}")
+
+
+class ProviderClientRegistry:
+    """Thread-safe LRU of SDK clients keyed by provider family, API key and base URL."""
+
+    def __init__(self, max_clients: int = MAX_CLIENTS):
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[Tuple[str, str, Optional[str]], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._google_legacy_key: Optional[str] = None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(kind: str, api_key: str, base_url: Optional[str]) -> Tuple[str, str, Optional[str]]:
+        # Key material is hashed so the registry never indexes raw secrets
+        digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        return (kind, digest, base_url)
+
+    def get(self, provider: str, api_key: str, base_url: Optional[str] = None) -> Any:
+        """Client for ``provider``; OpenAI-compatible providers default to their base URL."""
+        kind = client_kind(provider)
+        if not api_key:
+            raise ValueError(f"No API key for {provider}")
+        if kind == "openai" and base_url is None:
+            base_url = OPENAI_COMPATIBLE_BASE_URLS.get(provider)
+        key = self._key(kind, api_key, base_url)
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self._stats["hits"] += 1
+                return client
+            self._stats["misses"] += 1
+            # Built under the lock so concurrent first calls share one client
+            client = _BUILDERS[kind](api_key, base_url)
+            self._clients[key] = client
+            while len(self._clients) > self.max_clients:
+                _, evicted = self._clients.popitem(last=False)
+                self._stats["evictions"] += 1
+                _close_client(evicted)
+            return client
+
+    def google_legacy(self, api_key: str) -> Any:
+        """The process-global ``google.generativeai`` module, configured for ``api_key``.
+
+        The legacy SDK keeps one global configuration, so it is only
+        reconfigured when the key actually changes.
+        """
+        import google.generativeai as genai
+        with self._lock:
+            if self._google_legacy_key != api_key:
+                genai.configure(api_key=api_key)
+                self._google_legacy_key = api_key
+        return genai
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, size=len(self._clients))
+
+    def clear(self):
+        """Close and forget every client."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._google_legacy_key = None
+        for client in clients:
+            _close_client(client)
+
+
+def _close_client(client: Any):
+    close = getattr(client, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception as e:
+            logger.debug(f"Error closing provider client: {e}")
+
+
+_registry: Optional[ProviderClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ProviderClientRegistry:
+    """Process-wide registry shared by every caller."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ProviderClientRegistry()
+    return _registry
+
+
+def get_client(provider: str, api_key: str, base_url: Optional[str] = None) -> Any:
+    return get_registry().get(provider, api_key, base_url)
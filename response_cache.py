@@ -0,0 +1,252 @@
+"""
+Deterministic response cache
+Opt-in cache of complete model answers, keyed by a canonical hash of the
+whole request (provider, model, sampling parameters, system instruction,
+messages and attached images). Entries live in a small in-memory LRU
+backed by a size-bounded SQLite store, expire after a per-provider TTL,
+and are replayed as a chunk stream so cached answers render through the
+same streaming UI as live ones.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISK_PATH = "response_cache.db"
+MAX_MEMORY_ENTRIES = 128
+MAX_DISK_BYTES = 64 * 1024 * 1024
+# Seconds an answer stays valid, per provider; providers that update models
+# behind the same name more often get shorter lifetimes
+PROVIDER_TTLS = {
+    "openai": 24 * 60 * 60,
+    "anthropic": 24 * 60 * 60,
+    "google": 12 * 60 * 60,
+    "together": 12 * 60 * 60,
+    "xai": 6 * 60 * 60,
+    "deepseek": 6 * 60 * 60,
+}
+DEFAULT_TTL = 6 * 60 * 60
+REPLAY_CHUNK_WORDS = 4
+KEY_VERSION = 1  # bump when the canonical request layout changes
+
+_REPLAY_RE = re.compile(r"\S+\s*")
+
+
+def _canonical_number(value: Any) -> Any:
+    # 0.7 and 0.70000001 from a slider should not produce different keys
+    return round(float(value), 4) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+
+
+def image_digest(image: Any) -> str:
+    """Stable digest of an attached image (PIL image, bytes or file-like)."""
+    hasher = hashlib.sha256()
+    if isinstance(image, (bytes, bytearray)):
+        hasher.update(image)
+    elif hasattr(image, "tobytes"):
+        hasher.update(f"{getattr(image, 'mode', '')}{getattr(image, 'size', '')}".encode("utf-8"))
+        hasher.update(image.tobytes())
+    elif hasattr(image, "getvalue"):
+        hasher.update(image.getvalue())
+    else:
+        hasher.update(repr(image).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def request_key(provider: str, model: str, messages: Sequence[Dict[str, Any]],
+                params: Optional[Dict[str, Any]] = None, images: Sequence[Any] = ()) -> str:
+    """Canonical SHA-256 of a request; only role and content of each message count."""
+    payload = {
+        "v": KEY_VERSION,
+        "provider": provider,
+        "model": model,
+        "params": {k: _canonical_number(v) for k, v in sorted((params or {}).items()) if v is not None},
+        "messages": [[m.get("role", ""), m.get("content", "")] for m in messages],
+        "images": [image_digest(image) for image in images or ()],
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def replay_chunks(text: str, words: int = REPLAY_CHUNK_WORDS) -> Iterator[str]:
+    """Re-chunk a cached answer the way a provider stream would deliver it."""
+    pieces = _REPLAY_RE.findall(text)
+    leading = text[:len(text) - len(text.lstrip())]
+    if leading:
+        yield leading
+    for start in range(0, len(pieces), words):
+        yield "".join(pieces[start:start + words])
+
+
+class ResponseCache:
+    """Thread-safe TTL cache of answers: memory LRU over a byte-bounded SQLite store."""
+
+    def __init__(self, disk_path: Optional[str] = DEFAULT_DISK_PATH, max_memory_entries: int = MAX_MEMORY_ENTRIES,
+                 max_disk_bytes: int = MAX_DISK_BYTES, ttls: Optional[Dict[str, float]] = None):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttls = dict(PROVIDER_TTLS, **(ttls or {}))
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+        if disk_path:
+            try:
+                self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self._disk.execute("PRAGMA journal_mode=WAL")
+                self._disk.execute("PRAGMA synchronous=NORMAL")
+                with self._disk:
+                    self._disk.execute(
+                        "CREATE TABLE IF NOT EXISTS response_cache "
+                        "(key TEXT PRIMARY KEY, provider TEXT, model TEXT, expires_at REAL, "
+                        "last_used REAL, size INTEGER, response TEXT)"
+                    )
+                    self._disk.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_used "
+                                       "ON response_cache (last_used)")
+                    self._disk.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+                self._disk_bytes = self._disk.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Response cache disk tier disabled: {e}")
+                self._disk = None
+
+    def ttl_for(self, provider: str) -> float:
+        return self.ttls.get(provider, DEFAULT_TTL)
+
+    # --- Lookups ---
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        stored = self._disk_get(key, now)
+        with self._lock:
+            if stored is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._memory_put(key, *stored)
+        return stored[1]
+
+    def put(self, key: str, response: str, provider: str, model: str = ""):
+        """Store a successful answer; empty answers are ignored."""
+        if not response:
+            return
+        expires_at = time.time() + self.ttl_for(provider)
+        with self._lock:
+            self._memory_put(key, expires_at, response)
+            self._stats["stores"] += 1
+        self._disk_put(key, provider, model, expires_at, response)
+
+    def _memory_put(self, key: str, expires_at: float, response: str):
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        if self._disk is None:
+            return None
+        try:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT expires_at, response FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[0] <= now:
+                    return None
+                with self._disk:
+                    # Recency drives eviction when the store is over its size budget
+                    self._disk.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[0], row[1]
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache disk read failed: {e}")
+            return None
+
+    def _disk_put(self, key: str, provider: str, model: str, expires_at: float, response: str):
+        if self._disk is None:
+            return
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        try:
+            with self._disk_lock, self._disk:
+                old = self._disk.execute("SELECT size FROM response_cache WHERE key = ?", (key,)).fetchone()
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO response_cache "
+                    "(key, provider, model, expires_at, last_used, size, response) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, provider, model, expires_at, now, size, response)
+                )
+                self._disk_bytes += size - (old[0] if old else 0)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict(now)
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache disk write failed: {e}")
+
+    def _evict(self, now: float):
+        """Drop expired rows, then least recently used ones, down to 90% of the budget."""
+        self._disk.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+        target = int(self.max_disk_bytes * 0.9)
+        total = self._disk.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+        if total > target:
+            victims: List[Tuple[str, int]] = []
+            excess = total - target
+            for key, size in self._disk.execute("SELECT key, size FROM response_cache ORDER BY last_used ASC"):
+                victims.append((key, size))
+                excess -= size
+                if excess <= 0:
+                    break
+            self._disk.executemany("DELETE FROM response_cache WHERE key = ?", [(k,) for k, _ in victims])
+            total -= sum(size for _, size in victims)
+            with self._lock:
+                self._stats["evictions"] += len(victims)
+        self._disk_bytes = total
+
+    # --- Maintenance ---
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, memory_entries=len(self._memory))
+        stats["disk_bytes"] = self._disk_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            with self._disk_lock, self._disk:
+                self._disk.execute("DELETE FROM response_cache")
+            self._disk_bytes = 0
+
+    def close(self):
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache shared by standard mode and Brain Mode."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
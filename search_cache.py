@@ -0,0 +1,259 @@
+"""
+Shared search result cache
+TTL + LRU cache in front of every DuckDuckGo lookup (chat search, Brain
+Mode and the learning brain). Raw DuckDuckGo results are cached, so the
+entry points share entries even though each reshapes them differently.
+Entries are keyed by the normalized query and search options, kept in a
+bounded in-memory LRU backed by a SQLite tier, and concurrent identical
+lookups share a single network call.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISK_PATH = "search_cache.db"
+MAX_MEMORY_ENTRIES = 512
+# Seconds a result set stays fresh, per search mode
+MODE_TTLS = {
+    "news": 10 * 60,
+    "web": 60 * 60,
+    "images": 24 * 60 * 60,
+}
+DEFAULT_TTL = 60 * 60
+# Narrow time windows go stale faster than the mode default
+TIME_RANGE_TTLS = {
+    "Past Day": 10 * 60,
+}
+DISK_PURGE_INTERVAL = 15 * 60
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a query."""
+    return _WHITESPACE_RE.sub(" ", query).strip().strip("?!.").strip().lower()
+
+
+def cache_key(query: str, mode: str = "web", time_range: Optional[str] = "Anytime",
+              domain: Optional[str] = None, max_results: int = 5) -> str:
+    parts = [normalize_query(query), mode, time_range or "Anytime",
+             (domain or "").strip().lower(), int(max_results)]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """One in-progress fetch that concurrent identical lookups wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[List[Dict[str, Any]]] = None
+        self.error: Optional[BaseException] = None
+
+
+class SearchCache:
+    """Thread-safe TTL + LRU cache with an optional SQLite tier and single-flight fetches."""
+
+    def __init__(self, max_entries: int = MAX_MEMORY_ENTRIES, disk_path: Optional[str] = DEFAULT_DISK_PATH,
+                 ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.ttls = dict(MODE_TTLS, **(ttls or {}))
+        self._memory: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "expired": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._last_purge = 0.0
+        if disk_path:
+            try:
+                self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self._disk.execute("PRAGMA journal_mode=WAL")
+                self._disk.execute("PRAGMA synchronous=NORMAL")
+                with self._disk:
+                    self._disk.execute(
+                        "CREATE TABLE IF NOT EXISTS search_cache "
+                        "(key TEXT PRIMARY KEY, mode TEXT, expires_at REAL, results_json TEXT)"
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Search cache disk tier disabled: {e}")
+                self._disk = None
+
+    def ttl_for(self, mode: str, time_range: Optional[str] = None) -> float:
+        ttl = self.ttls.get(mode, DEFAULT_TTL)
+        if time_range in TIME_RANGE_TTLS:
+            ttl = min(ttl, TIME_RANGE_TTLS[time_range])
+        return ttl
+
+    # --- Lookups ---
+    def get_or_fetch(
+        self,
+        query: str,
+        fetch: Callable[[], List[Dict[str, Any]]],
+        mode: str = "web",
+        time_range: Optional[str] = "Anytime",
+        domain: Optional[str] = None,
+        max_results: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """Cached results for a lookup, calling ``fetch`` at most once per key at a time.
+
+        Exceptions from ``fetch`` propagate to every waiter and nothing is
+        cached; empty result sets are not cached either.
+        """
+        key = cache_key(query, mode, time_range, domain, max_results)
+        now = time.time()
+
+        with self._lock:
+            cached = self._memory_get(key, now)
+            if cached is not None:
+                self._stats["memory_hits"] += 1
+                return list(cached)
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return list(flight.result or [])
+
+        try:
+            stored = self._disk_get(key, now)
+            if stored is not None:
+                expires_at, results = stored
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                    self._memory_put(key, expires_at, results)
+            else:
+                with self._lock:
+                    self._stats["misses"] += 1
+                results = fetch()
+                if results:
+                    expires_at = time.time() + self.ttl_for(mode, time_range)
+                    with self._lock:
+                        self._memory_put(key, expires_at, results)
+                    self._disk_put(key, mode, expires_at, results)
+            flight.result = results
+            return list(results)
+        except BaseException as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _memory_get(self, key: str, now: float) -> Optional[List[Dict[str, Any]]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at <= now:
+            del self._memory[key]
+            self._stats["expired"] += 1
+            return None
+        self._memory.move_to_end(key)
+        return results
+
+    def _memory_put(self, key: str, expires_at: float, results: List[Dict[str, Any]]):
+        self._memory[key] = (expires_at, list(results))
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, List[Dict[str, Any]]]]:
+        if self._disk is None:
+            return None
+        try:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT expires_at, results_json FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache disk read failed: {e}")
+            return None
+        if row is None or row[0] <= now:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_put(self, key: str, mode: str, expires_at: float, results: List[Dict[str, Any]]):
+        if self._disk is None:
+            return
+        try:
+            with self._disk_lock, self._disk:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO search_cache (key, mode, expires_at, results_json) VALUES (?, ?, ?, ?)",
+                    (key, mode, expires_at, json.dumps(results))
+                )
+                now = time.time()
+                if now - self._last_purge > DISK_PURGE_INTERVAL:
+                    self._disk.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,))
+                    self._last_purge = now
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Search cache disk write failed: {e}")
+
+    # --- Maintenance ---
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["in_flight"] = len(self._flights)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (lookups - stats["misses"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            with self._disk_lock, self._disk:
+                self._disk.execute("DELETE FROM search_cache")
+
+    def close(self):
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+
+_cache: Optional[SearchCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Process-wide cache shared by every search entry point."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache()
+    return _cache
+
+
+def cached_search(query: str, fetch: Callable[[], List[Dict[str, Any]]], mode: str = "web",
+                  time_range: Optional[str] = "Anytime", domain: Optional[str] = None,
+                  max_results: int = 5) -> List[Dict[str, Any]]:
+    return get_search_cache().get_or_fetch(query, fetch, mode, time_range, domain, max_results)
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import time
+
+# Add repo root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from brain_embeddings import EmbeddingIndex, HashingEmbedder, normalize_rows
+from benchmark_brain_index import _percentile, build_corpus
+
+
+class RandomEmbedder:
+    """Stands in for a real model so the benchmark times the index, not embedding."""
+
+    def __init__(self, dim=384, seed=3):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, texts):
+        return normalize_rows(self.rng.standard_normal((len(texts), self.dim)).astype(np.float32))
+
+
+def benchmark(n_docs=100_000, queries=200, batch=32, k=3):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vectors")
+        _, docs = build_corpus(20_000)
+
+        start = time.perf_counter()
+        HashingEmbedder()([text for _, text in docs])
+        print(f"Hashing embedder: {len(docs) / (time.perf_counter() - start):.0f} texts/s")
+
+        index = EmbeddingIndex(RandomEmbedder(), path=path)
+        start = time.perf_counter()
+        for offset in range(0, n_docs, 10_000):
+            index.add_many((f"k{i}", "") for i in range(offset, offset + 10_000))
+        print(f"Append {n_docs} vectors to memmap: {time.perf_counter() - start:.2f} s")
+
+        latencies = []
+        for i in range(queries):
+            start = time.perf_counter()
+            index.search(f"q{i}", k=k)
+            latencies.append(time.perf_counter() - start)
+        print(f"\n--- Top-{k} cosine over {len(index)} x {index.dim} float32 ---")
+        print(f"single query p50: {_percentile(latencies, 50)*1000:.2f} ms")
+        print(f"single query p99: {_percentile(latencies, 99)*1000:.2f} ms")
+
+        start = time.perf_counter()
+        index.search_batch([f"q{i}" for i in range(batch)], k=k)
+        elapsed = time.perf_counter() - start
+        print(f"batch of {batch}: {elapsed*1000:.2f} ms ({elapsed*1000/batch:.2f} ms/query)")
+        index.close()
+
+
+if __name__ == "__main__":
+    benchmark()
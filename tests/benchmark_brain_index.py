@@ -0,0 +1,56 @@
+import os
+import random
+import sys
+import time
+
+# Add repo root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from brain_index import BM25Index
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def build_corpus(n_docs=100_000, vocab_size=20_000, doc_terms=40, seed=7):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    # Zipf-like word frequencies, like real text
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    docs = []
+    for doc_id in range(n_docs):
+        words = rng.choices(vocab, weights=weights, k=doc_terms)
+        docs.append((doc_id, " ".join(words)))
+    return vocab, docs
+
+
+def benchmark(n_docs=100_000, queries=500, k=3):
+    print(f"Building corpus of {n_docs} entries...")
+    vocab, docs = build_corpus(n_docs)
+
+    index = BM25Index()
+    start = time.perf_counter()
+    index.add_many(docs)
+    print(f"Index build: {time.perf_counter() - start:.2f} s")
+
+    rng = random.Random(11)
+    # Queries mix mid-frequency and rare terms; the very commonest words
+    # behave like stopwords and are what the tokenizer drops in real text.
+    query_terms = vocab[200:]
+    latencies = []
+    for _ in range(queries):
+        query = " ".join(rng.sample(query_terms, 3))
+        start = time.perf_counter()
+        index.search(query, k=k)
+        latencies.append(time.perf_counter() - start)
+
+    print(f"\n--- Top-{k} BM25 over {len(index)} entries ({queries} queries) ---")
+    print(f"p50: {_percentile(latencies, 50)*1000:.3f} ms")
+    print(f"p99: {_percentile(latencies, 99)*1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+# Add repo root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from captioning import BACKENDS, DEFAULT_MODEL_ID, load_blip
+
+
+def _rss_mb():
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def load_images(directory=None, count=8):
+    """Images from a directory, or synthetic scenes when none is given."""
+    from PIL import Image, ImageDraw
+
+    if directory:
+        names = sorted(n for n in os.listdir(directory) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+        return [Image.open(os.path.join(directory, n)).convert("RGB") for n in names[:count]]
+    images = []
+    for i in range(count):
+        image = Image.new("RGB", (640, 480), (40 * i % 255, 120, 200 - 20 * i % 200))
+        draw = ImageDraw.Draw(image)
+        draw.ellipse((100 + 20 * i, 100, 300 + 20 * i, 300), fill=(230, 200, 40))
+        draw.rectangle((350, 250 - 10 * i, 600, 460), fill=(90, 60, 30))
+        images.append(image)
+    return images
+
+
+def agreement(a, b):
+    """Token F1 between two captions; 1.0 means the same words."""
+    ta, tb = a.lower().split(), b.lower().split()
+    common = sum(min(ta.count(t), tb.count(t)) for t in set(ta))
+    if not common:
+        return 0.0
+    precision, recall = common / len(ta), common / len(tb)
+    return 2 * precision * recall / (precision + recall)
+
+
+def run_backend(backend, directory, repeats, queue):
+    import torch
+
+    images = load_images(directory)
+    before = _rss_mb()
+    start = time.perf_counter()
+    processor, model, device = load_blip(DEFAULT_MODEL_ID, backend=backend)
+    load_s = time.perf_counter() - start
+    resident = _rss_mb() - before
+
+    def caption(batch):
+        inputs = processor(images=batch, return_tensors="pt", padding=True).to(device)
+        with torch.inference_mode():
+            ids = model.generate(**inputs, max_new_tokens=50)
+        return processor.batch_decode(ids, skip_special_tokens=True)
+
+    caption(images[:1])  # warm-up
+    single = []
+    for _ in range(repeats):
+        for image in images:
+            start = time.perf_counter()
+            caption([image])
+            single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    captions = caption(images)
+    batch_s = time.perf_counter() - start
+    queue.put({
+        "backend": backend, "device": device, "threads": torch.get_num_threads(),
+        "load_s": load_s, "rss_mb": resident, "p50": _percentile(single, 50), "p95": _percentile(single, 95),
+        "batch_s": batch_s, "batch": len(images), "captions": captions,
+    })
+
+
+def benchmark(directory=None, repeats=3):
+    # Each backend loads in a fresh process so resident memory is measured in isolation
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for backend in BACKENDS:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_backend, args=(backend, directory, repeats, queue))
+        proc.start()
+        results[backend] = queue.get()
+        proc.join()
+
+    print(f"\n--- {DEFAULT_MODEL_ID}, {results['torch']['batch']} images ---")
+    for backend, r in results.items():
+        print(f"{backend:>6} ({r['device']}, {r['threads']} threads): load {r['load_s']:.1f} s, "
+              f"+{r['rss_mb']:.0f} MB resident, single p50 {r['p50']*1000:.0f} ms / p95 {r['p95']*1000:.0f} ms, "
+              f"batch {r['batch_s']*1000:.0f} ms ({r['batch_s']*1000/r['batch']:.0f} ms/image)")
+
+    base, quantized = results["torch"]["captions"], results["int8"]["captions"]
+    scores = [agreement(a, b) for a, b in zip(base, quantized)]
+    print(f"\nCaption agreement int8 vs torch: mean token F1 {sum(scores)/len(scores):.2f}, "
+          f"identical {sum(a == b for a, b in zip(base, quantized))}/{len(base)}")
+    for a, b in zip(base, quantized):
+        if a != b:
+            print(f"  torch: {a}\n  int8:  {b}")
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -5,6 +5,7 @@ import os
 import uuid
 import json
 import sqlite3
+import threading
 
 # Add repo root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -15,8 +16,8 @@ import ui.database
 ui.database.DB_FILE = "benchmark_chat_history.db"
 
 def setup_data():
-    if os.path.exists(ui.database.DB_FILE):
-        os.remove(ui.database.DB_FILE)
+    ui.database.close_all_connections()
+    _cleanup()
 
     ui.database.init_db()
 
@@ -44,6 +45,74 @@ def setup_data():
 
     return conv_id
 
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+def benchmark_concurrency(writers=50, writes_per_writer=40, readers=4):
+    """Concurrent writers hammer save_message while readers sample read latency."""
+    conv_id = setup_data()
+    user_id = "bench_user"
+
+    print(f"\n--- Concurrency: {writers} writers x {writes_per_writer} writes, {readers} readers ---")
+
+    read_latencies = []
+    latency_lock = threading.Lock()
+    done = threading.Event()
+    errors = []
+
+    def writer(n):
+        try:
+            own_conv = ui.database.create_new_conversation(user_id, f"Writer {n}")
+            for i in range(writes_per_writer):
+                ui.database.save_message(own_conv, "user", f"writer {n} message {i}")
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        local = []
+        while not done.is_set():
+            start = time.perf_counter()
+            ui.database.get_conversation_messages(conv_id)
+            local.append(time.perf_counter() - start)
+        with latency_lock:
+            read_latencies.extend(local)
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+
+    for t in reader_threads:
+        t.start()
+    start_time = time.perf_counter()
+    for t in writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - start_time
+    done.set()
+    for t in reader_threads:
+        t.join()
+
+    total_writes = writers * writes_per_writer
+    print(f"Writes: {total_writes} in {elapsed:.2f} s -> {total_writes / elapsed:.0f} writes/sec")
+    print(f"Reads sampled: {len(read_latencies)}")
+    print(f"Read latency p50: {_percentile(read_latencies, 50)*1000:.2f} ms")
+    print(f"Read latency p99: {_percentile(read_latencies, 99)*1000:.2f} ms")
+    if errors:
+        print(f"Writer errors: {len(errors)} (first: {errors[0]})")
+
+    ui.database.close_all_connections()
+    _cleanup()
+
+def _cleanup():
+    for suffix in ("", "-wal", "-shm"):
+        path = ui.database.DB_FILE + suffix
+        if os.path.exists(path):
+            os.remove(path)
+
 def benchmark():
     conv_id = setup_data()
 
@@ -78,9 +147,18 @@ def benchmark():
     print(f"First message idx (should be ~900): {msgs_offset[0].get('idx')}")
     print(f"Last message idx (should be ~949): {msgs_offset[-1].get('idx')}")
 
+    # Test 4: Keyset pagination (constant cost regardless of depth)
+    _, cursor = ui.database.get_conversation_page(conv_id, limit=50)
+    start_time = time.time()
+    msgs_keyset, _ = ui.database.get_conversation_page(conv_id, limit=50, before_id=cursor)
+    end_time = time.time()
+    print(f"Fetch Limit 50 before_id (Keyset): {(end_time - start_time)*1000:.2f} ms")
+    print(f"First message idx (should be ~900): {msgs_keyset[0].get('idx')}")
+
     # Clean up
-    if os.path.exists(ui.database.DB_FILE):
-        os.remove(ui.database.DB_FILE)
+    ui.database.close_all_connections()
+    _cleanup()
 
 if __name__ == "__main__":
+    benchmark_concurrency()
     benchmark()
@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add repo root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from video_analysis import analyze_video, ffmpeg_exe, probe
+
+
+def make_clip(path, seconds=600, size="1280x720", fps=30, gop=250):
+    """A synthetic H.264 clip with a hard cut every 30 seconds."""
+    sources = ["testsrc2", "smptebars", "rgbtestsrc", "mandelbrot"]
+    inputs, labels = [], []
+    for i in range(seconds // 30):
+        inputs += ["-f", "lavfi", "-t", "30", "-i", f"{sources[i % len(sources)]}=size={size}:rate={fps}"]
+        labels.append(f"[{i}:v]")
+    graph = "".join(labels) + f"concat=n={len(labels)}:v=1:a=0[v]"
+    subprocess.run([ffmpeg_exe(), "-v", "error", "-y", *inputs, "-filter_complex", graph, "-map", "[v]",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-g", str(gop), "-pix_fmt", "yuv420p", path],
+                   check=True)
+
+
+def legacy_moviepy(path, num_frames=5):
+    """The previous approach: info, frames and thumbnail each open and decode the file separately."""
+    from moviepy.editor import VideoFileClip
+
+    clip = VideoFileClip(path)
+    _ = (clip.duration, clip.fps, clip.size)
+    clip.close()
+    clip = VideoFileClip(path)
+    frames = [clip.get_frame(i * clip.duration / num_frames) for i in range(num_frames)]
+    clip.close()
+    clip = VideoFileClip(path)
+    clip.get_frame(min(5.0, clip.duration - 0.1))
+    clip.close()
+    return frames
+
+
+def _timed(label, fn, repeats=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<44} {best:7.2f} s")
+    return result
+
+
+def benchmark(seconds=600, num_frames=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "clip.mp4")
+        start = time.perf_counter()
+        make_clip(path, seconds)
+        info = probe(path)
+        print(f"Generated {info.duration:.0f} s {info.width}x{info.height} clip "
+              f"({os.path.getsize(path) / 2**20:.1f} MB) in {time.perf_counter() - start:.1f} s\n")
+
+        try:
+            _timed(f"moviepy: info + {num_frames} frames + thumbnail", lambda: legacy_moviepy(path, num_frames))
+        except ImportError:
+            print("moviepy not installed; skipping the legacy baseline")
+        _timed("probe only", lambda: probe(path))
+        _timed(f"analyze: {num_frames} keyframe seeks", lambda: analyze_video(path, num_frames))
+        _timed(f"analyze: {num_frames} exact seeks", lambda: analyze_video(path, num_frames, keyframes_only=False))
+        result = _timed(f"analyze: scene detection, {num_frames} frames",
+                        lambda: analyze_video(path, num_frames, scene_detection=True), repeats=1)
+        print(f"\nScene frames at: {', '.join(f'{frame.time:.1f}s' for frame in result.frames)}")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
@@ -31,3 +31,42 @@ def mock_streamlit_module():
     with pytest.MonkeyPatch.context() as mp:
         mp.setitem(sys.modules, 'streamlit', mock_st)
         yield mock_st
+
+
+def _import_real_module(name, monkeypatch):
+    """
+    Import ``name`` for real. Some test modules replace modules in
+    sys.modules at import time, so a stub is swapped out for the duration
+    of the test.
+    """
+    import importlib
+    import types
+
+    module = sys.modules.get(name)
+    if not isinstance(module, types.ModuleType) or not hasattr(module, "__file__"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+        module = importlib.import_module(name)
+        monkeypatch.setitem(sys.modules, name, module)
+    return module
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """The real ui.database module pointed at a throwaway DB file."""
+    module = _import_real_module("ui.database", monkeypatch)
+    monkeypatch.setattr(module, "DB_FILE", str(tmp_path / "test_chat_history.db"))
+    module.init_db()
+    yield module
+    module.close_all_connections()
+
+
+@pytest.fixture
+def brain_learning(monkeypatch):
+    """The real brain_learning module."""
+    return _import_real_module("brain_learning", monkeypatch)
+
+
+@pytest.fixture
+def brain_module(monkeypatch):
+    """The real brain module."""
+    return _import_real_module("brain", monkeypatch)
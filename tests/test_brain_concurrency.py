@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+MODELS = [
+    {"provider": "google", "model": "gemini", "api_key": "k1"},
+    {"provider": "openai", "model": "gpt", "api_key": "k2"},
+    {"provider": "anthropic", "model": "claude", "api_key": "k3"},
+]
+CHUNK_DELAY = 0.1
+
+
+@pytest.fixture
+def brain(brain_module, monkeypatch):
+    module = brain_module
+
+    def fake_stream(self, provider, model_name, prompt, api_key, config, usage=None):
+        if provider == "anthropic":
+            raise RuntimeError("overloaded")
+        for word in ("hello", " from", f" {provider}"):
+            time.sleep(CHUNK_DELAY)
+            yield word
+
+    monkeypatch.setattr(module.AIBrain, "_stream_provider", fake_stream)
+    return module.AIBrain()
+
+
+def test_models_run_concurrently_and_keep_order(brain):
+    start = time.perf_counter()
+    results = asyncio.run(brain.query_multiple_models("hi", MODELS, {}))
+    elapsed = time.perf_counter() - start
+
+    # Each streaming model takes 3 * CHUNK_DELAY; run one after another they would take twice that
+    assert elapsed < 2 * 3 * CHUNK_DELAY
+    assert [r["provider"] for r in results] == ["google", "openai", "anthropic"]
+    assert results[0]["response"] == "hello from google"
+    assert results[0]["success"] and results[0]["first_token_time"] > 0
+    assert results[2]["success"] is False
+    assert results[2]["response"] == "Error: overloaded"
+
+
+def test_stream_interleaves_chunks_from_all_models(brain):
+    events = []
+    asyncio.run(brain.query_multiple_models("hi", MODELS[:2], {}, on_event=events.append))
+
+    chunk_order = [e["index"] for e in events if e["type"] == "chunk"]
+    # Both models produce output before either finishes
+    assert set(chunk_order[:2]) == {0, 1}
+    for index in (0, 1):
+        positions = [i for i, e in enumerate(events) if e["index"] == index]
+        assert events[positions[-1]]["type"] == "result"
+        assert "".join(events[i]["text"] for i in positions[:-1]) == events[positions[-1]]["result"]["response"]
+
+
+def test_empty_prompt_is_rejected(brain):
+    result = asyncio.run(brain.query_model("google", "gemini", "  ", "k", {}))
+    assert result["success"] is False
+    assert "Prompt cannot be empty" in result["response"]
+
+
+@pytest.fixture
+def timed_brain(brain_module, monkeypatch):
+    """Brain whose fake providers answer after a per-provider delay (list = per attempt)."""
+    delays = {"google": [0.05], "openai": [0.1], "anthropic": [1.0]}
+    calls = {}
+
+    def fake_stream(self, provider, model_name, prompt, api_key, config, usage=None):
+        attempt = calls.get(provider, 0)
+        calls[provider] = attempt + 1
+        plan = delays[provider]
+        time.sleep(plan[min(attempt, len(plan) - 1)] / 2)
+        yield f"{provider} part"
+        time.sleep(plan[min(attempt, len(plan) - 1)] / 2)
+        yield " done"
+
+    monkeypatch.setattr(brain_module.AIBrain, "_stream_provider", fake_stream)
+    brain_module.latency_tracker.clear()
+    yield brain_module, delays, calls
+    brain_module.latency_tracker.clear()
+
+
+def test_quorum_returns_early_and_marks_late(timed_brain):
+    module, _, _ = timed_brain
+    brain = module.AIBrain()
+    start = time.perf_counter()
+    results = asyncio.run(brain.query_multiple_models("hi", MODELS, {}, quorum=2))
+    assert time.perf_counter() - start < 0.5
+
+    assert [r["success"] for r in results] == [True, True, False]
+    assert results[2]["late"] is True
+
+    synthesis = brain.synthesize_responses("hi", results, "")
+    assert "## Late Responses" in synthesis
+    assert "Failed Queries" not in synthesis
+    assert "**Late responses:** 1" in synthesis
+
+
+def test_deadline_and_provider_timeout(timed_brain):
+    module, _, _ = timed_brain
+    brain = module.AIBrain()
+
+    results = asyncio.run(brain.query_multiple_models("hi", MODELS, {}, provider_timeout=0.3))
+    assert results[2]["timed_out"] is True and results[2]["success"] is False
+    assert "late" not in results[2]
+
+    start = time.perf_counter()
+    results = asyncio.run(brain.query_multiple_models("hi", MODELS, {}, deadline=0.7))
+    assert time.perf_counter() - start < 0.9
+    assert [bool(r.get("late")) for r in results] == [False, False, True]
+    # Late results keep what had streamed before the cutoff
+    assert results[2]["response"] == "anthropic part"
+
+
+def test_slow_tail_provider_is_hedged(timed_brain):
+    module, delays, calls = timed_brain
+    for _ in range(module.HEDGE_MIN_SAMPLES):
+        module.latency_tracker.record("anthropic", 0.2)
+    module.latency_tracker.record("anthropic", module.HEDGE_P95_THRESHOLD + 1)
+    # First attempt stalls, the duplicate sent after the median answers quickly
+    delays["anthropic"] = [2.0, 0.1]
+
+    start = time.perf_counter()
+    result = asyncio.run(module.AIBrain().query_multiple_models("hi", MODELS[2:], {}, hedge=True))[0]
+    assert time.perf_counter() - start < 1.0
+    assert result["success"] and result["hedged"] and result["attempts"] == 2
+    assert calls["anthropic"] == 2
+
+    # Providers without a heavy tail are never duplicated
+    asyncio.run(module.AIBrain().query_multiple_models("hi", MODELS[:1], {}, hedge=True))
+    assert calls["google"] == 1
@@ -0,0 +1,154 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from brain_embeddings import EmbeddingIndex, HashingEmbedder
+
+
+def test_hashing_embedder_is_normalized_and_stable():
+    embedder = HashingEmbedder(dim=64)
+    vectors = embedder(["python decorators", "python decorators", ""])
+    assert vectors.shape == (3, 64)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[0]), 1.0)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert not vectors[2].any()
+
+
+def test_search_ranks_by_cosine_and_tolerates_typos():
+    index = EmbeddingIndex(HashingEmbedder())
+    index.add_many([
+        ("py", "Explain python decorators. Decorators wrap functions"),
+        ("hike", "Best hiking trails in Colorado"),
+        ("car", "How do I keep my car engine healthy"),
+    ])
+    assert index.search("decoratr syntax", k=1)[0][0] == "py"
+    results = index.search_batch(["colorado hikes", "engine maintenance"], k=2)
+    assert [hits[0][0] for hits in results] == ["hike", "car"]
+
+
+def test_add_is_incremental_and_retain_filters():
+    embedder = HashingEmbedder(dim=32)
+    calls = []
+
+    def counting(texts):
+        calls.append(len(texts))
+        return embedder(texts)
+    counting.dim = embedder.dim
+
+    index = EmbeddingIndex(counting)
+    index.add_many([("a", "volcano eruption"), ("b", "glacier melting")])
+    assert index.add_many([("a", "volcano eruption"), ("c", "volcanic ash")]) == 1
+    assert calls == [2, 1]
+
+    index.retain(["b", "c"])
+    assert len(index) == 2
+    assert "a" not in [key for key, _ in index.search("volcano", k=3)]
+
+
+def test_memmap_vectors_survive_reopen(tmp_path):
+    path = str(tmp_path / "vectors")
+    index = EmbeddingIndex(HashingEmbedder(dim=32), path=path)
+    index.add_many((f"k{i}", f"document number {i} about topic{i % 7}") for i in range(1500))
+    expected = index.search("topic3", k=5)
+    index.close()
+
+    reopened = EmbeddingIndex(HashingEmbedder(dim=32), path=path)
+    assert len(reopened) == 1500
+    assert reopened.search("topic3", k=5) == expected
+    assert reopened.add("k0", "ignored: already stored") is False
+
+    # A different dimension cannot reuse the file
+    assert len(EmbeddingIndex(HashingEmbedder(dim=16), path=path)) == 0
+
+
+def test_another_embedder_of_the_same_dimension_re_embeds(tmp_path):
+    path = str(tmp_path / "vectors")
+    index = EmbeddingIndex(HashingEmbedder(), path=path)
+    index.add_many([("a", "volcano eruption"), ("b", "glacier melting")])
+    index.close()
+
+    class OtherEmbedder:
+        identity = "sentence-transformers:other-model"
+        dim = 384
+
+        def __init__(self):
+            self.calls = []
+
+        def __call__(self, texts):
+            self.calls.append(list(texts))
+            return HashingEmbedder()(texts)
+
+    other = OtherEmbedder()
+    reopened = EmbeddingIndex(other, path=path)
+    assert len(reopened) == 0
+    assert reopened.add_many([("a", "volcano eruption"), ("b", "glacier melting")]) == 2
+    assert other.calls == [["volcano eruption", "glacier melting"]]
+    reopened.close()
+
+    # The original embedder sees the other one's header and rebuilds again
+    assert len(EmbeddingIndex(HashingEmbedder(), path=path)) == 0
+
+
+def test_learning_brain_recalls_semantically(brain_learning, tmp_path):
+    store_path = str(tmp_path / "brain.db")
+    brain = brain_learning.LearningBrain(store_path=store_path, embedder=HashingEmbedder())
+    brain.learn_from_responses("Explain python decorators",
+                               [{"provider": "google", "response": "Decorators wrap functions", "success": True}])
+    # Misspelling shares no BM25 term with the entry
+    assert brain.get_related_knowledge("decoratr", limit=1)[0]["query"] == "Explain python decorators"
+
+    brain.learn_from_responses("Best hiking trails in Colorado",
+                               [{"provider": "google", "response": "Maroon Bells loop", "success": True}])
+    assert brain.get_related_knowledge("coloradan hikes", limit=1)[0]["query"] == "Best hiking trails in Colorado"
+    brain.store.close()
+
+    reloaded = brain_learning.LearningBrain(store_path=store_path, embedder=HashingEmbedder())
+    reloaded.get_related_knowledge("anything")
+    assert len(reloaded._embeddings) == 2
+
+
+def test_trimmed_entries_leave_the_vector_index(brain_learning, tmp_path, monkeypatch):
+    monkeypatch.setattr(brain_learning, "MAX_KB_PER_TOPIC", 3)
+    brain = brain_learning.LearningBrain(store_path=str(tmp_path / "brain.db"), embedder=HashingEmbedder())
+    brain.get_related_knowledge("anything")
+    for i in range(6):
+        brain.learn_from_responses(f"volcano eruption {i}",
+                                   [{"provider": "google", "response": f"lava flow {i}", "success": True}])
+    assert len(brain._embeddings) == 3
+    recalled = {r["query"] for r in brain.get_related_knowledge("volcano eruption", limit=5)}
+    assert recalled == {"volcano eruption 3", "volcano eruption 4", "volcano eruption 5"}
+
+
+def test_recall_is_safe_while_other_sessions_learn(brain_learning, tmp_path, monkeypatch):
+    monkeypatch.setattr(brain_learning, "MAX_KB_PER_TOPIC", 3)
+    brain = brain_learning.LearningBrain(store_path=str(tmp_path / "brain.db"), embedder=HashingEmbedder())
+    errors = []
+
+    def learn(worker):
+        try:
+            for i in range(20):
+                brain.learn_from_responses(f"volcano eruption {worker} {i}",
+                                           [{"provider": "google", "response": f"lava flow {i}", "success": True}])
+        except Exception as e:
+            errors.append(e)
+
+    def recall():
+        try:
+            for _ in range(40):
+                brain.get_related_knowledge("volcano lava", limit=3)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=learn, args=(w,)) for w in range(3)]
+    threads += [threading.Thread(target=recall) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    # Both indexes agree once the dust settles
+    assert len(brain._index) == len(brain._indexed_entries) == len(brain._fingerprints) == len(brain._embeddings)
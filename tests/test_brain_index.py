@@ -0,0 +1,54 @@
+from brain_index import BM25Index, stem, tokenize
+
+
+def test_tokenize_drops_stopwords_and_stems():
+    assert tokenize("How are the Running dogs?") == ["run", "dog"]
+    assert stem("classes") == "class"
+    assert stem("class") == "class"
+    assert stem("stopped") == "stop"
+
+
+def test_bm25_prefers_rarer_and_more_frequent_terms():
+    index = BM25Index()
+    index.add(1, "python packaging with poetry")
+    index.add(2, "python python python generators")
+    index.add(3, "cooking pasta at home")
+
+    hits = index.search("python generators", k=3)
+    assert [doc for doc, _ in hits] == [2, 1]
+    assert hits[0][1] > hits[1][1]
+
+
+def test_near_matches_found_through_stemming():
+    index = BM25Index()
+    index.add("a", "Deploying containers to Kubernetes clusters")
+    assert index.search("kubernetes deployment")[0][0] == "a"
+
+
+def test_remove_and_reindex():
+    index = BM25Index()
+    index.add(1, "volcano eruption")
+    index.add(1, "glacier melting")
+    assert index.search("volcano") == []
+    assert index.search("glaciers")[0][0] == 1
+
+    index.remove(1)
+    assert len(index) == 0
+    assert index.search("glacier") == []
+
+
+def test_learning_brain_recall_is_ranked_by_relevance(brain_learning):
+    brain = brain_learning.LearningBrain()
+    brain.learn_from_responses("Explain python decorators",
+                               [{"provider": "google", "response": "Decorators wrap functions", "success": True}])
+    brain.learn_from_responses("Best hiking trails in Colorado",
+                               [{"provider": "google", "response": "Try the Maroon Bells loop", "success": True}])
+
+    related = brain.get_related_knowledge("how does a decorator work")
+    assert related[0]["query"] == "Explain python decorators"
+    assert len(related) == 1
+
+    # Entries learned after the index is built are added incrementally
+    brain.learn_from_responses("Colorado ski resorts",
+                               [{"provider": "openai", "response": "Vail and Aspen", "success": True}])
+    assert [r["query"] for r in brain.get_related_knowledge("colorado skiing", limit=1)] == ["Colorado ski resorts"]
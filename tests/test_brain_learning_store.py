@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+
+
+RESPONSES = [
+    {"provider": "google", "response": "Photosynthesis converts light to energy", "success": True},
+    {"provider": "openai", "response": "Plants use chlorophyll", "success": True},
+]
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "brain.db")
+
+
+def test_learning_survives_restart(brain_learning, store_path):
+    brain = brain_learning.LearningBrain(store_path=store_path)
+    brain.learn_from_responses("explain photosynthesis in plants", RESPONSES)
+    brain.store.close()
+
+    reloaded = brain_learning.LearningBrain(store_path=store_path)
+    assert reloaded.model_performance["google"]["success"] == 1
+    assert len(reloaded.conversation_history) == 1
+    # Topics are not read until something asks for them
+    assert reloaded.knowledge_base == {}
+
+    related = reloaded.get_related_knowledge("photosynthesis")
+    assert related[0]["query"] == "explain photosynthesis in plants"
+    assert reloaded.recommend_models("photosynthesis", ["openai", "google", "xai"])[-1] == "xai"
+
+
+def test_learning_writes_only_the_delta(brain_learning, store_path):
+    brain = brain_learning.LearningBrain(store_path=store_path)
+    brain.learn_from_responses("explain photosynthesis in plants", RESPONSES)
+
+    statements = []
+    brain.store._conn.set_trace_callback(statements.append)
+    brain.learn_from_responses("volcano eruption causes", RESPONSES[:1])
+    brain.store._conn.set_trace_callback(None)
+
+    writes = [s for s in statements if s.split()[0] in ("INSERT", "UPDATE", "DELETE")]
+    assert writes
+    assert not any("photosynthesis" in s for s in writes)
+    assert not any("'openai'" in s for s in writes)
+
+
+def test_topic_entries_are_trimmed_in_store(brain_learning, store_path):
+    brain = brain_learning.LearningBrain(store_path=store_path)
+    for i in range(brain_learning.MAX_KB_PER_TOPIC + 5):
+        brain.learn_from_responses(f"gravity question {i}", RESPONSES[:1])
+
+    conn = sqlite3.connect(store_path)
+    count = conn.execute("SELECT COUNT(*) FROM knowledge WHERE topic = 'gravity'").fetchone()[0]
+    conn.close()
+    assert count == brain_learning.MAX_KB_PER_TOPIC
+    assert len(brain.knowledge_base["gravity"]) == brain_learning.MAX_KB_PER_TOPIC
+
+
+@pytest.mark.parametrize("persistent", [True, False])
+def test_trimmed_entries_leave_the_recall_index(brain_learning, store_path, persistent):
+    brain = brain_learning.LearningBrain(store_path=store_path if persistent else None, semantic=False)
+    brain.learn_from_responses("gravity physics basics", RESPONSES[:1])
+    brain.get_related_knowledge("gravity")  # builds the index
+    for i in range(brain_learning.MAX_KB_PER_TOPIC + 5):
+        brain.learn_from_responses(f"gravity question {i}", RESPONSES[:1])
+
+    indexed = {entry.query for entry in brain._indexed_entries.values()}
+    # Trimmed from "gravity" and "question", but "physics" still holds the first entry
+    assert "gravity physics basics" in indexed
+    assert "gravity question 0" not in indexed and "gravity question 24" in indexed
+    assert len(brain._index) == len(brain._indexed_entries) == brain_learning.MAX_KB_PER_TOPIC + 1
+    assert len(brain._fingerprints) == len(brain._indexed_entries)
+    assert len(set(brain._indexed_keys.values())) == len(brain._indexed_keys)
+    recalled = [r["query"] for r in brain.get_related_knowledge("gravity question 0", limit=30)]
+    assert "gravity question 0" not in recalled
+
+
+def test_stats_and_export_cover_unloaded_topics(brain_learning, store_path):
+    brain = brain_learning.LearningBrain(store_path=store_path)
+    brain.learn_from_responses("explain photosynthesis in plants", RESPONSES)
+    brain.store.close()
+
+    reloaded = brain_learning.LearningBrain(store_path=store_path)
+    stats = reloaded.get_learning_stats()
+    assert stats["total_topics"] == 3
+    assert {"topic": "photosynthesis", "count": 1} in stats["top_topics"]
+    assert "photosynthesis" in stats["model_strengths"][0]["top_topics"]
+
+    fresh = brain_learning.LearningBrain()
+    assert fresh.import_knowledge(reloaded.export_knowledge())
+    assert set(fresh.knowledge_base) == {"explain", "photosynthesis", "plants"}
+
+
+def test_reset_and_import_rewrite_store(brain_learning, store_path):
+    brain = brain_learning.LearningBrain(store_path=store_path)
+    brain.learn_from_responses("explain photosynthesis in plants", RESPONSES)
+    exported = brain.export_knowledge()
+
+    brain.reset_learning()
+    assert brain_learning.LearningBrain(store_path=store_path).get_learning_stats()["total_topics"] == 0
+
+    assert brain.import_knowledge(exported)
+    assert brain_learning.LearningBrain(store_path=store_path).get_learning_stats()["total_topics"] == 3
+
+
+def test_in_memory_mode_is_unchanged(brain_learning):
+    brain = brain_learning.LearningBrain()
+    brain.learn_from_responses("explain photosynthesis in plants", RESPONSES)
+    assert brain.store is None
+    assert brain.get_learning_stats()["total_topics"] == 3
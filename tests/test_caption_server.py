@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from caption_server import CaptionServer, DynamicBatcher, multipart_field
+
+
+class RecordingCaptioner:
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, images):
+        with self.lock:
+            self.batches.append(len(images))
+        return [f"caption of {image}" for image in images]
+
+
+@pytest.fixture
+def server():
+    captioner = RecordingCaptioner()
+    batcher = DynamicBatcher(captioner, max_batch_size=8, max_wait=0.2)
+    srv = CaptionServer(("127.0.0.1", 0), batcher, decode=lambda data: data.decode())
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv, captioner
+    srv.shutdown()
+    srv.server_close()
+    batcher.close()
+
+
+def _post(url, payload: bytes):
+    # Same request shape as ui.chat_utils.call_hosted_caption_api
+    files = {"image": ("image.png", payload, "image/png")}
+    return requests.post(url, files=files, timeout=10)
+
+
+def test_multipart_field_extraction():
+    request = requests.Request("POST", "http://x", files={"image": ("a.png", b"\x89PNG\r\n", "image/png")},
+                               data={"other": "1"}).prepare()
+    assert multipart_field(request.headers["Content-Type"], request.body, "image") == b"\x89PNG\r\n"
+    assert multipart_field(request.headers["Content-Type"], request.body, "missing") is None
+    assert multipart_field("application/json", b"{}", "image") is None
+
+
+def test_hosted_api_contract(server):
+    srv, _ = server
+    response = _post(srv.url, b"cat")
+    assert response.status_code == 200
+    assert response.json() == {"caption": "caption of cat"}
+    assert requests.post(srv.url, data=b"raw", timeout=10).status_code == 400
+    assert requests.get(srv.url.replace("/caption", "/health"), timeout=10).json()["requests"] == 1
+
+
+def test_concurrent_requests_share_batches(server):
+    srv, captioner = server
+    names = [f"img{i}" for i in range(6)]
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        responses = list(pool.map(lambda name: _post(srv.url, name.encode()), names))
+    assert [r.json()["caption"] for r in responses] == [f"caption of {name}" for name in names]
+    assert sum(captioner.batches) == 6
+    assert len(captioner.batches) < 6
+
+
+def test_batch_failures_reach_every_caller():
+    def broken(images):
+        raise RuntimeError("model crashed")
+
+    batcher = DynamicBatcher(broken, max_wait=0.01)
+    with pytest.raises(RuntimeError):
+        batcher.caption("img", timeout=5)
+    assert batcher.stats()["errors"] == 1
+    batcher.close()
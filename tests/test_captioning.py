@@ -0,0 +1,119 @@
+import threading
+
+import captioning
+from captioning import CaptionCache, CaptionEngine, image_hash
+
+
+class FakeImage:
+    def __init__(self, pixels: bytes, size=(2, 2)):
+        self.pixels = pixels
+        self.size = size
+
+    def convert(self, mode):
+        return self
+
+    def tobytes(self):
+        return self.pixels
+
+
+class FakeInputs(dict):
+    def to(self, device):
+        return self
+
+
+class FakeProcessor:
+    def __call__(self, images, return_tensors=None, padding=False):
+        return FakeInputs(pixel_values=list(images))
+
+    def batch_decode(self, output_ids, skip_special_tokens=True):
+        return [f"a photo of {image.pixels.decode()}" for image in output_ids]
+
+
+class FakeModel:
+    def __init__(self):
+        self.batches = []
+
+    def generate(self, pixel_values, max_new_tokens=50):
+        self.batches.append(len(pixel_values))
+        return pixel_values
+
+
+def make_engine(tmp_path, **kwargs):
+    model = FakeModel()
+    cache = CaptionCache(disk_path=str(tmp_path / "captions.db"))
+    engine = CaptionEngine(lambda: (FakeProcessor(), model, "cpu"), cache, **kwargs)
+    return engine, model
+
+
+def test_image_hash_follows_content():
+    assert image_hash(FakeImage(b"cat")) == image_hash(FakeImage(b"cat"))
+    assert image_hash(FakeImage(b"cat")) != image_hash(FakeImage(b"dog"))
+    assert image_hash(FakeImage(b"cat", (1, 4))) != image_hash(FakeImage(b"cat", (2, 2)))
+
+
+def test_one_forward_pass_per_upload(tmp_path):
+    engine, model = make_engine(tmp_path)
+    images = [FakeImage(b"cat"), FakeImage(b"dog"), FakeImage(b"cat")]
+    assert engine.caption_batch(images) == ["a photo of cat", "a photo of dog", "a photo of cat"]
+    # The duplicate is captioned once, in the same pass
+    assert model.batches == [2]
+
+
+def test_reruns_and_new_processes_hit_the_cache(tmp_path):
+    engine, model = make_engine(tmp_path)
+    engine.caption_batch([FakeImage(b"cat"), FakeImage(b"dog")])
+    assert engine.caption_batch([FakeImage(b"dog"), FakeImage(b"cat")]) == ["a photo of dog", "a photo of cat"]
+    assert model.batches == [2]
+    assert engine.stats()["cache_hits"] == 2
+
+    # A fresh engine on the same disk store needs no inference either
+    restarted, restarted_model = make_engine(tmp_path)
+    assert restarted.caption(FakeImage(b"cat")) == "a photo of cat"
+    assert restarted_model.batches == []
+
+
+def test_only_uncached_images_are_batched(tmp_path):
+    engine, model = make_engine(tmp_path, max_batch_size=2)
+    engine.caption(FakeImage(b"cat"))
+    engine.caption_batch([FakeImage(b"cat")] + [FakeImage(bytes([65 + i])) for i in range(3)])
+    assert model.batches == [1, 2, 1]
+
+
+def test_concurrent_sessions_share_inference(tmp_path, monkeypatch):
+    monkeypatch.setattr(captioning, "_inference_slots", threading.BoundedSemaphore(1))
+    engine, model = make_engine(tmp_path)
+    barrier = threading.Barrier(4)
+    results = []
+
+    def session():
+        barrier.wait()
+        results.append(engine.caption(FakeImage(b"cat")))
+
+    threads = [threading.Thread(target=session) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["a photo of cat"] * 4
+    assert model.batches == [1]
+
+
+def test_backend_and_thread_settings(monkeypatch):
+    monkeypatch.setenv("CAPTION_BACKEND", "INT8")
+    assert captioning.caption_backend() == "int8"
+    monkeypatch.setenv("CAPTION_BACKEND", "onnx-gpu")
+    assert captioning.caption_backend() == captioning.DEFAULT_BACKEND
+    monkeypatch.setenv("CAPTION_THREADS", "3")
+    assert captioning.caption_threads() == 3
+    monkeypatch.setenv("CAPTION_THREADS", "many")
+    assert captioning.caption_threads() >= 1
+
+
+def test_backends_cache_captions_separately(tmp_path):
+    cache = CaptionCache(disk_path=str(tmp_path / "captions.db"))
+    full = CaptionEngine(lambda: (FakeProcessor(), FakeModel(), "cpu"), cache, model_tag="blip:torch")
+    model = FakeModel()
+    quantized = CaptionEngine(lambda: (FakeProcessor(), model, "cpu"), cache, model_tag="blip:int8")
+    full.caption(FakeImage(b"cat"))
+    quantized.caption(FakeImage(b"cat"))
+    assert model.batches == [1]
@@ -0,0 +1,64 @@
+def _seed(database, count):
+    conv_id = database.create_new_conversation("page_user", "Paging")
+    for i in range(count):
+        database.save_message(conv_id, "user", f"Message {i}")
+    return conv_id
+
+
+def test_migrations_create_history_indexes(database):
+    with database.get_connection() as conn:
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    assert "idx_messages_conversation_id" in names
+    assert "idx_conversations_user_updated" in names
+    assert version == len(database.SCHEMA_MIGRATIONS)
+
+
+def test_init_db_is_idempotent(database):
+    database.init_db()
+    with database.get_connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(database.SCHEMA_MIGRATIONS)
+
+
+def test_page_reads_use_conversation_index(database):
+    with database.get_connection() as conn:
+        plan = conn.execute("EXPLAIN QUERY PLAN " + database.SQL_SELECT_MESSAGES_PAGE_BEFORE,
+                            ("c", 10, 5, 0)).fetchall()
+    detail = " ".join(row[-1] for row in plan)
+    assert "idx_messages_conversation_id" in detail
+    assert "TEMP B-TREE" not in detail
+
+
+def test_keyset_pages_walk_back_to_start(database):
+    conv_id = _seed(database, 120)
+
+    page, cursor = database.get_conversation_page(conv_id, limit=50)
+    assert [m["content"] for m in page] == [f"Message {i}" for i in range(70, 120)]
+
+    page, cursor = database.get_conversation_page(conv_id, limit=50, before_id=cursor)
+    assert page[0]["content"] == "Message 20"
+    assert page[-1]["content"] == "Message 69"
+
+    page, cursor = database.get_conversation_page(conv_id, limit=50, before_id=cursor)
+    assert [m["content"] for m in page] == [f"Message {i}" for i in range(20)]
+    assert cursor is None
+
+
+def test_get_conversation_messages_limit_and_before_id(database):
+    conv_id = _seed(database, 30)
+    assert len(database.get_conversation_messages(conv_id)) == 30
+
+    newest = database.get_conversation_messages(conv_id, limit=10)
+    assert newest[-1]["content"] == "Message 29"
+
+    _, cursor = database.get_conversation_page(conv_id, limit=10)
+    older = database.get_conversation_messages(conv_id, limit=10, before_id=cursor)
+    assert older[-1]["content"] == "Message 19"
+
+
+def test_user_conversations_limit(database):
+    for i in range(5):
+        database.create_new_conversation("list_user", f"Chat {i}")
+    rows = database.get_user_conversations("list_user", limit=3)
+    assert len(rows) == 3
+    assert [r[1] for r in rows] == ["Chat 4", "Chat 3", "Chat 2"]
@@ -0,0 +1,44 @@
+import sqlite3
+import threading
+
+
+def test_connections_use_wal_journal(database):
+    with database.get_connection() as conn:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode.lower() == "wal"
+
+
+def test_connections_are_reused_across_calls(database):
+    with database.get_connection() as first:
+        pass
+    with database.get_connection() as second:
+        pass
+    assert first is second
+
+
+def test_nested_checkout_reuses_thread_connection(database):
+    with database.get_connection() as outer:
+        with database.get_connection() as inner:
+            assert inner is outer
+
+
+def test_concurrent_writers_do_not_lose_messages(database):
+    conv_id = database.create_new_conversation("pool_user", "Pool")
+
+    def writer(n):
+        for i in range(20):
+            database.save_message(conv_id, "user", f"{n}-{i}")
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(database.get_conversation_messages(conv_id)) == 200
+
+    # Committed writes are visible to an independent connection
+    conn = sqlite3.connect(database.DB_FILE)
+    count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    conn.close()
+    assert count == 200
@@ -0,0 +1,115 @@
+import sys
+
+import pytest
+
+from document_ingest import (
+    DocumentIndex,
+    DocumentStore,
+    ProgressBoard,
+    chunk_pages,
+    extract_pdf_pages,
+    format_pages,
+)
+
+FAKE_PYPDF2 = '''
+class _Page:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+
+class PdfReader:
+    def __init__(self, stream):
+        self.pages = [_Page(t.decode()) for t in stream.read().split(b"\\f")]
+        self.metadata = None
+'''
+
+
+@pytest.fixture
+def fake_pypdf2(tmp_path, monkeypatch):
+    """A PyPDF2 stand-in importable by spawned worker processes too (pages separated by form feeds)."""
+    (tmp_path / "PyPDF2.py").write_text(FAKE_PYPDF2)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "PyPDF2", raising=False)
+
+
+def _pdf(pages):
+    return "\f".join(pages).encode()
+
+
+def test_small_pdfs_are_extracted_inline(fake_pypdf2):
+    calls = []
+    pages = extract_pdf_pages(_pdf(["one", "", "three"]), progress=lambda d, t: calls.append((d, t)))
+    assert pages == ["one", "", "three"]
+    assert calls[-1] == (3, 3)
+    assert format_pages(pages) == "\n--- Page 1 ---\none\n--- Page 2 ---\n\n--- Page 3 ---\nthree"
+
+
+def test_long_pdfs_are_extracted_in_parallel_and_in_order(fake_pypdf2):
+    source = [f"page {i} text" for i in range(40)]
+    calls = []
+    pages = extract_pdf_pages(_pdf(source), progress=lambda d, t: calls.append((d, t)), workers=2)
+    assert pages == source
+    assert calls[-1] == (40, 40)
+    assert len(calls) == 5  # one update per range of pages
+
+
+def test_chunks_overlap_and_track_pages():
+    pages = [" ".join(f"a{i}" for i in range(10)), " ".join(f"b{i}" for i in range(10))]
+    chunks = chunk_pages(pages, chunk_words=8, overlap=3)
+    assert [c.text.split()[0] for c in chunks] == ["a0", "a5", "b0", "b5"]
+    assert chunks[0].text.split()[-3:] == chunks[1].text.split()[:3]
+    assert (chunks[1].first_page, chunks[1].last_page) == (1, 2)
+    assert chunks[1].pages == "pp. 1-2"
+    assert chunk_pages(["", ""]) == []
+
+
+def test_long_documents_send_only_relevant_chunks(monkeypatch):
+    monkeypatch.setattr("document_ingest.FULL_TEXT_WORDS", 100)
+    filler = " ".join(["lorem ipsum dolor"] * 200)
+    pages = [filler, "The reactor cooling pump failed during the night shift.", filler]
+    index = DocumentIndex(pages, chunk_words=50, overlap=10)
+    context = index.context("Why did the cooling pump fail?", k=2)
+    assert "reactor cooling pump failed" in context
+    assert "p. 2" in context
+    assert len(context) < len(format_pages(pages)) / 4
+
+    short = DocumentIndex(["just a few words"])
+    assert short.context("anything") == format_pages(["just a few words"])
+
+
+def test_store_indexes_each_document_once_per_conversation():
+    store = DocumentStore(max_conversations=2)
+    builds = []
+
+    def pages():
+        builds.append(1)
+        return ["text"]
+
+    first = store.get_or_build("c1", "doc", pages)
+    assert store.get_or_build("c1", "doc", pages) is first
+    store.get_or_build("c2", "doc", pages)
+    store.get_or_build("c3", "doc", pages)
+    assert len(builds) == 3
+    assert store.stats() == {"conversations": 2, "documents": 2}
+
+
+def test_progress_board_combines_files():
+    board = ProgressBoard()
+    assert board.snapshot() is None
+    board.reporter("a.pdf")(5, 10)
+    board.reporter("b.pdf")(10, 10)
+    fraction, label = board.snapshot()
+    assert fraction == 0.75
+    assert "a.pdf: 5/10 pages" in label
+
+
+def test_progress_board_keeps_units_and_partials():
+    board = ProgressBoard()
+    report = board.reporter("talk.mp3", unit="segments")
+    report(1, 4, "[00:00] hello")
+    report(2, 4)
+    assert board.snapshot() == (0.5, "talk.mp3: 2/4 segments")
+    assert board.partials() == {"talk.mp3": "[00:00] hello"}
@@ -0,0 +1,88 @@
+def _conversation(database, user_id, title, *contents):
+    conv_id = database.create_new_conversation(user_id, title)
+    for content in contents:
+        database.save_message(conv_id, "user", content)
+    return conv_id
+
+
+def test_search_returns_ranked_highlighted_snippets(database):
+    conv_id = _conversation(
+        database, "alice", "Python chat",
+        "How do I parse a CSV file in Python?",
+        "Python python python generators are lazy",
+    )
+    _conversation(database, "alice", "Cooking", "Best pasta recipe")
+
+    hits = database.search_messages("alice", "python", limit=5)
+
+    assert len(hits) == 2
+    assert all(h["conversation_id"] == conv_id for h in hits)
+    assert hits[0]["snippet"].count("**Python**") + hits[0]["snippet"].count("**python**") == 3
+    assert hits[0]["score"] <= hits[1]["score"]
+    assert hits[0]["title"] == "Python chat"
+
+
+def test_search_is_scoped_to_user(database):
+    _conversation(database, "alice", "Mine", "secret quantum notes")
+    _conversation(database, "bob", "Theirs", "quantum computing basics")
+
+    hits = database.search_messages("bob", "quantum")
+    assert [h["title"] for h in hits] == ["Theirs"]
+
+
+def test_search_matches_prefix_and_ignores_fts_syntax(database):
+    _conversation(database, "alice", "Deploy", "Kubernetes deployment rollout")
+
+    assert database.search_messages("alice", "deploy")
+    assert database.search_messages("alice", 'kubernetes" (rollout') != []
+    assert database.search_messages("alice", "   ") == []
+
+
+def test_index_follows_deletes_and_batched_writes(database):
+    conv_id = _conversation(database, "alice", "Temp", "ephemeral zebra fact")
+    assert database.search_messages("alice", "zebra")
+
+    database.delete_conversation(conv_id)
+    assert database.search_messages("alice", "zebra") == []
+
+    database.save_batch(
+        [("c-batch", "alice", "Batched", database.datetime.now())],
+        [("c-batch", "user", "queued giraffe fact", {}, database.datetime.now())],
+    )
+    assert [h["title"] for h in database.search_messages("alice", "giraffe")] == ["Batched"]
+
+
+def test_migration_backfills_existing_messages(database):
+    conv_id = _conversation(database, "alice", "Old", "pre-index walrus message")
+    with database.get_connection() as conn, conn:
+        conn.execute("DROP TRIGGER messages_fts_ai")
+        conn.execute("DROP TRIGGER messages_fts_ad")
+        conn.execute("DROP TRIGGER messages_fts_au")
+        conn.execute("DROP TABLE messages_fts")
+        conn.execute("PRAGMA user_version = 1")
+
+    database.init_db()
+
+    hits = database.search_messages("alice", "walrus")
+    assert [h["conversation_id"] for h in hits] == [conv_id]
+
+
+def test_index_is_built_once_fts5_becomes_available(database, monkeypatch):
+    # First run on a SQLite without FTS5: the migration is skipped but user_version still advances
+    with database.get_connection() as conn, conn:
+        conn.execute("DROP TRIGGER messages_fts_ai")
+        conn.execute("DROP TRIGGER messages_fts_ad")
+        conn.execute("DROP TRIGGER messages_fts_au")
+        conn.execute("DROP TABLE messages_fts")
+    fts5_available = database._fts5_available
+    monkeypatch.setattr(database, "_fts5_available", lambda conn: False)
+    database.init_db()
+    conv_id = _conversation(database, "alice", "Later", "narwhal written without an index")
+    assert database.search_messages("alice", "narwhal")[0]["score"] == 0.0  # LIKE fallback
+
+    monkeypatch.setattr(database, "_fts5_available", fts5_available)
+    database.init_db()
+
+    hits = database.search_messages("alice", "narwhal")
+    assert [h["conversation_id"] for h in hits] == [conv_id]
+    assert hits[0]["score"] < 0  # ranked by bm25
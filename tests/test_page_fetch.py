@@ -0,0 +1,105 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import page_fetch
+from page_fetch import PageFetcher, StreamingTextExtractor
+
+PAGE_DELAY = 0.3
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/slow"):
+            time.sleep(PAGE_DELAY)
+            self._send(f"<html><head><title>t</title><script>var x = 1;</script></head>"
+                       f"<body><p>Page {self.path}</p></body></html>".encode())
+        elif self.path == "/huge":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.end_headers()
+            try:
+                self.wfile.write(b"<html><body>")
+                # Far more than anyone needs; the client should hang up early
+                for _ in range(2000):
+                    self.wfile.write(b"<p>" + b"lorem ipsum " * 100 + b"</p>")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        elif self.path == "/binary":
+            self._send(b"\x89PNG", content_type="image/png")
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def _send(self, body, content_type="text/html; charset=utf-8"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture(params=["aiohttp", "requests"])
+def fetcher(request, monkeypatch):
+    if request.param == "aiohttp":
+        pytest.importorskip("aiohttp")
+    else:
+        pytest.importorskip("requests")
+        monkeypatch.setattr(page_fetch, "aiohttp", None)
+    f = PageFetcher(max_per_host=5)
+    yield f
+    f.close()
+
+
+def test_extractor_skips_scripts_and_stops_early():
+    parser = StreamingTextExtractor(max_chars=20)
+    parser.feed("<style>p {}</style><p>Hello <b>world</b></p><script>bad()</script>")
+    assert parser.text() == "Hello world"
+    assert not parser.done
+    parser.feed("<p>" + "more text " * 10 + "</p>")
+    assert parser.done and len(parser.text()) == 20
+
+
+def test_pages_are_fetched_concurrently(server, fetcher):
+    urls = [f"{server}/slow/{i}" for i in range(5)]
+    start = time.perf_counter()
+    texts = fetcher.fetch_texts(urls)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 3 * PAGE_DELAY
+    assert texts == [f"Page /slow/{i}" for i in range(5)]
+
+
+def test_per_host_limit_serializes_excess_requests(server):
+    pytest.importorskip("aiohttp")
+    fetcher = PageFetcher(max_per_host=1)
+    start = time.perf_counter()
+    fetcher.fetch_texts([f"{server}/slow/{i}" for i in range(3)])
+    assert time.perf_counter() - start >= 3 * PAGE_DELAY * 0.9
+    fetcher.close()
+
+
+def test_large_bodies_are_cut_off_and_failures_are_none(server, fetcher):
+    start = time.perf_counter()
+    huge, missing, binary = fetcher.fetch_texts(
+        [f"{server}/huge", f"{server}/missing", f"{server}/binary"], max_chars=500
+    )
+    assert len(huge) == 500 and huge.startswith("lorem ipsum")
+    assert missing is None and binary is None
+    assert time.perf_counter() - start < 2.0
+    assert fetcher.stats["failures"] == 2
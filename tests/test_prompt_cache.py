@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import prompt_cache
+from prompt_cache import (
+    CACHE_CONTROL,
+    anthropic_request,
+    cache_hit_rate,
+    openai_messages,
+    report_usage,
+    usage_from_anthropic,
+    usage_from_google,
+    usage_from_openai,
+)
+
+HISTORY = [
+    {"role": "user", "content": "first question", "timestamp": "10:00"},
+    {"role": "assistant", "content": "first answer", "model": "x"},
+]
+DOCS = [("Context", "document text"), ("Image Context", "")]
+
+
+def _marked(blocks):
+    return [b["text"] for b in blocks if b.get("cache_control") == CACHE_CONTROL]
+
+
+def test_openai_layout_puts_stable_prefix_first():
+    messages = openai_messages("Be brief.", DOCS, HISTORY, "new question")
+    assert [m["role"] for m in messages] == ["system", "system", "user", "assistant", "user"]
+    assert messages[1]["content"].endswith("Context:\ndocument text")
+    assert messages[-1] == {"role": "user", "content": "new question"}
+    # Same inputs, same bytes: the prefix is deterministic across turns
+    assert openai_messages("Be brief.", DOCS, HISTORY, "other")[:-1] == messages[:-1]
+
+
+def test_anthropic_breakpoints_follow_stable_segments():
+    summary = {"role": "system", "content": "[Earlier conversation summary]\nUSER: hi"}
+    request = anthropic_request("Be brief.", DOCS, [summary] + HISTORY, "new question")
+    assert _marked(request["system"]) == ["Be brief.", request["system"][1]["text"], summary["content"]]
+    messages = request["messages"]
+    assert [m["role"] for m in messages] == ["user", "assistant", "user"]
+    assert _marked(messages[1]["content"]) == ["first answer"]
+    assert _marked(messages[2]["content"]) == []
+    total = sum(len(_marked(m["content"])) for m in messages) + len(_marked(request["system"]))
+    assert total <= prompt_cache.MAX_BREAKPOINTS
+
+
+def test_anthropic_single_prompt_can_be_marked():
+    request = anthropic_request(turn="hello", cache_turn=True)
+    assert "system" not in request
+    assert request["messages"] == [
+        {"role": "user", "content": [{"type": "text", "text": "hello", "cache_control": CACHE_CONTROL}]}
+    ]
+
+
+def test_anthropic_history_must_start_with_user_and_alternate():
+    history = [{"role": "assistant", "content": "greeting"}, {"role": "user", "content": "a"},
+               {"role": "user", "content": "b"}]
+    messages = anthropic_request(history=history, turn="c")["messages"]
+    assert len(messages) == 1 and messages[0]["role"] == "user"
+    assert [b["text"] for b in messages[0]["content"]] == ["a", "b", "c"]
+
+
+def test_usage_normalization():
+    openai_usage = SimpleNamespace(prompt_tokens=2000, completion_tokens=50,
+                                   prompt_tokens_details=SimpleNamespace(cached_tokens=1536))
+    assert usage_from_openai(openai_usage)["cached_tokens"] == 1536
+    deepseek_usage = {"prompt_tokens": 100, "completion_tokens": 5, "prompt_cache_hit_tokens": 64}
+    assert usage_from_openai(deepseek_usage)["cached_tokens"] == 64
+
+    anthropic_usage = SimpleNamespace(input_tokens=20, output_tokens=7,
+                                      cache_read_input_tokens=3000, cache_creation_input_tokens=980)
+    usage = usage_from_anthropic(anthropic_usage)
+    assert usage["input_tokens"] == 4000 and usage["cache_write_tokens"] == 980
+    assert cache_hit_rate(usage) == 0.75
+
+    google_usage = SimpleNamespace(prompt_token_count=400, cached_content_token_count=None,
+                                   candidates_token_count=12)
+    assert usage_from_google(google_usage)["cached_tokens"] == 0
+    assert cache_hit_rate({"input_tokens": 0}) is None
+
+
+def test_report_usage_sends_hit_rate_to_monitoring(monkeypatch):
+    calls = []
+    monkeypatch.setattr(prompt_cache, "_tracker", lambda *args, **kwargs: calls.append((args, kwargs)))
+    prompt_cache.cache_stats.clear()
+
+    report_usage("anthropic", "claude", {"input_tokens": 1000, "cached_tokens": 900}, 0.4)
+    report_usage("anthropic", "claude", {"input_tokens": 1000, "cached_tokens": 0}, 0.5)
+    report_usage("openai", "gpt", None, 1.0, success=False)
+
+    assert calls[0][0] == ("anthropic", "claude", True, 0.4)
+    assert calls[0][1]["token_usage"]["cache_hit_rate"] == 0.9
+    assert calls[2][0][2] is False and calls[2][1]["token_usage"] is None
+    stats = prompt_cache.cache_stats.snapshot()
+    assert stats["anthropic"]["requests"] == 2
+    assert stats["anthropic"]["hit_rate"] == 0.45
+    assert "openai" not in stats
@@ -0,0 +1,99 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+import provider_clients
+from provider_clients import ProviderClientRegistry, client_kind
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """Replace the SDK constructors with fakes that record each build."""
+    calls = []
+
+    def fake_builder(kind):
+        def build(api_key, base_url):
+            calls.append((kind, api_key, base_url))
+            return MagicMock(name=f"{kind}-client")
+        return build
+
+    monkeypatch.setattr(provider_clients, "_BUILDERS", {kind: fake_builder(kind) for kind in provider_clients._BUILDERS})
+    return calls
+
+
+def test_clients_are_reused_per_provider_key_and_base_url(built):
+    registry = ProviderClientRegistry()
+    first = registry.get("openai", "key-a")
+    assert registry.get("openai", "key-a") is first
+    assert registry.get("openai", "key-b") is not first
+    together = registry.get("together", "key-a")
+    assert together is not first
+    assert registry.get("anthropic", "key-a") is registry.get("anthropic", "key-a")
+
+    assert built == [
+        ("openai", "key-a", None),
+        ("openai", "key-b", None),
+        ("openai", "key-a", "https://api.together.xyz/v1"),
+        ("anthropic", "key-a", None),
+    ]
+    assert registry.stats() == {"hits": 2, "misses": 4, "evictions": 0, "size": 4}
+
+
+def test_lru_eviction_closes_clients(built):
+    registry = ProviderClientRegistry(max_clients=2)
+    a = registry.get("openai", "a")
+    registry.get("openai", "b")
+    registry.get("openai", "a")  # a is now most recent
+    registry.get("openai", "c")
+    a.close.assert_not_called()
+    assert registry.stats()["evictions"] == 1
+    assert registry.get("openai", "a") is a
+
+
+def test_concurrent_first_use_builds_once(built):
+    registry = ProviderClientRegistry()
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(registry.get("google", "k"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(built) == 1
+    assert all(c is clients[0] for c in clients)
+
+
+def test_unknown_provider_is_rejected():
+    assert client_kind("xai") == "openai"
+    with pytest.raises(ValueError):
+        ProviderClientRegistry().get("mystery", "k")
+
+
+def test_missing_api_key_is_rejected(built):
+    registry = ProviderClientRegistry()
+    for key in (None, ""):
+        with pytest.raises(ValueError, match="No API key for openai"):
+            registry.get("openai", key)
+    assert built == []
+
+
+def test_voice_providers_share_the_registry_client(built, monkeypatch, tmp_path):
+    from voice_advanced import SpeechToText, STTConfig, TextToSpeech, TTSConfig
+
+    monkeypatch.setattr(provider_clients, "_registry", ProviderClientRegistry())
+    monkeypatch.setenv("OPENAI_API_KEY", "voice-key")
+    audio = tmp_path / "clip.wav"
+    audio.write_bytes(b"RIFF")
+
+    tts = TextToSpeech(TTSConfig(provider="openai", voice_name="alloy"))
+    stt = SpeechToText(STTConfig(provider="openai"))
+    tts._synthesize_openai("hello", "mp3")
+    for _ in range(3):
+        stt._transcribe_openai(str(audio))
+
+    assert built == [("openai", "voice-key", None)]
+    assert provider_clients.get_registry().stats()["hits"] == 3
+
+    monkeypatch.delenv("OPENAI_API_KEY")
+    with pytest.raises(ValueError, match="openai"):
+        stt._transcribe_openai(str(audio))
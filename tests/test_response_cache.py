@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+
+import response_cache
+from response_cache import ResponseCache, replay_chunks, request_key
+
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "What is 2+2?"}]
+
+
+def test_request_key_is_canonical():
+    base = request_key("openai", "gpt-4o", MESSAGES, {"temperature": 0.0, "top_p": 0.95})
+    # Parameter order, float noise and non-content message fields do not matter
+    noisy = [dict(m, timestamp="10:00") for m in MESSAGES]
+    assert request_key("openai", "gpt-4o", noisy, {"top_p": 0.9500000001, "temperature": 0}) == base
+    assert request_key("openai", "gpt-4o", MESSAGES, {"temperature": 0.7, "top_p": 0.95}) != base
+    assert request_key("openai", "gpt-4o-mini", MESSAGES, {"temperature": 0.0, "top_p": 0.95}) != base
+    assert request_key("openai", "gpt-4o", MESSAGES, {"temperature": 0.0, "top_p": 0.95}, [b"img"]) != base
+
+
+def test_replay_chunks_round_trip():
+    text = "  Four.\n\nThat is   the answer, obviously."
+    chunks = list(replay_chunks(text, words=2))
+    assert "".join(chunks) == text
+    assert len(chunks) > 2
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(disk_path=path)
+    cache.put("k", "answer", "openai", "gpt-4o")
+    assert cache.get("k") == "answer"
+    cache.close()
+
+    reopened = ResponseCache(disk_path=path)
+    assert reopened.get("k") == "answer"
+    assert reopened.get("missing") is None
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_per_provider_ttl(tmp_path, monkeypatch):
+    cache = ResponseCache(disk_path=str(tmp_path / "r.db"), ttls={"xai": 10})
+    cache.put("fast", "a", "xai")
+    cache.put("slow", "b", "openai")
+    later = time.time() + 60
+    monkeypatch.setattr(response_cache.time, "time", lambda: later)
+    assert cache.get("fast") is None
+    assert cache.get("slow") == "b"
+
+
+def test_disk_store_is_size_bounded(tmp_path):
+    cache = ResponseCache(disk_path=str(tmp_path / "r.db"), max_memory_entries=1, max_disk_bytes=10_000)
+    for i in range(30):
+        cache.put(f"k{i}", str(i) * 1000, "openai")
+        cache.get("k0")  # keep the first entry recently used
+    assert cache.stats()["disk_bytes"] <= 10_000
+    assert cache.stats()["evictions"] > 0
+    assert cache.get("k0") == "0" * 1000
+    assert cache.get("k1") is None
+    assert cache.get("k29") == "29" * 1000
+
+
+def test_brain_replays_cached_answers(brain_module, tmp_path, monkeypatch):
+    cache = ResponseCache(disk_path=str(tmp_path / "r.db"))
+    monkeypatch.setattr(brain_module, "get_response_cache", lambda: cache)
+    calls = []
+
+    def fake_stream(self, provider, model_name, prompt, api_key, config, usage=None):
+        calls.append(provider)
+        yield "Four, "
+        yield "definitely."
+
+    monkeypatch.setattr(brain_module.AIBrain, "_stream_provider", fake_stream)
+    brain = brain_module.AIBrain()
+    config = {"temperature": 0, "max_output_tokens": 64, "cache_responses": True}
+
+    first = asyncio.run(brain.query_model("openai", "gpt-4o", "2+2?", "key", config))
+    chunks = []
+    second = asyncio.run(brain.query_model("openai", "gpt-4o", "2+2?", "key", config, on_chunk=chunks.append))
+
+    assert calls == ["openai"]
+    assert second["cached"] and second["response"] == first["response"] == "Four, definitely."
+    assert "".join(chunks) == "Four, definitely."
+
+    # Without opting in, the provider is always called
+    asyncio.run(brain.query_model("openai", "gpt-4o", "2+2?", "key", dict(config, cache_responses=False)))
+    assert calls == ["openai", "openai"]
+
+
+def test_brain_does_not_cache_interrupted_answers(brain_module, tmp_path, monkeypatch):
+    cache = ResponseCache(disk_path=str(tmp_path / "r.db"))
+    monkeypatch.setattr(brain_module, "get_response_cache", lambda: cache)
+
+    def fake_stream(self, provider, model_name, prompt, api_key, config, usage=None):
+        yield "partial"
+        yield " rest"
+
+    monkeypatch.setattr(brain_module.AIBrain, "_stream_provider", fake_stream)
+    cancel = threading.Event()
+    cancel.set()
+    config = {"cache_responses": True}
+    result = brain_module.AIBrain()._run_provider("openai", "gpt-4o", "q", "key", config, cancel=cancel)
+    assert result["response"] == "partial"
+    assert cache.stats()["stores"] == 0
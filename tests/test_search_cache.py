@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+import search_cache
+from search_cache import SearchCache, normalize_query
+
+RESULTS = [{"title": "Python", "href": "https://python.org", "body": "Official site"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = SearchCache(disk_path=str(tmp_path / "search_cache.db"))
+    yield c
+    c.close()
+
+
+class Fetcher:
+    def __init__(self, results=RESULTS, delay=0.0):
+        self.calls = 0
+        self.results = results
+        self.delay = delay
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return list(self.results)
+
+
+def test_normalized_queries_share_an_entry(cache):
+    fetch = Fetcher()
+    assert cache.get_or_fetch("What is Python?", fetch) == RESULTS
+    assert cache.get_or_fetch("  what   is python ", fetch) == RESULTS
+    assert fetch.calls == 1
+    # Different options are different entries
+    cache.get_or_fetch("what is python", fetch, mode="news")
+    cache.get_or_fetch("what is python", fetch, max_results=10)
+    cache.get_or_fetch("what is python", fetch, domain="python.org")
+    assert fetch.calls == 4
+    assert normalize_query(" Hello\tWorld?! ") == "hello world"
+
+
+def test_entries_expire_per_mode(cache, monkeypatch):
+    fetch = Fetcher()
+    now = [1_000_000.0]
+    monkeypatch.setattr(search_cache.time, "time", lambda: now[0])
+    cache.get_or_fetch("elections", fetch, mode="news")
+    cache.get_or_fetch("elections", fetch, mode="web")
+
+    now[0] += search_cache.MODE_TTLS["news"] + 1
+    cache.get_or_fetch("elections", fetch, mode="news")
+    cache.get_or_fetch("elections", fetch, mode="web")
+    assert fetch.calls == 3
+    assert cache.ttl_for("web", "Past Day") == search_cache.TIME_RANGE_TTLS["Past Day"]
+
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    path = str(tmp_path / "search_cache.db")
+    first = SearchCache(disk_path=path)
+    first.get_or_fetch("rust ownership", Fetcher())
+    first.close()
+
+    second = SearchCache(disk_path=path)
+    fetch = Fetcher()
+    assert second.get_or_fetch("rust ownership", fetch) == RESULTS
+    assert fetch.calls == 0
+    assert second.stats()["disk_hits"] == 1
+    second.close()
+
+
+def test_concurrent_identical_lookups_fetch_once(cache):
+    fetch = Fetcher(delay=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("llm news", fetch)))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert fetch.calls == 1
+    assert results == [RESULTS] * 10
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 9
+    assert stats["hit_rate"] == pytest.approx(0.9)
+
+
+def test_failures_and_empty_results_are_not_cached(cache):
+    def boom():
+        raise RuntimeError("rate limited")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_fetch("query", boom)
+    empty = Fetcher(results=[])
+    assert cache.get_or_fetch("query", empty) == []
+    assert cache.get_or_fetch("query", empty) == []
+    assert empty.calls == 2
+    assert cache.stats()["errors"] == 1
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    cache = SearchCache(max_entries=2, disk_path=None)
+    for q in ("a1", "b2", "c3"):
+        cache.get_or_fetch(q, Fetcher())
+    stats = cache.stats()
+    assert stats["memory_entries"] == 2 and stats["evictions"] == 1
@@ -0,0 +1,80 @@
+import pytest
+
+from ui.token_budget import pack_context
+
+
+@pytest.fixture
+def summary_memory(database, monkeypatch):
+    from ui import summary_memory as module
+    monkeypatch.setattr(module, "database", database)
+    return module
+
+
+def _add_turns(database, conversation_id, count, start=0):
+    for i in range(start, start + count):
+        database.save_message(conversation_id, "user", f"Question {i} about topic {i}. More detail follows here.")
+        database.save_message(conversation_id, "assistant", f"Answer {i}.")
+
+
+def test_digest_keeps_leading_sentences():
+    from ui.summary_memory import digest_message
+    message = {"role": "user", "content": "First sentence.  Second one!\nThird " + "x" * 400}
+    assert digest_message(message) == "USER: First sentence. Second one!"
+    assert digest_message({"role": "assistant", "content": "y" * 500}, max_chars=20) == "ASSISTANT: " + "y" * 19 + "…"
+
+
+def test_compact_keeps_opening_line_and_newest():
+    from ui.summary_memory import compact_lines
+    lines = ["USER: the topic"] + [f"LINE {i}: " + "z" * 150 for i in range(50)]
+    compacted = compact_lines(lines, max_chars=1000)
+    assert compacted[0] == "USER: the topic"
+    assert compacted[-1].startswith("LINE 49")
+    assert sum(len(line) + 1 for line in compacted) <= 1000
+
+
+def test_summary_folds_only_messages_outside_window(summary_memory, database):
+    conversation_id = database.create_new_conversation("alice")
+    _add_turns(database, conversation_id, 5)
+    memory = summary_memory.SummaryMemory()
+
+    assert memory.schedule(conversation_id, keep_last=4).result(5) == 6
+    summary, covered = database.get_conversation_summary(conversation_id)
+    assert covered == 6
+    assert "USER: Question 0 about topic 0." in summary
+    assert "Question 3" not in summary
+
+    # Nothing new fell out of the window: no work
+    assert memory.schedule(conversation_id, keep_last=4).result(5) == 0
+
+    # Later turns extend the stored summary instead of rebuilding it
+    _add_turns(database, conversation_id, 2, start=5)
+    assert memory.schedule(conversation_id, keep_last=4).result(5) == 4
+    summary, covered = memory.get(conversation_id)
+    assert covered == 10
+    assert summary.startswith("USER: Question 0")
+    assert "Question 4" in summary and "Question 5" not in summary
+    assert memory.stats()["folded_messages"] == 10
+
+
+def test_summary_survives_restart_and_delete(summary_memory, database):
+    conversation_id = database.create_new_conversation("bob")
+    _add_turns(database, conversation_id, 3)
+    summary_memory.SummaryMemory().schedule(conversation_id, keep_last=2).result(5)
+    assert summary_memory.SummaryMemory().get(conversation_id)[1] == 4
+    database.delete_conversation(conversation_id)
+    assert database.get_conversation_summary(conversation_id) == ("", 0)
+
+
+def test_packed_context_uses_summary_only_when_history_is_dropped():
+    from ui.summary_memory import summary_message
+    summary = summary_message("USER: what we discussed first")
+    history = [{"role": "user", "content": f"{i}" + " filler" * 200} for i in range(20)]
+
+    packed = pack_context("some-unknown-model", "Hi", history=history, reserve_output=0,
+                          window=2000, summary=summary)
+    assert packed.summarized and packed.history[0] == summary
+    assert packed.history[-1] == history[-1]
+    assert packed.dropped_messages == 20 - (len(packed.history) - 1)
+
+    packed = pack_context("gemini-1.5-flash", "Hi", history=history[:2], summary=summary)
+    assert not packed.summarized and packed.history == history[:2]
@@ -0,0 +1,89 @@
+from ui.token_budget import (
+    SEARCH_HEADER,
+    TokenCounter,
+    compose_prompt,
+    context_window,
+    get_token_counter,
+    pack_context,
+    pack_history,
+    parse_context_window,
+)
+
+
+def test_parse_context_window():
+    assert parse_context_window("128k") == 128_000
+    assert parse_context_window("1M") == 1_000_000
+    assert parse_context_window("2M") == 2_000_000
+    assert parse_context_window(8192) == 8192
+    assert parse_context_window("n/a") is None
+    assert context_window("claude-3-5-haiku-20241022") == 200_000
+    assert context_window("gemini-1.5-flash") == 1_000_000
+
+
+def test_estimator_counts_non_ascii_densely():
+    counter = TokenCounter("estimate:test", chars_per_token=4.0)
+    assert counter.count("") == 0
+    assert counter.count("a" * 400) == 100
+    assert counter.count("字" * 100) > counter.count("a" * 100)
+
+
+def test_counts_are_cached_per_text():
+    counter = TokenCounter("estimate:test")
+    counter.count("hello world")
+    counter.count("hello world")
+    counter.count("something else")
+    assert counter.stats() == {"hits": 1, "misses": 2, "size": 2}
+
+
+def test_truncate_fits_budget():
+    counter = TokenCounter("estimate:test", chars_per_token=4.0)
+    text = "word " * 1000
+    cut = counter.truncate(text, 100)
+    assert counter.count(cut) <= 100
+    assert cut.endswith("truncated to fit the context window]")
+    assert counter.truncate("short", 100) == "short"
+    assert counter.truncate(text, 0) == ""
+
+
+def test_pack_history_keeps_newest_messages():
+    counter = TokenCounter("estimate:test", chars_per_token=4.0)
+    messages = [{"role": "user", "content": f"{i} " + "x" * 96} for i in range(10)]
+    kept, dropped, used = pack_history(messages, 60, counter)
+    assert [m["content"][0] for m in kept] == ["8", "9"]
+    assert len(dropped) == 8
+    assert used == 58
+
+
+def test_pack_context_priority_order():
+    counter = get_token_counter("some-unknown-model")
+    history = [{"role": "user", "content": "q" * 400}, {"role": "assistant", "content": "a" * 400}]
+    packed = pack_context(
+        "some-unknown-model", "What now?", "Be brief.", history=history,
+        search_context="s" * 4000, attachments=[("Context", "d" * 40000)],
+        reserve_output=0, window=3000,
+    )
+    # Higher-priority sections go in whole; the attachment absorbs the shortfall
+    assert packed.system_instruction == "Be brief."
+    assert packed.history == history
+    assert SEARCH_HEADER + "s" * 4000 in packed.prompt
+    assert packed.truncated == ["Context"]
+    assert packed.prompt.startswith("What now?\n\nContext:\nddd")
+    assert counter.count(packed.prompt) + packed.tokens["system"] + packed.tokens["history"] <= 3000
+
+
+def test_pack_context_drops_oldest_history_for_small_windows():
+    history = [{"role": "user", "content": f"{i}" + " filler" * 200} for i in range(20)]
+    packed = pack_context("some-unknown-model", "Hi", history=history, reserve_output=0, window=2000)
+    assert 0 < len(packed.history) < 20
+    assert packed.history[-1] == history[-1]
+    assert packed.dropped_messages == 20 - len(packed.history)
+    assert packed.total_tokens <= 2000
+
+
+def test_pack_context_sends_everything_when_it_fits():
+    history = [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}]
+    packed = pack_context("gemini-1.5-flash", "Question", "System", history=history,
+                          search_context="results", attachments=[("Image Context", "a cat")])
+    assert packed.history == history
+    assert not packed.truncated and packed.dropped_messages == 0
+    assert packed.prompt == compose_prompt("Question", "results", [("Image Context", "a cat")])
@@ -0,0 +1,186 @@
+import io
+import threading
+import time
+import wave
+
+import numpy as np
+import pytest
+
+import transcription
+from transcription import (
+    SAMPLE_RATE,
+    AudioSegment,
+    decode_audio,
+    format_timestamp,
+    pcm_to_wav,
+    segment_speech,
+    transcribe_audio,
+    transcribe_segments,
+)
+from voice_advanced import RealTimeAudioProcessor, SpeechToText, STTConfig
+
+
+def _tone(seconds, rate=SAMPLE_RATE, amplitude=8000):
+    t = np.arange(int(seconds * rate)) / rate
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+
+
+def _silence(seconds, rate=SAMPLE_RATE):
+    return np.zeros(int(seconds * rate), dtype=np.int16)
+
+
+def _pcm(*parts):
+    """Alternating speech/silence durations, starting with speech."""
+    return np.concatenate([_tone(s) if i % 2 == 0 else _silence(s) for i, s in enumerate(parts)]).tobytes()
+
+
+def test_audio_level_does_not_overflow():
+    processor = RealTimeAudioProcessor()
+    assert processor.get_audio_level(_tone(0.1).tobytes()) == pytest.approx(8000 / 2 ** 0.5 / 32768, rel=0.01)
+    assert processor.detect_silence(_silence(0.1).tobytes())
+    assert processor.get_audio_level(b"") == 0.0
+
+
+def test_segments_split_on_pauses_with_timestamps():
+    segments = segment_speech(_pcm(2.0, 1.0, 3.0, 0.2, 1.0, 2.0), padding_ms=0)
+    # The 0.2 s pause is too short to split
+    assert len(segments) == 2
+    assert segments[0].start == 0 and segments[0].end == pytest.approx(2.0, abs=0.03)
+    assert segments[1].start == pytest.approx(3.0, abs=0.03)
+    assert segments[1].end == pytest.approx(7.2, abs=0.03)
+    assert segment_speech(_silence(5).tobytes()) == []
+
+
+def test_long_speech_is_cut_at_a_short_pause():
+    segments = segment_speech(_pcm(20.0, 0.2, 15.0), max_segment_seconds=30, padding_ms=0)
+    assert [round(s.start) for s in segments] == [0, 20]
+    assert all(s.duration <= 30.1 for s in segments)
+    # No pause at all: hard cut at the limit
+    assert len(segment_speech(_pcm(65.0), max_segment_seconds=30)) == 3
+
+
+def test_wav_is_decoded_to_mono_16k():
+    stereo = np.repeat(_tone(1.0, rate=44100)[:, None], 2, axis=1)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(44100)
+        out.writeframes(stereo.tobytes())
+    pcm = decode_audio(buf.getvalue())
+    assert len(pcm) == 2 * SAMPLE_RATE
+    assert decode_audio(pcm_to_wav(pcm)) == pcm
+
+
+def test_undecodable_audio_raises(monkeypatch):
+    import video_analysis
+
+    def missing():
+        raise video_analysis.FFmpegError("ffmpeg not found")
+
+    monkeypatch.setattr(video_analysis, "ffmpeg_exe", missing)
+    with pytest.raises(transcription.AudioDecodeError):
+        decode_audio(b"fake audio content")
+
+
+def test_segments_run_in_parallel_and_stitch_in_order():
+    segments = [AudioSegment(i, i * 10.0, i * 10.0 + 5, b"") for i in range(6)]
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def recognize(segment):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05 * (6 - segment.index))  # later segments finish first
+        with lock:
+            active[0] -= 1
+        if segment.index == 4:
+            raise RuntimeError("quota")
+        return f"part {segment.index}"
+
+    partials = []
+    transcript = transcribe_segments(segments, recognize, max_workers=3,
+                                     on_partial=lambda d, t, tr: partials.append((d, t, tr.text)))
+    assert peak[0] == 3
+    assert transcript.text == "part 0 part 1 part 2 part 3 part 5"
+    assert transcript.failed == 1 and transcript.ok
+    assert transcript.timestamped().splitlines()[1] == "[00:10] part 1"
+    assert [p[:2] for p in partials] == [(i, 6) for i in range(1, 7)]
+    assert partials[-1][2] == transcript.text
+
+
+def test_transcribe_audio_end_to_end():
+    wav = pcm_to_wav(_pcm(1.0, 1.0, 1.0))
+    transcript = transcribe_audio(wav, lambda segment: f"at {segment.start:.1f}")
+    assert transcript.duration == pytest.approx(3.0)
+    assert transcript.render() == "[00:00] at 0.0\n[00:01] at 1.8"
+    assert format_timestamp(3725) == "1:02:05"
+
+
+def test_speech_to_text_segments_long_files(tmp_path, monkeypatch):
+    path = tmp_path / "talk.wav"
+    path.write_bytes(pcm_to_wav(_pcm(40.0, 1.0, 40.0)))
+    stt = SpeechToText(STTConfig(provider="google", enable_profanity_filter=False, enable_punctuation=False))
+    sent = []
+
+    def fake_file(audio_file):
+        with wave.open(audio_file, "rb") as source:
+            sent.append(source.getnframes() / source.getframerate())
+        return f"segment {len(sent)}", {}
+
+    monkeypatch.setattr(stt, "_transcribe_file", fake_file)
+    text, metadata = stt.transcribe(str(path))
+    # Each 40 s stretch is cut at the 30 s limit, then ends at the pause
+    assert metadata["segments"] == 4 and len(sent) == 4
+    assert all(seconds <= 30.5 for seconds in sent)
+    assert text.count("segment") == 4 and metadata["timestamped"].startswith("[00:00] segment")
+
+    sent.clear()
+    short = tmp_path / "short.wav"
+    short.write_bytes(pcm_to_wav(_pcm(5.0)))
+    decoded = []
+    monkeypatch.setattr(transcription, "decode_audio", lambda data: decoded.append(len(data)))
+    assert stt.transcribe(str(short))[0] == "segment 1"
+    # Short files are measured from the header and sent whole, without decoding
+    assert sent == [5.0] and decoded == []
+
+
+def test_audio_duration_reads_headers(tmp_path, monkeypatch):
+    import subprocess
+
+    import video_analysis
+
+    wav = tmp_path / "a.wav"
+    wav.write_bytes(pcm_to_wav(_pcm(2.5)))
+    assert transcription.audio_duration(str(wav)) == pytest.approx(2.5)
+
+    mp3 = tmp_path / "a.mp3"
+    mp3.write_bytes(b"ID3 fake")
+    banner = b"Input #0, mp3, from 'a.mp3':\n  Duration: 01:02:03.50, start: 0.0, bitrate: 128 kb/s\n"
+    monkeypatch.setattr(video_analysis, "ffprobe_exe", lambda: None)
+    monkeypatch.setattr(video_analysis, "ffmpeg_exe", lambda: "ffmpeg")
+    monkeypatch.setattr(video_analysis, "_run",
+                        lambda args, timeout=None: subprocess.CompletedProcess(args, 1, b"", banner))
+    assert transcription.audio_duration(str(mp3)) == pytest.approx(3723.5)
+    assert transcription.audio_duration(str(tmp_path / "missing.wav")) is None
+
+
+def test_chat_transcription_streams_partials(mock_streamlit_module, monkeypatch):
+    import importlib
+    import sys
+
+    monkeypatch.delitem(sys.modules, "ui.chat_utils", raising=False)
+    chat_utils = importlib.import_module("ui.chat_utils")
+    monkeypatch.setitem(sys.modules, "ui.chat_utils", chat_utils)
+    monkeypatch.setattr(chat_utils, "google_web_recognizer", lambda: lambda segment: f"words at {segment.start:.0f}")
+    updates = []
+    result = chat_utils.transcribe_audio_file(io.BytesIO(pcm_to_wav(_pcm(1.0, 1.0, 1.0))),
+                                              progress=lambda d, t, text: updates.append((d, t, text)))
+    assert result == "[00:00] words at 0\n[00:01] words at 2"
+    assert updates[-1] == (2, 2, result)
+
+    assert chat_utils.transcribe_audio_file(io.BytesIO(pcm_to_wav(_silence(2).tobytes()))) == "[No speech detected]"
+    failing = lambda segment: (_ for _ in ()).throw(RuntimeError("offline"))
+    monkeypatch.setattr(chat_utils, "google_web_recognizer", lambda: failing)
+    assert chat_utils.transcribe_audio_file(io.BytesIO(pcm_to_wav(_pcm(1.0)))).startswith("[Transcription failed")
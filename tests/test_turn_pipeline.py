@@ -0,0 +1,64 @@
+import time
+
+from ui.turn_pipeline import TurnPipeline
+
+
+def _sleep_then(value, seconds):
+    time.sleep(seconds)
+    return value
+
+
+def test_stages_run_concurrently_with_timings():
+    pipeline = TurnPipeline()
+    pipeline.add("captions", _sleep_then, ["a caption"], 0.3)
+    pipeline.add("search", _sleep_then, (["hit"], "ctx"), 0.3)
+    pipeline.add("document:notes.txt", _sleep_then, {"context": "notes"}, 0.3)
+
+    start = time.perf_counter()
+    results = pipeline.run()
+    assert time.perf_counter() - start < 0.6
+
+    assert pipeline.value("captions") == ["a caption"]
+    assert pipeline.value("search") == (["hit"], "ctx")
+    assert all(r.ok for r in results.values())
+    timings = pipeline.timings()
+    assert set(timings) == {"captions", "search", "document:notes.txt", "total"}
+    assert 0.25 < timings["search"] <= timings["total"] < 0.6
+
+
+def test_slow_stage_times_out_without_holding_the_turn():
+    pipeline = TurnPipeline()
+    pipeline.add("search", _sleep_then, "late", 2.0, timeout=0.2)
+    pipeline.add("captions", _sleep_then, "fast", 0.05)
+
+    start = time.perf_counter()
+    results = pipeline.run()
+    assert time.perf_counter() - start < 0.5
+
+    assert results["search"].timed_out and not results["search"].ok
+    assert pipeline.value("search", "default") == "default"
+    assert pipeline.value("captions") == "fast"
+    assert "⏱" in pipeline.format_timings()
+
+
+def test_failing_stage_is_isolated():
+    def boom():
+        raise RuntimeError("PyPDF2 not installed")
+
+    pipeline = TurnPipeline()
+    pipeline.add("document:a.pdf", boom)
+    pipeline.add("recall", _sleep_then, [], 0.0)
+    results = pipeline.run()
+    assert results["document:a.pdf"].error == "PyPDF2 not installed"
+    assert results["recall"].ok
+
+
+def test_poll_runs_on_caller_thread_while_stages_run():
+    import threading
+
+    pipeline = TurnPipeline()
+    pipeline.add("document:big.pdf", _sleep_then, "text", 0.3)
+    threads = []
+    pipeline.run(poll=lambda: threads.append(threading.current_thread()), poll_interval=0.05)
+    assert len(threads) >= 3
+    assert set(threads) == {threading.current_thread()}
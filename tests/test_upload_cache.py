@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from upload_cache import UploadCache, artifact_key
+
+
+def test_artifact_key_follows_content_kind_and_version():
+    assert artifact_key("pdf", b"same") == artifact_key("pdf", b"same")
+    assert artifact_key("pdf", b"same") != artifact_key("audio", b"same")
+    assert artifact_key("pdf", b"same") != artifact_key("pdf", b"other")
+    assert artifact_key("pdf", b"same", version=2) != artifact_key("pdf", b"same")
+
+
+def test_each_content_is_processed_once(tmp_path):
+    calls = []
+    cache = UploadCache(disk_path=str(tmp_path / "uploads.db"))
+
+    def extract():
+        calls.append(1)
+        return {"text": "page one"}
+
+    key = artifact_key("pdf", b"%PDF-1.4")
+    assert cache.get_or_compute(key, extract) == {"text": "page one"}
+    assert cache.get_or_compute(key, extract) == {"text": "page one"}
+    cache.close()
+
+    reopened = UploadCache(disk_path=str(tmp_path / "uploads.db"))
+    assert reopened.get_or_compute(key, extract) == {"text": "page one"}
+    assert len(calls) == 1
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_incomplete_artifacts_are_retried(tmp_path):
+    cache = UploadCache(disk_path=str(tmp_path / "uploads.db"))
+    results = iter([{"thumbnails": []}, {"thumbnails": ["data:image/png;base64,AA"]}])
+    complete = lambda artifact: bool(artifact["thumbnails"])
+    key = artifact_key("video", b"mp4")
+    assert cache.get_or_compute(key, lambda: next(results), cacheable=complete) == {"thumbnails": []}
+    assert cache.get_or_compute(key, lambda: next(results), cacheable=complete)["thumbnails"]
+    assert cache.get_or_compute(key, lambda: pytest.fail("recomputed"), cacheable=complete)["thumbnails"]
+
+
+def test_concurrent_requests_share_one_extraction(tmp_path):
+    cache = UploadCache(disk_path=str(tmp_path / "uploads.db"))
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_extract():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"transcript": "hello"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", slow_extract)))
+               for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == [{"transcript": "hello"}] * 3
+
+
+def test_memory_and_disk_are_byte_bounded(tmp_path):
+    cache = UploadCache(disk_path=str(tmp_path / "uploads.db"), max_memory_bytes=5_000, max_disk_bytes=20_000)
+    for i in range(40):
+        cache.put(f"k{i}", {"text": "x" * 1000})
+    stats = cache.stats()
+    assert stats["memory_bytes"] <= 5_000
+    assert stats["disk_bytes"] <= 20_000
+    assert stats["evictions"] > 0
+    assert cache.get_or_compute("k39", lambda: pytest.fail("evicted")) == {"text": "x" * 1000}
+
+
+def test_chat_uploads_reuse_cached_artifacts(mock_streamlit_module, tmp_path, monkeypatch):
+    import importlib
+    import sys
+
+    monkeypatch.delitem(sys.modules, "ui.chat_utils", raising=False)
+    chat_utils = importlib.import_module("ui.chat_utils")
+    monkeypatch.setitem(sys.modules, "ui.chat_utils", chat_utils)
+    cache = UploadCache(disk_path=str(tmp_path / "uploads.db"))
+    monkeypatch.setattr(chat_utils, "get_upload_cache", lambda: cache)
+    calls = []
+
+    def fake_transcribe(file_like, progress=None):
+        calls.append(file_like.read())
+        return "meeting notes"
+
+    monkeypatch.setattr(chat_utils, "transcribe_audio_file", fake_transcribe)
+    first = chat_utils.extract_upload_context("a.wav", "wav", b"RIFF")
+    # Same content under another name: same transcript, new label
+    second = chat_utils.extract_upload_context("b.wav", "wav", b"RIFF")
+    assert calls == [b"RIFF"]
+    assert first["transcript"] == second["transcript"] == "meeting notes"
+    assert "Audio b.wav" in second["context"]
+
+    monkeypatch.setattr(chat_utils, "transcribe_audio_file", lambda f, progress=None: "[Transcription failed or not available]")
+    chat_utils.extract_upload_context("c.wav", "wav", b"other")
+    monkeypatch.setattr(chat_utils, "transcribe_audio_file", fake_transcribe)
+    assert chat_utils.extract_upload_context("c.wav", "wav", b"other")["transcript"] == "meeting notes"
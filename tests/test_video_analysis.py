@@ -0,0 +1,170 @@
+import io
+import json
+import subprocess
+
+import pytest
+
+import video_analysis
+from video_analysis import (
+    VideoInfo,
+    frame_size,
+    parse_ffmpeg_banner,
+    parse_ffprobe,
+    parse_scene_scores,
+    pick_scene_times,
+    seek_frame_command,
+)
+
+FFPROBE_OUTPUT = json.dumps({
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+         "avg_frame_rate": "30000/1001", "side_data_list": [{"rotation": -90}]},
+        {"codec_type": "audio", "codec_name": "aac"},
+    ],
+    "format": {"duration": "600.000000", "bit_rate": "4000000"},
+})
+
+FFMPEG_BANNER = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'clip.mp4':
+  Duration: 00:10:00.00, start: 0.000000, bitrate: 3987 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 1280x720 [SAR 1:1 DAR 16:9], 3854 kb/s, 25 fps, 25 tbr, 12800 tbn (default)
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 128 kb/s (default)
+At least one output file must be specified
+"""
+
+SCENE_LOG = """[Parsed_metadata_1 @ 0x55d0] frame:0    pts:153600  pts_time:12
+[Parsed_metadata_1 @ 0x55d0] lavfi.scene_score=0.412000
+[Parsed_metadata_1 @ 0x55d0] frame:1    pts:1024000 pts_time:80.5
+[Parsed_metadata_1 @ 0x55d0] lavfi.scene_score=0.871000
+[Parsed_metadata_1 @ 0x55d0] frame:2    pts:3200000 pts_time:250
+[Parsed_metadata_1 @ 0x55d0] lavfi.scene_score=0.330000
+"""
+
+
+def test_parse_ffprobe_handles_rotation_and_audio():
+    info = parse_ffprobe(FFPROBE_OUTPUT)
+    assert (info.width, info.height) == (1080, 1920)
+    assert info.fps == pytest.approx(29.97, abs=0.01)
+    assert info.duration == 600.0 and info.bitrate == 4_000_000 and info.has_audio
+    assert info.to_dict()["frame_count"] == 17982
+
+
+def test_parse_ffmpeg_banner_without_ffprobe():
+    info = parse_ffmpeg_banner(FFMPEG_BANNER)
+    assert (info.codec, info.width, info.height, info.fps) == ("h264", 1280, 720, 25.0)
+    assert info.duration == 600.0 and info.bitrate == 3_987_000 and info.has_audio
+    with pytest.raises(video_analysis.FFmpegError):
+        parse_ffmpeg_banner("Input #0: Audio only")
+
+
+def test_scene_selection():
+    scenes = parse_scene_scores(SCENE_LOG)
+    assert scenes == [(12.0, 0.412), (80.5, 0.871), (250.0, 0.33)]
+    assert pick_scene_times(scenes, 600, 2) == [12.0, 80.5]
+    # Too few cuts: topped up with evenly spaced times away from the cuts
+    assert pick_scene_times(scenes[:1], 600, 3) == [12.0, 300.0, 450.0]
+
+
+def test_seek_command_decodes_a_single_keyframe(monkeypatch):
+    monkeypatch.setattr(video_analysis, "ffmpeg_exe", lambda: "ffmpeg")
+    args = seek_frame_command("clip.mp4", 42.5, (640, 360))
+    # Input seek (before -i), keyframes only, one frame out
+    assert args.index("-ss") < args.index("-i")
+    assert args.index("-skip_frame") < args.index("-i")
+    assert "-noaccurate_seek" in args and args[args.index("-frames:v") + 1] == "1"
+    assert "scale=640:360" in args
+    assert "-skip_frame" not in seek_frame_command("clip.mp4", 1, (2, 2), keyframes_only=False)
+
+
+def test_frame_size_keeps_aspect_and_even_dimensions():
+    assert frame_size(VideoInfo(600, 30, 1920, 1080), 1280) == (1280, 720)
+    assert frame_size(VideoInfo(600, 30, 1080, 1920), 320) == (180, 320)
+    assert frame_size(VideoInfo(600, 30, 641, 359), None) == (640, 358)
+
+
+def test_analyze_video_probes_once_and_seeks_per_frame(monkeypatch):
+    pytest.importorskip("PIL")
+    monkeypatch.setattr(video_analysis, "ffmpeg_exe", lambda: "ffmpeg")
+    monkeypatch.setattr(video_analysis, "ffprobe_exe", lambda: "ffprobe")
+    calls = []
+
+    def fake_run(args, timeout=None):
+        calls.append(args)
+        if args[0] == "ffprobe":
+            return subprocess.CompletedProcess(args, 0, FFPROBE_OUTPUT.replace("-90", "0").encode(), b"")
+        width, height = map(int, args[args.index("-vf") + 1][len("scale="):].split(":"))
+        return subprocess.CompletedProcess(args, 0, b"\x80" * (width * height * 3), b"")
+
+    monkeypatch.setattr(video_analysis, "_run", fake_run)
+    analysis = video_analysis.analyze_video(b"fake mp4 bytes", num_frames=3, max_frame_side=320)
+
+    assert sum(1 for args in calls if args[0] == "ffprobe") == 1
+    assert [frame.time for frame in analysis.frames] == [150.0, 300.0, 450.0]
+    assert analysis.frames[0].image.size == (320, 180)
+    assert all(url.startswith("data:image/png;base64,") for url in analysis.thumbnails())
+
+
+class FakePopen:
+    """Stands in for an ffmpeg process writing ``output`` to stdout."""
+
+    def __init__(self, output, returncode=0):
+        self.stdout = io.BytesIO(output)
+        self.stderr = io.BytesIO(b"" if returncode == 0 else b"Invalid data found")
+        self.returncode = returncode
+
+    def wait(self):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+def _fake_ffmpeg(monkeypatch, output, returncode=0, info=None):
+    monkeypatch.setattr(video_analysis, "ffmpeg_exe", lambda: "ffmpeg")
+    monkeypatch.setattr(video_analysis, "probe", lambda path: info or VideoInfo(60, 30, 1920, 1080, bitrate=8_000_000))
+    commands = []
+
+    def popen(args, **kwargs):
+        commands.append(args)
+        return FakePopen(output, returncode)
+
+    monkeypatch.setattr(video_analysis.subprocess, "Popen", popen)
+    return commands
+
+
+def test_transcode_command_never_upscales(monkeypatch):
+    monkeypatch.setattr(video_analysis, "ffmpeg_exe", lambda: "ffmpeg")
+    source = VideoInfo(60, 12, 640, 360, bitrate=300_000, has_audio=True)
+    args = video_analysis.transcode_command("in.mp4", source, "2000k", 24, 720)
+    assert "scale=-2:'min(720,ih)'" in args
+    assert args[args.index("-r") + 1] == "12"
+    assert args[args.index("-b:v") + 1] == "300000"
+    assert args[args.index("-c:a") + 1] == "aac"
+    assert args[-1] == "-" and "frag_keyframe" in args[args.index("-movflags") + 1]
+    assert "-an" in video_analysis.transcode_command("in.mp4", VideoInfo(60, 30, 1920, 1080), "500k", 15, 480)
+
+
+def test_transcode_streams_into_spooled_file(monkeypatch, tmp_path):
+    path = tmp_path / "in.mp4"
+    path.write_bytes(b"x" * 10_000)
+    commands = _fake_ffmpeg(monkeypatch, b"y" * 2_500)
+    result = video_analysis.transcode(str(path), "low")
+    assert result.transcoded and result.read() == b"y" * 2_500
+    assert result.ratio == 0.25 and result.seconds >= 0
+    assert commands[0][commands[0].index("-b:v") + 1] == "500000"
+    result.close()
+
+
+def test_transcode_keeps_a_smaller_original(monkeypatch, tmp_path):
+    path = tmp_path / "in.mp4"
+    path.write_bytes(b"x" * 1_000)
+    _fake_ffmpeg(monkeypatch, b"y" * 5_000)
+    result = video_analysis.transcode(str(path), "high")
+    assert not result.transcoded and result.read() == b"x" * 1_000 and result.ratio == 1.0
+
+
+def test_transcode_failure_raises(monkeypatch, tmp_path):
+    path = tmp_path / "in.mp4"
+    path.write_bytes(b"x")
+    _fake_ffmpeg(monkeypatch, b"", returncode=1)
+    with pytest.raises(video_analysis.FFmpegError, match="Invalid data"):
+        video_analysis.transcode(str(path))
@@ -0,0 +1,134 @@
+import time
+
+import pytest
+
+from ui import write_behind
+
+
+@pytest.fixture
+def writer(database, monkeypatch):
+    monkeypatch.setattr(write_behind, "database", database)
+    w = write_behind.WriteBehindWriter(flush_size=8, flush_interval=60)
+    yield w
+    w.close()
+
+
+def test_flush_persists_queued_writes(writer, database):
+    conv_id = writer.create_new_conversation("wb_user", "Queued")
+    writer.save_message(conv_id, "user", "hello")
+    writer.save_message(conv_id, "assistant", "hi", {"provider": "google"})
+
+    assert writer.flush(timeout=5)
+
+    messages = database.get_conversation_messages(conv_id)
+    assert [m["content"] for m in messages] == ["hello", "hi"]
+    assert messages[1]["provider"] == "google"
+    assert database.get_user_conversations("wb_user")[0][0] == conv_id
+
+
+def test_size_threshold_triggers_grouped_flush(writer, database):
+    conv_id = writer.create_new_conversation("wb_user", "Batch")
+    for i in range(15):
+        writer.save_message(conv_id, "user", f"m{i}")
+
+    # flush_interval is 60s, so only the size threshold can wake the writer here
+    deadline = time.time() + 5
+    while writer.stats()["writes"] < 8 and time.time() < deadline:
+        time.sleep(0.01)
+    assert writer.stats()["writes"] >= 8
+
+    assert writer.flush(timeout=5)
+    stats = writer.stats()
+    assert stats["writes"] == 16
+    assert stats["flushes"] <= 3
+    assert stats["queue_depth"] == 0
+    assert stats["pending"] == 0
+    assert stats["avg_flush_ms"] > 0
+
+
+def test_close_drains_pending_writes(database, monkeypatch):
+    monkeypatch.setattr(write_behind, "database", database)
+    w = write_behind.WriteBehindWriter(flush_size=1000, flush_interval=60)
+    conv_id = w.create_new_conversation("wb_user", "Shutdown")
+    for i in range(5):
+        w.save_message(conv_id, "user", f"m{i}")
+
+    w.close()
+
+    assert len(database.get_conversation_messages(conv_id)) == 5
+
+
+def test_failed_flush_is_counted_and_dropped(writer, monkeypatch):
+    def boom(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(write_behind.database, "save_batch", boom)
+    monkeypatch.setattr(write_behind.time, "sleep", lambda s: None)
+    writer.save_message("c", "user", "lost")
+
+    assert writer.flush(timeout=5)
+    stats = writer.stats()
+    assert stats["errors"] == write_behind.MAX_FLUSH_RETRIES
+    assert stats["dropped"] == 1
+
+
+def test_writes_after_close_go_straight_to_disk(database, monkeypatch):
+    monkeypatch.setattr(write_behind, "database", database)
+    w = write_behind.WriteBehindWriter(flush_size=1000, flush_interval=60)
+    conv_id = w.create_new_conversation("wb_user", "Late")
+    w.close()
+
+    w.save_message(conv_id, "user", "after atexit")
+    assert [m["content"] for m in database.get_conversation_messages(conv_id)] == ["after atexit"]
+
+
+def test_no_write_is_lost_to_a_concurrent_close(database, monkeypatch):
+    import threading
+
+    monkeypatch.setattr(write_behind, "database", database)
+    w = write_behind.WriteBehindWriter(flush_size=16, flush_interval=0.01)
+    conv_id = w.create_new_conversation("wb_user", "Race")
+    started = threading.Barrier(5)
+
+    def produce(n):
+        started.wait()
+        for i in range(200):
+            w.save_message(conv_id, "user", f"{n}-{i}")
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    started.wait()
+    w.close()
+    for t in threads:
+        t.join()
+
+    assert len(database.get_conversation_messages(conv_id)) == 800
+
+
+def test_queued_writes_do_not_resurrect_a_deleted_conversation(writer, database):
+    conv_id = writer.create_new_conversation("wb_user", "Doomed")
+    writer.save_message(conv_id, "user", "queued before delete")
+    writer.delete_conversation(conv_id)
+    assert writer.flush(timeout=5)
+    assert database.get_conversation_messages(conv_id) == []
+    assert database.get_user_conversations("wb_user") == []
+
+    # Already flushed writes are removed by a later delete as well
+    other = writer.create_new_conversation("wb_user", "Flushed")
+    writer.save_message(other, "user", "on disk")
+    assert writer.flush(timeout=5)
+    writer.delete_conversation(other)
+    assert writer.flush(timeout=5)
+    assert database.get_user_conversations("wb_user") == []
+
+
+def test_flush_conversation_waits_only_for_its_own_writes(writer, database):
+    assert writer.flush_conversation("nothing-queued", timeout=0)
+
+    conv_id = writer.create_new_conversation("wb_user", "Mine")
+    writer.save_message(conv_id, "user", "read me back")
+    # flush_interval is 60s, so the writer only runs because it was woken
+    assert writer.flush_conversation(conv_id, timeout=5)
+    assert [m["content"] for m in database.get_conversation_messages(conv_id)] == ["read me back"]
+    assert writer.flush_conversation(conv_id, timeout=0)
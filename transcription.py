@@ -0,0 +1,303 @@
+"""
+Segmented, parallel transcription of long audio
+Audio is decoded once to 16 kHz mono 16-bit PCM, split into speech
+segments at silences found frame by frame with
+``RealTimeAudioProcessor.detect_silence``, and the segments are
+transcribed concurrently on a small worker pool, so a long recording
+costs roughly the slowest segment instead of one huge request that the
+recognizer may reject. Results are stitched back in order with
+timestamps, and each finished segment is reported to an ``on_partial``
+callback so callers can stream the transcript as it grows.
+
+WAV files are decoded with the standard library; other formats go
+through the ffmpeg binary found by ``video_analysis.ffmpeg_exe``.
+"""
+import io
+import logging
+import subprocess
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from voice_advanced import RealTimeAudioProcessor
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # bytes per sample, int16
+FRAME_MS = 30  # silence is decided per frame of this length
+SILENCE_THRESHOLD = 0.02  # RMS level below which a frame is silent
+MIN_SILENCE_MS = 400  # a pause at least this long ends a segment
+MAX_SEGMENT_SECONDS = 30.0  # longer speech is cut at its last short pause
+PADDING_MS = 150  # kept around each segment so word edges are not clipped
+MAX_PARALLEL_SEGMENTS = 4
+DECODE_TIMEOUT = 300
+
+
+class AudioDecodeError(RuntimeError):
+    """The audio could not be decoded to PCM."""
+
+
+@dataclass
+class AudioSegment:
+    index: int
+    start: float  # seconds
+    end: float
+    pcm: bytes  # mono int16 at ``sample_rate``
+    sample_rate: int = SAMPLE_RATE
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def wav(self) -> bytes:
+        return pcm_to_wav(self.pcm, self.sample_rate)
+
+
+@dataclass
+class TranscriptPiece:
+    index: int
+    start: float
+    end: float
+    text: str = ""
+    error: Optional[str] = None
+
+
+@dataclass
+class Transcript:
+    pieces: List[TranscriptPiece] = field(default_factory=list)
+    duration: float = 0.0
+    seconds: float = 0.0  # wall time spent transcribing
+
+    @property
+    def text(self) -> str:
+        return " ".join(p.text for p in self.pieces if p.text)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for p in self.pieces if p.error)
+
+    @property
+    def ok(self) -> bool:
+        """True when at least one segment was recognized, or there was no speech to recognize."""
+        return not self.pieces or self.failed < len(self.pieces)
+
+    def timestamped(self) -> str:
+        """One ``[mm:ss] text`` line per recognized segment, in order."""
+        return "\n".join(f"[{format_timestamp(p.start)}] {p.text}" for p in self.pieces if p.text)
+
+    def render(self) -> str:
+        """Plain text for a single segment, timestamped lines for several."""
+        return self.text if len(self.pieces) <= 1 else self.timestamped()
+
+
+Recognizer = Callable[[AudioSegment], str]
+PartialCallback = Callable[[int, int, Transcript], None]  # (segments done, total, transcript so far)
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+# --- Decoding ---
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(SAMPLE_WIDTH)
+        out.setframerate(sample_rate)
+        out.writeframes(pcm)
+    return buf.getvalue()
+
+
+def _decode_wav(data: bytes, sample_rate: int) -> Optional[bytes]:
+    """Mono int16 PCM from a 16-bit WAV, or None when ffmpeg is needed."""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as source:
+            channels, width, rate = source.getnchannels(), source.getsampwidth(), source.getframerate()
+            raw = source.readframes(source.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    if width != SAMPLE_WIDTH:
+        return None
+    if channels == 1 and rate == sample_rate:
+        return raw
+    import numpy as np
+    samples = np.frombuffer(raw, dtype=np.int16).reshape(-1, channels).mean(axis=1)
+    if rate != sample_rate and len(samples):
+        count = int(round(len(samples) * sample_rate / rate))
+        samples = np.interp(np.arange(count) * rate / sample_rate, np.arange(len(samples)), samples)
+    return np.clip(np.round(samples), -32768, 32767).astype(np.int16).tobytes()
+
+
+def decode_audio(data: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Decode any audio file's bytes to mono int16 PCM at ``sample_rate``."""
+    pcm = _decode_wav(data, sample_rate)
+    if pcm is not None:
+        return pcm
+    from video_analysis import FFmpegError, ffmpeg_exe
+    try:
+        args = [ffmpeg_exe(), "-v", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1",
+                "-ar", str(sample_rate), "pipe:1"]
+        result = subprocess.run(args, input=data, capture_output=True, timeout=DECODE_TIMEOUT)
+    except (FFmpegError, OSError, subprocess.TimeoutExpired) as e:
+        raise AudioDecodeError(f"Cannot decode audio: {e}") from e
+    if result.returncode != 0 or not result.stdout:
+        raise AudioDecodeError(result.stderr.decode(errors="replace").strip() or "ffmpeg produced no audio")
+    return result.stdout
+
+
+def audio_duration(path: str) -> Optional[float]:
+    """Length in seconds from the file header, without decoding; None when unknown.
+
+    WAV headers are read directly. Other formats ask ffprobe, or fall back
+    to the input summary ``ffmpeg -i`` prints.
+    """
+    try:
+        with wave.open(path, "rb") as source:
+            return source.getnframes() / float(source.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        pass
+    except OSError:
+        return None
+    from video_analysis import _DURATION_RE, FFmpegError, _run, ffmpeg_exe, ffprobe_exe
+    try:
+        ffprobe = ffprobe_exe()
+        if ffprobe:
+            result = _run([ffprobe, "-v", "error", "-show_entries", "format=duration",
+                           "-of", "default=noprint_wrappers=1:nokey=1", path])
+            if result.returncode == 0:
+                return float(result.stdout.decode().strip())
+        result = _run([ffmpeg_exe(), "-hide_banner", "-i", path])
+        match = _DURATION_RE.search(result.stderr.decode("utf-8", errors="replace"))
+    except (FFmpegError, OSError, ValueError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"Cannot read audio duration of {path}: {e}")
+        return None
+    if match is None:
+        return None
+    hours, minutes, seconds, _ = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+# --- Segmentation ---
+def segment_speech(pcm: bytes, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS,
+                   threshold: float = SILENCE_THRESHOLD, min_silence_ms: int = MIN_SILENCE_MS,
+                   max_segment_seconds: float = MAX_SEGMENT_SECONDS, padding_ms: int = PADDING_MS,
+                   processor: Optional[RealTimeAudioProcessor] = None) -> List[AudioSegment]:
+    """Split PCM into speech segments at pauses; silence-only audio yields none.
+
+    A segment ends at the first pause of ``min_silence_ms``. Speech running
+    past ``max_segment_seconds`` is cut at its last silent frame in the
+    second half of the window, or at the limit when it has none.
+    """
+    processor = processor or RealTimeAudioProcessor(sample_rate=sample_rate)
+    pcm = pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH]
+    frame_bytes = max(1, sample_rate * frame_ms // 1000) * SAMPLE_WIDTH
+    silent = [processor.detect_silence(pcm[i:i + frame_bytes], threshold) for i in range(0, len(pcm), frame_bytes)]
+    min_silence = max(1, min_silence_ms // frame_ms)
+    max_frames = max(2, int(max_segment_seconds * 1000 // frame_ms))
+
+    spans = []  # [first frame, end frame)
+    start = None
+    last_voiced = 0
+    for i, is_silent in enumerate(silent):
+        if start is None:
+            if not is_silent:
+                start, last_voiced = i, i
+            continue
+        if not is_silent:
+            last_voiced = i
+        if i - last_voiced >= min_silence:
+            spans.append((start, last_voiced + 1))
+            start = None
+        elif i + 1 - start >= max_frames:
+            pauses = [j for j in range(start + max_frames // 2, i + 1) if silent[j]]
+            cut = pauses[-1] if pauses else i + 1
+            spans.append((start, cut))
+            start = cut if cut <= i else None
+            last_voiced = i
+    if start is not None:
+        spans.append((start, last_voiced + 1))
+
+    padding = padding_ms // frame_ms
+    segments = []
+    previous_end = 0
+    for first, end in spans:
+        first = max(previous_end, first - padding)
+        end = min(len(silent), end + padding)
+        previous_end = end
+        chunk = pcm[first * frame_bytes:end * frame_bytes]
+        stop = min(len(pcm), end * frame_bytes) / SAMPLE_WIDTH / sample_rate
+        segments.append(AudioSegment(len(segments), first * frame_ms / 1000, stop, chunk, sample_rate))
+    return segments
+
+
+# --- Transcription ---
+def transcribe_segments(segments: List[AudioSegment], recognize: Recognizer,
+                        max_workers: int = MAX_PARALLEL_SEGMENTS,
+                        on_partial: Optional[PartialCallback] = None) -> Transcript:
+    """Recognize segments concurrently, at most ``max_workers`` at a time.
+
+    ``on_partial`` runs on the calling thread after each segment finishes,
+    with the transcript of the segments done so far in audio order. A
+    failed segment is kept with its error so the rest still come through.
+    """
+    start = time.perf_counter()
+    duration = segments[-1].end if segments else 0.0
+    done: List[TranscriptPiece] = []
+    if segments:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(segments))),
+                                thread_name_prefix="transcribe") as pool:
+            futures = {pool.submit(recognize, segment): segment for segment in segments}
+            for future in as_completed(futures):
+                segment = futures[future]
+                piece = TranscriptPiece(segment.index, segment.start, segment.end)
+                try:
+                    piece.text = (future.result() or "").strip()
+                except Exception as e:
+                    piece.error = str(e) or type(e).__name__
+                    logger.warning(f"Segment {segment.index} at {format_timestamp(segment.start)} failed: {piece.error}")
+                done.append(piece)
+                if on_partial is not None:
+                    partial = Transcript(sorted(done, key=lambda p: p.index), duration)
+                    try:
+                        on_partial(len(done), len(segments), partial)
+                    except Exception as e:
+                        logger.debug(f"Partial transcript callback failed: {e}")
+    transcript = Transcript(sorted(done, key=lambda p: p.index), duration, time.perf_counter() - start)
+    logger.info(f"Transcribed {duration:.0f}s of audio in {len(segments)} segments "
+                f"({transcript.failed} failed) in {transcript.seconds:.1f}s")
+    return transcript
+
+
+def transcribe_audio(data: bytes, recognize: Recognizer, max_workers: int = MAX_PARALLEL_SEGMENTS,
+                     on_partial: Optional[PartialCallback] = None, **segment_options) -> Transcript:
+    """Decode, segment and transcribe one audio file's bytes."""
+    pcm = decode_audio(data)
+    segments = segment_speech(pcm, **segment_options)
+    transcript = transcribe_segments(segments, recognize, max_workers=max_workers, on_partial=on_partial)
+    transcript.duration = len(pcm) / SAMPLE_WIDTH / SAMPLE_RATE
+    return transcript
+
+
+def google_web_recognizer(language: str = "en-US") -> Recognizer:
+    """Recognizer on speech_recognition's free Google Web Speech endpoint.
+
+    A segment with no intelligible speech gives an empty string rather
+    than an error.
+    """
+    import speech_recognition as sr
+
+    def recognize(segment: AudioSegment) -> str:
+        audio = sr.AudioData(segment.pcm, segment.sample_rate, SAMPLE_WIDTH)
+        try:
+            return sr.Recognizer().recognize_google(audio, language=language)
+        except sr.UnknownValueError:
+            return ""
+    return recognize
+
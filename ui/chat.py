@@ -5,17 +5,19 @@ from datetime import datetime
 import streamlit as st
 from PIL import Image
 
-from brain import AIBrain
+from brain import DEFAULT_DEADLINE, DEFAULT_PROVIDER_TIMEOUT, AIBrain
+from captioning import caption_server_url
+from document_ingest import ProgressBoard
 from ui.chat_utils import (
-    augment_prompt_with_search,
-    extract_video_frame_thumbnails,
+    extract_upload_context,
     generate_image_captions,
     generate_standard_response,
     perform_internet_search,
     prepare_brain_configuration,
-    transcribe_audio_file,
 )
 from ui.config import PROVIDER_ICONS
+from ui.token_budget import compose_prompt
+from ui.turn_pipeline import TurnPipeline
 
 
 def show_chat_page():
@@ -115,6 +117,18 @@ def show_chat_page():
 
         st.markdown("<div style='height: 2rem'></div>", unsafe_allow_html=True)
 
+    # Older history is loaded a page at a time (newest page comes from the sidebar)
+    history_before_id = st.session_state.get("history_before_id")
+    if messages and history_before_id and "conversation_id" in st.session_state:
+        if st.button("⬆️ Load earlier messages", key="load_earlier_history"):
+            from ui.database import get_conversation_page
+
+            older, st.session_state.history_before_id = get_conversation_page(
+                st.session_state.conversation_id, before_id=history_before_id
+            )
+            st.session_state.messages = older + messages
+            st.rerun()
+
     # 4. Filter logic (kept from original)
     chat_search = st.session_state.get("chat_search_value", "")
     messages_to_display = messages
@@ -211,6 +225,12 @@ def show_chat_page():
             )
             st.session_state.search_time_range = time_range
 
+            st.session_state.search_deep_grounding = st.checkbox(
+                "Read result pages",
+                value=st.session_state.get("search_deep_grounding", False),
+                help="Fetch the top result pages in parallel and add excerpts to the context",
+            )
+
         # Optional Domain Filter
         domain_filter = st.text_input(
             "Limit to Site (optional)",
@@ -229,8 +249,9 @@ def show_chat_page():
 
     uploaded_images = []
     uploaded_file_info = []
+    # (stage name, file_info, extension, bytes); extracted when a prompt is sent
+    pending_uploads = []
     extra_context = ""
-    search_results = []
 
     # 7. Multimodal Uploads Area
     with st.expander("📎 Upload Files & Images", expanded=False):
@@ -251,77 +272,21 @@ def show_chat_page():
                     uploaded_file_info.append({"name": file.name, "type": "Image"})
                     st.success(f"Image: {file.name}")
 
-                # PDF/TXT
-                elif file_ext in ["pdf", "txt", "md"]:
-                    if file_ext == "pdf":
-                        try:
-                            import PyPDF2
-
-                            pdf = PyPDF2.PdfReader(file)
-                            text = ""
-                            for page in pdf.pages[:5]:
-                                text += page.extract_text() + "\n"
-                            extra_context += f"\n--- PDF {file.name} ---\n{text}\n"
-                            uploaded_file_info.append(
-                                {"name": file.name, "type": "PDF"}
-                            )
-                            st.success(f"PDF: {file.name}")
-                        except ImportError:
-                            st.error("PyPDF2 not installed")
-                    else:
-                        text = file.read().decode("utf-8")
-                        extra_context += f"\n--- {file.name} ---\n{text}\n"
-                        uploaded_file_info.append({"name": file.name, "type": "Text"})
-                        st.success(f"Text: {file.name}")
-
-                # Audio files
-                if file_ext in ["mp3", "wav"]:
-                    try:
-                        # Keep a buffer copy for transcription helper
-                        file_bytes = file.read()
-                        from io import BytesIO
-
-                        audio_buf = BytesIO(file_bytes)
-                        transcription = transcribe_audio_file(audio_buf)
-                        extra_context += f"\n--- Audio {file.name} (transcript) ---\n{transcription}\n"
-                        uploaded_file_info.append(
-                            {
-                                "name": file.name,
-                                "type": "Audio",
-                                "transcript": transcription,
-                            }
-                        )
-                        st.success(f"Audio processed: {file.name}")
-                    except Exception as e:
-                        st.warning(f"Audio processing failed: {e}")
-
-                # Video files
-                if file_ext in ["mp4", "mov"]:
-                    try:
-                        from io import BytesIO
-
-                        file_bytes = file.read()
-                        video_buf = BytesIO(file_bytes)
-                        thumbs = extract_video_frame_thumbnails(video_buf, max_frames=3)
-                        if thumbs:
-                            uploaded_file_info.append(
-                                {
-                                    "name": file.name,
-                                    "type": "Video",
-                                    "thumbnails": thumbs,
-                                }
-                            )
-                            # display small gallery
-                            cols = st.columns(min(len(thumbs), 3))
-                            for i, b64 in enumerate(thumbs):
-                                with cols[i % 3]:
-                                    st.image(b64)
-                            extra_context += f"\n--- Video {file.name} - {len(thumbs)} thumbnails extracted ---\n"
-                            st.success(f"Video processed: {file.name}")
-                        else:
-                            st.info("No thumbnails extracted")
-                    except Exception as e:
-                        st.warning(f"Video processing failed: {e}")
+                # Documents, audio and video are extracted in the turn pipeline,
+                # concurrently with captioning and search, once a prompt is sent
+                else:
+                    file_type = {
+                        "pdf": "PDF", "txt": "Text", "md": "Text",
+                        "mp3": "Audio", "wav": "Audio", "mp4": "Video", "mov": "Video",
+                    }.get(file_ext)
+                    if file_type:
+                        info = {"name": file.name, "type": file_type}
+                        uploaded_file_info.append(info)
+                        stage = f"document:{file.name}"
+                        if any(p[0] == stage for p in pending_uploads):
+                            stage += f"#{len(pending_uploads)}"
+                        pending_uploads.append((stage, info, file_ext, file.getvalue()))
+                        st.success(f"{file_type}: {file.name}")
 
     # Advanced captioning option (move outside upload loop)
     adv_caption = st.checkbox(
@@ -337,7 +302,7 @@ def show_chat_page():
 
         # Check if the resource is already cached in Streamlit
         # We can try to peek or just rely on a session state flag that indicates explicit load success
-        model_ready = st.session_state.get("blip_loaded", False)
+        model_ready = st.session_state.get("blip_loaded", False) or bool(caption_server_url())
 
         if not model_ready:
             st.warning("⚠️ High Performance Model Required")
@@ -408,19 +373,21 @@ def show_chat_page():
         st.session_state.messages.append(user_msg)
 
         # --- DB SAVE: USER ---
-        from ui.database import create_new_conversation, save_message
+        # Queued on the write-behind writer so the turn never waits on a commit
+        from ui.write_behind import get_write_behind
 
+        db_writer = get_write_behind()
         try:
             if "conversation_id" not in st.session_state:
                 user_id = st.session_state.get("username", "guest")
                 # Smart title generation
                 title = (prompt[:30] + "..") if len(prompt) > 30 else prompt
-                st.session_state.conversation_id = create_new_conversation(
+                st.session_state.conversation_id = db_writer.create_new_conversation(
                     user_id, title
                 )
 
             # Save to DB
-            save_message(
+            db_writer.save_message(
                 st.session_state.conversation_id,
                 "user",
                 prompt,
@@ -447,62 +414,123 @@ def show_chat_page():
         with st.chat_message("assistant"):
             start_time = time.time()
 
-            final_prompt = prompt
+            deep_grounding = st.session_state.get("search_deep_grounding", False)
+            learning_brain = st.session_state.get("learning_brain")
+            brain = None
+            if st.session_state.get("enable_brain_mode"):
+                brain = AIBrain()
+                brain.internet_enabled = st.session_state.get("enable_internet", True)
+
+            # --- Pre-processing: independent stages run concurrently ---
+            pipeline = TurnPipeline()
+            extraction_progress = ProgressBoard()
+            for stage, _, file_ext, data in pending_uploads:
+                name = stage.split(":", 1)[1]
+                pipeline.add(
+                    stage, extract_upload_context, name, file_ext, data,
+                    question=prompt,
+                    conversation_id=st.session_state.get("conversation_id"),
+                    progress=extraction_progress.reporter(
+                        name, unit="segments" if file_ext in ("mp3", "wav") else "pages"
+                    ),
+                )
+            if uploaded_images:
+                pipeline.add(
+                    "captions", generate_image_captions, uploaded_images,
+                    use_blip=st.session_state.get("enable_advanced_captioning", False),
+                    hosted_api_url=st.session_state.get("hosted_caption_url"),
+                )
+            if st.session_state.get("enable_internet_search", False):
+                pipeline.add(
+                    "search", perform_internet_search, prompt,
+                    enable_search=True,
+                    max_results=st.session_state.get("search_result_count", 5),
+                    search_type=st.session_state.get("search_type", "Web"),
+                    time_range=st.session_state.get("search_time_range", "Anytime"),
+                    domain=st.session_state.get("search_domain_filter", None),
+                    deep=deep_grounding,
+                )
+            if brain is not None and brain.internet_enabled:
+                pipeline.add("brain_context", brain.gather_internet_context, prompt, deep=deep_grounding)
+            if brain is not None and learning_brain is not None:
+                pipeline.add("recall", learning_brain.get_related_knowledge, prompt, limit=2)
+
+            if len(pipeline):
+                progress_slot = st.empty()
+                partial_slot = st.empty()
+
+                def _show_extraction_progress():
+                    snapshot = extraction_progress.snapshot()
+                    if snapshot is not None:
+                        fraction, label = snapshot
+                        progress_slot.progress(min(fraction, 1.0), text=f"📄 {label}")
+                    # Transcripts stream in as audio segments finish
+                    partials = extraction_progress.partials()
+                    if partials:
+                        partial_slot.caption("\n\n".join(
+                            f"🎙️ {name}: …{text[-400:]}" for name, text in partials.items()
+                        ))
+
+                with st.spinner("⚙️ Preparing context..."):
+                    pipeline.run(poll=_show_extraction_progress)
+                progress_slot.empty()
+                partial_slot.empty()
+                for result in pipeline.results.values():
+                    if not result.ok:
+                        st.warning(f"{result.name} skipped: {result.error}")
+
+            # Documents, audio transcripts and video thumbnails
+            for stage, info, _, _ in pending_uploads:
+                extracted = pipeline.value(stage)
+                if not extracted:
+                    continue
+                extra_context += extracted["context"]
+                info.update({k: v for k, v in extracted.items() if k != "context"})
+                thumbs = extracted.get("thumbnails")
+                if thumbs:
+                    cols = st.columns(min(len(thumbs), 3))
+                    for i, b64 in enumerate(thumbs):
+                        with cols[i % 3]:
+                            st.image(b64)
+
+            # Attachments and search context stay separate so they can be
+            # packed into the selected model's context window by priority
+            attachment_sections = []
             if extra_context:
-                final_prompt += f"\n\nContext:\n{extra_context}"
+                attachment_sections.append(("Context", extra_context))
 
             # Multimodal processing: images -> captions
-            if uploaded_images:
-                try:
-                    use_blip = st.session_state.get("enable_advanced_captioning", False)
-                    img_context = generate_image_captions(
-                        uploaded_images, use_blip=use_blip
-                    )
-                    if img_context:
-                        img_texts = "\n".join(
-                            [f"{it['name']}: {it['caption']}" for it in img_context]
-                        )
-                        final_prompt += f"\n\nImage Context:\n{img_texts}"
-                except Exception as e:
-                    st.warning(f"Image processing error: {e}")
+            img_context = pipeline.value("captions")
+            if img_context:
+                img_texts = "\n".join(
+                    [f"{it['name']}: {it['caption']}" for it in img_context]
+                )
+                attachment_sections.append(("Image Context", img_texts))
 
             # Internet Search Integration
-            if st.session_state.get("enable_internet_search", False):
-                with st.spinner("🔍 Searching the internet..."):
-                    # Pass new filters to helper
-                    search_type_val = st.session_state.get("search_type", "Web")
-                    time_range_val = st.session_state.get(
-                        "search_time_range", "Anytime"
-                    )
-                    domain_val = st.session_state.get("search_domain_filter", None)
-
-                    search_results, search_context = perform_internet_search(
-                        prompt,
-                        enable_search=True,
-                        max_results=st.session_state.get("search_result_count", 5),
-                        search_type=search_type_val,
-                        time_range=time_range_val,
-                        domain=domain_val,
+            search_results, _ = pipeline.value("search", ([], ""))
+            search_context = ""
+            if search_results:
+                st.success(f"📡 Found {len(search_results)} web results")
+
+                # Display search results
+                with st.expander("🌐 Search Results", expanded=False):
+                    from ui.internet_search import (
+                        create_search_context,
+                        format_search_results_for_chat,
                     )
 
-                    if search_results:
-                        st.success(f"📡 Found {len(search_results)} web results")
+                    search_display = format_search_results_for_chat(
+                        search_results, "web"
+                    )
+                    st.markdown(search_display)
 
-                        # Display search results
-                        with st.expander("🌐 Search Results", expanded=False):
-                            from ui.internet_search import (
-                                format_search_results_for_chat,
-                            )
+                search_context = create_search_context(search_results, prompt)
 
-                            search_display = format_search_results_for_chat(
-                                search_results, "web"
-                            )
-                            st.markdown(search_display)
+            final_prompt = compose_prompt(prompt, search_context, attachment_sections)
 
-                        # Augment prompt with search results
-                        final_prompt = augment_prompt_with_search(
-                            prompt, search_results
-                        )
+            if len(pipeline):
+                st.caption(f"⏱ {pipeline.format_timings()}")
 
             # Gather API keys once
             api_key_map = {
@@ -515,10 +543,8 @@ def show_chat_page():
             }
 
             # Brain Mode Logic
-            if st.session_state.get("enable_brain_mode"):
+            if brain is not None:
                 st.info("🧠 Brain processing...")
-                brain = AIBrain()
-                brain.internet_enabled = st.session_state.get("enable_internet", True)
 
                 models_to_query = prepare_brain_configuration(api_key_map)
 
@@ -526,26 +552,75 @@ def show_chat_page():
                     response_text = "Please configure API keys (Google, OpenAI, or Claude) to use Brain Mode."
                 else:
                     try:
-                        config = {"temperature": 0.7, "max_output_tokens": 1024}
-
-                        # Internet Search
-                        internet_ctx = ""
-                        if brain.internet_enabled:
-                            with st.spinner("Searching internet..."):
-                                internet_ctx = brain.gather_internet_context(prompt)
-                                if internet_ctx:
-                                    final_prompt += (
-                                        f"\n\nInternet Info:\n{internet_ctx}"
+                        config = {
+                            "temperature": 0.7,
+                            "max_output_tokens": 1024,
+                            "cache_responses": st.session_state.get("response_cache_enabled", False),
+                        }
+
+                        # Internet Search (gathered by the pre-processing pipeline)
+                        internet_ctx = pipeline.value("brain_context", "")
+                        if internet_ctx:
+                            final_prompt += f"\n\nInternet Info:\n{internet_ctx}"
+
+                        # Recall related answers the brain learned earlier
+                        if learning_brain is not None:
+                            related = pipeline.value("recall")
+                            if related:
+                                recalled = "\n".join(
+                                    f"- Q: {r['query']}\n  A: {r['answers'][0][:300]}"
+                                    for r in related
+                                    if r.get("answers")
+                                )
+                                final_prompt += f"\n\nPreviously learned:\n{recalled}"
+
+                        # Query Models concurrently; partial answers render as they stream in
+                        live_panels = {}
+                        live_text = {}
+                        last_render = {}
+                        with st.expander("🧠 Live model answers", expanded=True):
+                            for i, m in enumerate(models_to_query):
+                                st.caption(f"{m['provider'].upper()} - {m['model']}")
+                                live_panels[i] = st.empty()
+
+                        def render_model_event(event):
+                            i = event["index"]
+                            if event["type"] == "chunk":
+                                live_text[i] = live_text.get(i, "") + event["text"]
+                                now = time.time()
+                                # Throttle redraws; every chunk still lands in live_text
+                                if now - last_render.get(i, 0.0) >= 0.05:
+                                    live_panels[i].markdown(live_text[i] + " ▌")
+                                    last_render[i] = now
+                            else:
+                                result = event["result"]
+                                if result.get("late"):
+                                    live_panels[i].markdown(f"{result['response']}\n\n⏱ *late - not included*")
+                                else:
+                                    live_panels[i].markdown(
+                                        result["response"] if result["success"] else f"⚠️ {result['response']}"
                                     )
 
-                        # Query Models
-                        # Async execution wrapper
+                        # SLA: overall deadline, per-provider timeout, quorum and hedging
+                        quorum = st.session_state.get("brain_quorum", 0)
                         responses = asyncio.run(
                             brain.query_multiple_models(
-                                final_prompt, models_to_query, config
+                                final_prompt, models_to_query, config,
+                                on_event=render_model_event,
+                                deadline=st.session_state.get("brain_deadline", DEFAULT_DEADLINE),
+                                provider_timeout=st.session_state.get("brain_provider_timeout", DEFAULT_PROVIDER_TIMEOUT),
+                                quorum=min(quorum, len(models_to_query)) if quorum else None,
+                                hedge=st.session_state.get("brain_hedging", False),
                             )
                         )
 
+                        # Learn from this round (persists only the delta); late
+                        # models were cut off, not wrong, so they are left out
+                        if learning_brain is not None:
+                            learning_brain.learn_from_responses(
+                                prompt, [r for r in responses if not r.get("late")]
+                            )
+
                         # Synthesize
                         response_text = brain.synthesize_responses(
                             prompt, responses, internet_ctx
@@ -577,6 +652,7 @@ def show_chat_page():
                     "max_tokens": st.session_state.get("max_tokens", 2048),
                     "top_p": st.session_state.get("top_p", 0.95),
                     "enable_streaming": st.session_state.get("enable_streaming", True),
+                    "cache_responses": st.session_state.get("response_cache_enabled", False),
                 }
 
                 sys_prompt = st.session_state.get("system_instruction", "")
@@ -585,11 +661,14 @@ def show_chat_page():
                     provider=provider,
                     model_name=model_name,
                     api_keys=api_key_map,
-                    prompt=final_prompt,
+                    prompt=prompt,
                     chat_history=st.session_state.messages,
                     system_instruction=sys_prompt,
                     config=config,
                     images=uploaded_images,
+                    search_context=search_context,
+                    attachments=attachment_sections,
+                    conversation_id=st.session_state.get("conversation_id"),
                 )
 
             end_time = time.time()
@@ -601,13 +680,14 @@ def show_chat_page():
                     "response_time": end_time - start_time,
                     "provider": provider,
                     "model": model_name,
+                    "stage_timings": pipeline.timings(),
                 }
             )
 
             # --- DB SAVE: ASSISTANT ---
             try:
                 if "conversation_id" in st.session_state:
-                    save_message(
+                    db_writer.save_message(
                         st.session_state.conversation_id,
                         "assistant",
                         response_text,
@@ -615,6 +695,7 @@ def show_chat_page():
                             "provider": provider,
                             "model": model_name,
                             "response_time": end_time - start_time,
+                            "stage_timings": pipeline.timings(),
                         },
                     )
             except Exception as e:
@@ -3,6 +3,21 @@ import streamlit as st
 import logging
 from typing import List, Dict, Optional, Any, Callable, Tuple
 
+from captioning import (
+    DEFAULT_MODEL_ID, caption_backend, caption_server_url, get_caption_cache, get_caption_engine, image_hash, load_blip,
+)
+from document_ingest import extract_pdf_pages, get_document_store
+from prompt_cache import (
+    anthropic_request, google_system_instruction, openai_messages, openai_stream_kwargs,
+    report_usage, usage_from_anthropic, usage_from_google, usage_from_openai,
+)
+from provider_clients import OPENAI_COMPATIBLE_BASE_URLS, get_registry
+from response_cache import get_response_cache, replay_chunks, request_key
+from transcription import google_web_recognizer, transcribe_audio
+from upload_cache import artifact_key, content_hash, get_upload_cache
+from ui.summary_memory import get_summary_memory, summary_message
+from ui.token_budget import compose_prompt, get_token_counter, pack_context, pack_history
+
 logger = logging.getLogger(__name__)
 
 # BLIP cache holds (processor, model, device)
@@ -16,48 +31,64 @@ def get_internet_search_engine():
     return InternetSearchEngine()
 
 
-@st.cache_resource
+# Provider clients live in the process-wide registry (shared with Brain Mode)
 def get_openai_client(api_key: str, base_url: Optional[str] = None):
-    from openai import OpenAI
-    return OpenAI(api_key=api_key, base_url=base_url) if base_url else OpenAI(api_key=api_key)
+    return get_registry().get("openai", api_key, base_url)
 
 
-@st.cache_resource
 def get_anthropic_client(api_key: str):
-    from anthropic import Anthropic
-    return Anthropic(api_key=api_key)
+    return get_registry().get("anthropic", api_key)
 
 
-@st.cache_resource
 def get_google_client(api_key: str):
-    # Import dynamically to avoid hard dependency if not used
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    return genai
+    # Legacy google.generativeai module, configured only when the key changes
+    return get_registry().google_legacy(api_key)
 
 # --- Conversation helpers ---
-def build_conversation_history(messages: List[Dict], exclude_last: bool = True, max_messages: int = 20, max_chars: int = 50000) -> List[Dict]:
+def build_conversation_history(messages: List[Dict], exclude_last: bool = True, max_messages: int = 20, max_chars: int = 50000,
+                               model: Optional[str] = None, max_tokens: Optional[int] = None,
+                               summary: Optional[str] = None) -> List[Dict]:
+    """Prior turns as role/content dicts.
+
+    With ``max_tokens`` the newest messages that fit that many of ``model``'s
+    tokens are kept; otherwise the message-count and character caps apply.
+    Older turns that do not fit are replaced by ``summary`` (the conversation's
+    rolling summary) or, without one, condensed into previews.
+    """
     history = messages[:-1] if exclude_last and len(messages) > 0 else messages
     if not history:
         return []
     formatted = [{"role": msg["role"], "content": msg["content"]} for msg in history if "role" in msg and "content" in msg]
+    if max_tokens is not None:
+        counter = get_token_counter(model)
+        recent, older, _ = pack_history(formatted, max_tokens, counter)
+        if older:
+            older_message = summary_message(summary) if summary else {"role": "system", "content": _summarize_older(older)}
+            if counter.count_message(older_message) + sum(map(counter.count_message, recent)) <= max_tokens:
+                return [older_message] + recent
+        return recent
     total_chars = sum(len(m.get("content", "")) for m in formatted)
     if len(formatted) > max_messages or total_chars > max_chars:
         older = formatted[:-max_messages] if len(formatted) > max_messages else []
         recent = formatted[-max_messages:]
         if older:
-            older_summary_parts = []
-            for msg in older[-10:]:
-                content = msg.get("content", "")
-                preview = content[:200] + "..." if len(content) > 200 else content
-                older_summary_parts.append(f"{msg.get('role', 'unknown').upper()}: {preview}")
-            summary_text = "[Earlier conversation summary]\n" + "\n".join(older_summary_parts)
-            return [{"role": "system", "content": summary_text}] + recent
+            if summary:
+                return [summary_message(summary)] + recent
+            return [{"role": "system", "content": _summarize_older(older)}] + recent
         else:
             return recent
     return formatted
 
 
+def _summarize_older(older: List[Dict]) -> str:
+    older_summary_parts = []
+    for msg in older[-10:]:
+        content = msg.get("content", "")
+        preview = content[:200] + "..." if len(content) > 200 else content
+        older_summary_parts.append(f"{msg.get('role', 'unknown').upper()}: {preview}")
+    return "[Earlier conversation summary]\n" + "\n".join(older_summary_parts)
+
+
 def create_openai_messages(conversation_history: List[Dict], current_prompt: str, system_instruction: Optional[str] = None) -> List[Dict]:
     messages = []
     if system_instruction:
@@ -100,11 +131,10 @@ def handle_google_provider(
     images: List = None,
     enable_streaming: bool = False
 ) -> str:
+    start = time.perf_counter()
     try:
         if not api_key: return "Please provide a Google API Key."
-        import google.generativeai as genai
-        # Configure the global instance
-        genai.configure(api_key=api_key)
+        genai = get_google_client(api_key)
         
         # Mapping config specifically for GenerativeModel
         generation_config = genai.types.GenerationConfig(
@@ -159,27 +189,33 @@ def handle_google_provider(
             except Exception as e:
                 logger.warning(f"Google streaming visualization failed: {e}")
             
+            report_usage("google", model_name, usage_from_google(getattr(response, "usage_metadata", None)),
+                         time.perf_counter() - start)
             return "".join(collected_text)
         else:
+             report_usage("google", model_name, usage_from_google(getattr(response, "usage_metadata", None)),
+                          time.perf_counter() - start)
              return response.text
 
     except Exception as e:
         logger.error(f"Google provider error: {e}")
+        report_usage("google", model_name, None, time.perf_counter() - start, success=False)
         return f"Error connecting to Google Gemini: {str(e)}"
 
 def handle_anthropic_provider(
     api_key: str,
     model_name: str,
     messages: List[Dict],
-    system_instruction: Optional[str] = None,
+    system_instruction: Optional[Any] = None,
     temperature: float = 0.7,
     max_tokens: int = 2048,
     enable_streaming: bool = False
 ) -> str:
+    """``system_instruction`` is a string or a list of text blocks (with cache breakpoints)"""
+    start = time.perf_counter()
     try:
         if not api_key: return "Please provide an Anthropic API Key."
-        from anthropic import Anthropic
-        client = Anthropic(api_key=api_key)
+        client = get_anthropic_client(api_key)
         
         kwargs = {
              "model": model_name,
@@ -201,9 +237,14 @@ def handle_anthropic_provider(
         
         if enable_streaming:
             collected_text = []
+            usage = {}
             def _stream_gen():
                 for event in response:
-                    if event.type == 'content_block_delta':
+                    if event.type == 'message_start':
+                        usage.update(usage_from_anthropic(event.message.usage) or {})
+                    elif event.type == 'message_delta' and getattr(event, 'usage', None):
+                        usage["output_tokens"] = event.usage.output_tokens
+                    elif event.type == 'content_block_delta':
                         text = event.delta.text
                         collected_text.append(text)
                         yield text
@@ -212,12 +253,16 @@ def handle_anthropic_provider(
                 st.write_stream(_stream_gen())
             except Exception:
                 pass
+            report_usage("anthropic", model_name, usage or None, time.perf_counter() - start)
             return "".join(collected_text)
         else:
+            report_usage("anthropic", model_name, usage_from_anthropic(getattr(response, "usage", None)),
+                         time.perf_counter() - start)
             return response.content[0].text
 
     except Exception as e:
          logger.error(f"Anthropic provider error: {e}")
+         report_usage("anthropic", model_name, None, time.perf_counter() - start, success=False)
          return f"Error connecting to Anthropic Claude: {str(e)}"
 
 def generate_standard_response(
@@ -228,9 +273,18 @@ def generate_standard_response(
     chat_history: List[Dict],
     system_instruction: str = "",
     config: Dict[str, Any] = {},
-    images: List = None
+    images: List = None,
+    search_context: str = "",
+    attachments: Optional[List[Tuple[str, str]]] = None,
+    conversation_id: Optional[str] = None
 ) -> str:
-    """Unified dispatcher for standard mode chat generation"""
+    """Unified dispatcher for standard mode chat generation
+
+    The system instruction, history, ``search_context`` and labelled
+    ``attachments`` are packed into the model's context window by priority
+    before the prompt is sent. With a ``conversation_id``, turns that no
+    longer fit are represented by the conversation's rolling summary.
+    """
     api_key = api_keys.get(provider)
     if not api_key:
         return f"❌ Missing API Key for {provider}. Please check sidebar settings."
@@ -241,35 +295,87 @@ def generate_standard_response(
         top_p = config.get('top_p', 0.95)
         stream = config.get('enable_streaming', False)
 
+        memory = get_summary_memory() if conversation_id else None
+        summary = memory.get(conversation_id)[0] if memory else ""
+        packed = pack_context(
+            model_name, prompt, system_instruction,
+            history=chat_history[:-1],  # the last message is the current prompt
+            search_context=search_context, attachments=attachments or (),
+            reserve_output=max_tok, provider=provider,
+            summary=summary_message(summary) if summary else None
+        )
+        logger.info(f"Context for {model_name}: {packed.describe()}")
+        if memory and packed.dropped_messages:
+            # Fold the turns that just fell out of the window in the background;
+            # the current prompt and the kept history stay out of the summary
+            kept = len(packed.history) - packed.summarized
+            memory.schedule(conversation_id, keep_last=kept + 1)
+        # Requests are laid out stable prefix first (system, documents, history)
+        # and the volatile turn last, so providers can reuse cached prefixes
+
+        # Opt-in: an identical request replays the stored answer without a provider call
+        cache = get_response_cache() if config.get('cache_responses') else None
+        cache_key = None
+        if cache is not None:
+            cache_key = request_key(
+                provider, model_name,
+                openai_messages(packed.system_instruction, packed.attachments, packed.history, packed.turn),
+                {"temperature": temp, "max_tokens": max_tok, "top_p": top_p}, images or ()
+            )
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for {provider}/{model_name}")
+                _show_cached_response(cached, stream)
+                return cached
+
         if provider == "google":
-            return handle_google_provider(
-                api_key, model_name, prompt, system_instruction, 
+            response_text = handle_google_provider(
+                api_key, model_name, packed.turn,
+                google_system_instruction(packed.system_instruction, packed.attachments),
                 temp, max_tok, top_p, images, enable_streaming=stream
             )
             
-        elif provider in ["openai", "together", "xai", "deepseek"]:
-            base_urls = {
-                "together": "https://api.together.xyz/v1",
-                "xai": "https://api.x.ai/v1",
-                "deepseek": "https://api.deepseek.com"
-            }
-            client = get_openai_client(api_key, base_urls.get(provider))
-            msgs = create_openai_messages(build_conversation_history(chat_history), prompt, system_instruction)
-            return handle_openai_compatible_provider(client, model_name, msgs, temp, max_tok, top_p, stream)
+        elif provider in OPENAI_COMPATIBLE_BASE_URLS:
+            client = get_openai_client(api_key, OPENAI_COMPATIBLE_BASE_URLS[provider])
+            msgs = openai_messages(packed.system_instruction, packed.attachments, packed.history, packed.turn)
+            response_text = handle_openai_compatible_provider(client, model_name, msgs, temp, max_tok, top_p, stream,
+                                                              provider=provider)
             
         elif provider == "anthropic":
-            # Anthropic expects just user/assistant messages
-            msgs = [{"role": "user", "content": prompt}] # Simplified for this call; ideally use full history if supported
-            return handle_anthropic_provider(
-                api_key, model_name, msgs, system_instruction, 
+            request = anthropic_request(packed.system_instruction, packed.attachments, packed.history, packed.turn)
+            response_text = handle_anthropic_provider(
+                api_key, model_name, request["messages"], request.get("system"),
                 temp, max_tok, enable_streaming=stream
             )
             
-        return "Provider not supported."
+        else:
+            return "Provider not supported."
+
+        if cache_key is not None and not is_failure_response(response_text):
+            cache.put(cache_key, response_text, provider, model_name)
+        return response_text
         
     except Exception as e:
         return f"Generation Error: {str(e)}"
 
+# Messages the provider handlers return in place of an answer
+FAILURE_RESPONSE_PREFIXES = (
+    "Error: ", "Error connecting to ", "Please provide ", "I apologize, but I couldn't generate a response.",
+)
+
+def is_failure_response(text: str) -> bool:
+    return not text or text.startswith(FAILURE_RESPONSE_PREFIXES)
+
+def _show_cached_response(text: str, enable_streaming: bool):
+    """Render a cached answer the way a live one would be rendered"""
+    try:
+        if enable_streaming:
+            st.write_stream(replay_chunks(text))
+        else:
+            st.markdown(text)
+    except Exception:
+        pass
+
 def prepare_brain_configuration(api_keys: Dict[str, str], requested_models: List[str] = None) -> List[Dict[str, Any]]:
     """Helper to build the list of models for Brain Mode based on available keys"""
     models_to_query = []
@@ -295,28 +401,39 @@ def handle_openai_compatible_provider(
     temperature: float,
     max_tokens: int,
     top_p: float,
-    enable_streaming: bool
+    enable_streaming: bool,
+    provider: str = "openai"
 ) -> str:
     @retry_with_backoff(retries=2)
     def _create_completion(stream_mode):
+        extra = openai_stream_kwargs(provider) if stream_mode else {}
         return client.chat.completions.create(
             model=model_name,
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
             top_p=top_p,
-            stream=stream_mode
+            stream=stream_mode,
+            **extra
         )
 
+    start = time.perf_counter()
     if enable_streaming:
         try:
             stream = _create_completion(True)
         except Exception as e:
+            report_usage(provider, model_name, None, time.perf_counter() - start, success=False)
             return f"Error: {str(e)}"
 
         collected_chunks = []
+        usage = []
         def _iter_chunks():
             for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    # With include_usage the final chunk carries usage and no choices
+                    usage.append(chunk.usage)
+                if not chunk.choices:
+                    continue
                 piece = chunk.choices[0].delta.content or ""
                 collected_chunks.append(piece)
                 yield piece
@@ -325,13 +442,18 @@ def handle_openai_compatible_provider(
             st.write_stream(_iter_chunks())
         except Exception:
             pass
+        report_usage(provider, model_name, usage_from_openai(usage[-1] if usage else None),
+                     time.perf_counter() - start)
         response_text = "".join(collected_chunks)
         return response_text if response_text else "I apologize, but I couldn't generate a response."
     else:
         try:
             response = _create_completion(False)
         except Exception as e:
+            report_usage(provider, model_name, None, time.perf_counter() - start, success=False)
             return f"Error: {str(e)}"
+        report_usage(provider, model_name, usage_from_openai(getattr(response, "usage", None)),
+                     time.perf_counter() - start)
 
         response_text = getattr(response.choices[0].message, 'content', None) or response.choices[0].message['content']
         if not response_text:
@@ -344,7 +466,7 @@ def handle_openai_compatible_provider(
 
 
 # --- Internet search integration ---
-def perform_internet_search(query: str, enable_search: bool = True, max_results: int = 5, search_type: str = "Web", time_range: str = "Anytime", domain: str = None) -> tuple[List[Dict], str]:
+def perform_internet_search(query: str, enable_search: bool = True, max_results: int = 5, search_type: str = "Web", time_range: str = "Anytime", domain: str = None, deep: bool = False) -> tuple[List[Dict], str]:
     if not enable_search:
         return [], ""
     try:
@@ -355,10 +477,10 @@ def perform_internet_search(query: str, enable_search: bool = True, max_results:
              # but standard DDG news api might handle max_results.
              # If we want detailed time filtering for news, we'd need to extend it, 
              # but for now we route to search_news.
-             results = search_engine.search_news(query, max_results=max_results)
+             results = search_engine.search_news(query, max_results=max_results, detailed=deep)
         else:
              # Standard Web Search with filters
-             results = search_engine.search(query, max_results=max_results, time_range=time_range, domain=domain)
+             results = search_engine.search(query, max_results=max_results, detailed=deep, time_range=time_range, domain=domain)
              
         if results:
             from ui.internet_search import create_search_context
@@ -375,14 +497,7 @@ def augment_prompt_with_search(prompt: str, search_results: List[Dict]) -> str:
     if not search_results:
         return prompt
     from ui.internet_search import create_search_context
-    context = create_search_context(search_results, prompt)
-    augmented = f"""{prompt}
-
-[SUPPLEMENTED WITH REAL-TIME WEB SEARCH RESULTS]:
-{context}
-
-Please use the above search results to provide a current and accurate answer."""
-    return augmented
+    return compose_prompt(prompt, create_search_context(search_results, prompt))
 
 
 # --- Multimodal helpers ---
@@ -408,56 +523,109 @@ def process_images_for_context(images: List) -> List[Dict]:
     return results
 
 
-def transcribe_audio_file(file_like) -> str:
+def transcribe_audio_file(file_like, progress: Optional[Callable[..., None]] = None) -> str:
+    """Transcript of an audio file, split at silences and recognized segment-parallel.
+
+    ``progress`` receives (segments done, total segments, partial transcript)
+    as segments finish. Recordings with several segments come back as
+    ``[mm:ss]`` timestamped lines.
+    """
     try:
-        import speech_recognition as sr
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(file_like) as source:
-            audio = recognizer.record(source)
-        try:
-            text = recognizer.recognize_google(audio)
-            return text
-        except Exception as e:
-            logger.warning(f"Speech recognition failed: {e}")
-            return "[Transcription failed or not available]"
+        recognize = google_web_recognizer()
     except Exception:
         logger.info("speech_recognition not installed; skipping transcription")
         return "[Transcription unavailable - install speech_recognition]"
 
+    def on_partial(done, total, transcript):
+        if progress is not None:
+            progress(done, total, transcript.render())
 
-def extract_video_frame_thumbnails(file_like, max_frames: int = 3) -> List[str]:
-    thumbnails: List[str] = []
     try:
-        import importlib
-        moviepy = importlib.import_module("moviepy.editor")
-        VideoFileClip = getattr(moviepy, "VideoFileClip")
-        import tempfile
-        from io import BytesIO
-        import base64
-        from PIL import Image
+        transcript = transcribe_audio(file_like.read(), recognize, on_partial=on_partial)
+    except Exception as e:
+        logger.warning(f"Speech recognition failed: {e}")
+        return "[Transcription failed or not available]"
+    if not transcript.ok:
+        return "[Transcription failed or not available]"
+    if transcript.failed:
+        # Kept for this turn, but not cached, so the missing parts are retried
+        return (f"[Transcription incomplete: {transcript.failed} of {len(transcript.pieces)} segments failed]\n"
+                f"{transcript.render()}")
+    return transcript.render() or "[No speech detected]"
+
+
+def extract_upload_context(name: str, file_ext: str, data: bytes, question: str = "",
+                           conversation_id: Optional[str] = None,
+                           progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    """Prompt context for one uploaded document, audio or video file.
+
+    Returns ``{"context": str}`` plus any extra file metadata (``transcript``,
+    ``thumbnails``, ``pages``). Extraction results are cached by file content,
+    so a file that stays attached across turns is processed once. Long PDFs
+    contribute only the chunks most relevant to ``question``; ``progress``
+    receives (pages done, total pages) while a PDF is extracted, and
+    (segments done, total segments, partial transcript) while audio is
+    transcribed. Runs off the script thread, so it must not touch ``st``.
+    """
+    if file_ext == "pdf":
+        pages = _cached_artifact("pdf_pages", data, progress).get("pages", [])
+        index = get_document_store().get_or_build(conversation_id, content_hash(data), lambda: pages)
+        return {"context": f"\n--- PDF {name} ---\n{index.context(question)}\n", "pages": len(pages)}
+    if file_ext in ("txt", "md"):
+        return {"context": f"\n--- {name} ---\n{data.decode('utf-8', errors='replace')}\n"}
+    if file_ext in ("mp3", "wav"):
+        transcription = _cached_artifact("audio", data, progress).get("transcript", "")
+        return {
+            "context": f"\n--- Audio {name} (transcript) ---\n{transcription}\n",
+            "transcript": transcription,
+        }
+    if file_ext in ("mp4", "mov"):
+        thumbs = _cached_artifact("video", data).get("thumbnails", [])
+        if not thumbs:
+            return {"context": "", "thumbnails": []}
+        return {
+            "context": f"\n--- Video {name} - {len(thumbs)} thumbnails extracted ---\n",
+            "thumbnails": thumbs,
+        }
+    return {"context": ""}
 
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=True) as tmp:
-            tmp.write(file_like.read())
-            tmp.flush()
-            clip = VideoFileClip(tmp.name)
-            duration = clip.duration or 0
-            times = [(i + 1) * duration / (max_frames + 1) for i in range(max_frames)]
-            for t in times:
-                frame = clip.get_frame(t)
-                img = Image.fromarray(frame)
-                buf = BytesIO()
-                img.thumbnail((320, 320))
-                img.save(buf, format='PNG')
-                b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-                thumbnails.append(f"data:image/png;base64,{b64}")
-            try:
-                clip.reader.close()
-            except Exception:
-                pass
-            clip.audio = None
+
+def _extract_artifact(kind: str, data: bytes, progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    """Name-independent extraction result for one file's content."""
+    from io import BytesIO
+    if kind == "pdf_pages":
+        return {"pages": extract_pdf_pages(data, progress=progress)}
+    if kind == "audio":
+        return {"transcript": transcribe_audio_file(BytesIO(data), progress=progress)}
+    if kind == "video":
+        return {"thumbnails": extract_video_frame_thumbnails(BytesIO(data), max_frames=3)}
+    raise ValueError(f"Unknown artifact kind: {kind}")
+
+
+def _artifact_is_complete(artifact: Dict[str, Any]) -> bool:
+    # Placeholder transcripts and empty thumbnail lists mean a missing
+    # dependency or a failed call; those are retried rather than cached
+    if not artifact or not any(artifact.values()):
+        return False
+    return not str(artifact.get("transcript", "")).startswith("[Transcription")
+
+
+def _cached_artifact(kind: str, data: bytes, progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    return get_upload_cache().get_or_compute(
+        artifact_key(kind, data), lambda: _extract_artifact(kind, data, progress), cacheable=_artifact_is_complete
+    )
+
+
+def extract_video_frame_thumbnails(file_like, max_frames: int = 3, scene_detection: bool = False) -> List[str]:
+    """Thumbnail data URLs from one probe plus one keyframe seek per frame."""
+    try:
+        from video_analysis import THUMBNAIL_SIZE, analyze_video
+        analysis = analyze_video(file_like.read(), num_frames=max_frames, scene_detection=scene_detection,
+                                 max_frame_side=max(THUMBNAIL_SIZE))
+        return analysis.thumbnails()
     except Exception as e:
-        logger.info(f"moviepy not available or failed to extract frames: {e}")
-    return thumbnails
+        logger.info(f"ffmpeg not available or failed to extract frames: {e}")
+        return []
 
 
 
@@ -467,17 +635,18 @@ def extract_video_frame_thumbnails(file_like, max_frames: int = 3) -> List[str]:
 
 
 def generate_blip_caption(image) -> Optional[str]:
+    return generate_blip_captions([image])[0]
+
+
+def generate_blip_captions(images: List) -> List[Optional[str]]:
+    """BLIP captions for all images in one batched pass; cached captions skip the model."""
     try:
-        processor, model, device = get_blip_model()
-        inputs = processor(images=image, return_tensors="pt").to(device)
-        import torch
-        with torch.no_grad():
-            output_ids = model.generate(**inputs, max_new_tokens=50)
-        caption = processor.decode(output_ids[0], skip_special_tokens=True)
-        return caption
+        backend = caption_backend()
+        engine = get_caption_engine(get_blip_model, model_tag=f"{DEFAULT_MODEL_ID}:{backend}")
+        return engine.caption_batch(images)
     except Exception as e:
         logger.info(f"BLIP captioning unavailable: {e}")
-        return None
+        return [None] * len(images)
 
 
 def call_hosted_caption_api(image, api_url: str, api_key: Optional[str] = None) -> Optional[str]:
@@ -500,22 +669,59 @@ def call_hosted_caption_api(image, api_url: str, api_key: Optional[str] = None)
         return None
 
 
+def _hosted_captions(images: List, api_url: str, api_key: Optional[str]) -> List[Optional[str]]:
+    """Hosted API captions, cached by image content so reruns do not call the API again.
+
+    Uncached images are sent concurrently, so a batching server such as
+    caption_server.py can caption a whole upload in one pass.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = get_caption_cache()
+    keys = [cache.key(f"hosted:{api_url}", image_hash(img)) for img in images]
+    found = cache.get_many(keys)
+    pending = {}
+    for key, img in zip(keys, images):
+        if key not in found:
+            pending.setdefault(key, img)
+    fresh = {}
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as pool:
+            futures = {key: pool.submit(call_hosted_caption_api, img, api_url, api_key) for key, img in pending.items()}
+        for key, future in futures.items():
+            try:
+                caption = future.result()
+            except Exception as e:
+                logger.info(f"Hosted caption call failed: {e}")
+                caption = None
+            if caption:
+                fresh[key] = caption
+    cache.put_many(fresh)
+    return [found.get(key) or fresh.get(key) for key in keys]
+
+
 def generate_image_captions(images: List, use_blip: bool = False, hosted_api_url: Optional[str] = None, hosted_api_key: Optional[str] = None) -> List[Dict]:
     if not images:
         return []
+    captions: List[Optional[str]] = [None] * len(images)
+    if hosted_api_url:
+        try:
+            captions = _hosted_captions(images, hosted_api_url, hosted_api_key)
+        except Exception as e:
+            logger.info(f"Hosted captioning failed: {e}")
+    pending = [i for i, caption in enumerate(captions) if not caption]
+    if pending and use_blip:
+        # Everything the hosted API did not caption goes through one batched BLIP pass,
+        # on the shared caption server when one is configured
+        server_url = caption_server_url()
+        if server_url:
+            blip_captions = _hosted_captions([images[i] for i in pending], server_url, None)
+        else:
+            blip_captions = generate_blip_captions([images[i] for i in pending])
+        for i, caption in zip(pending, blip_captions):
+            captions[i] = caption
     results = []
-    for i, img in enumerate(images, 1):
-        caption = None
-        if hosted_api_url:
-            try:
-                caption = call_hosted_caption_api(img, hosted_api_url, hosted_api_key)
-            except Exception as e:
-                logger.info(f"Hosted caption call failed for image {i}: {e}")
-        if not caption and use_blip:
-            try:
-                caption = generate_blip_caption(img)
-            except Exception as e:
-                logger.info(f"BLIP caption failed for image {i}: {e}")
+    for i, (img, caption) in enumerate(zip(images, captions), 1):
         if not caption:
             fallback = process_images_for_context([img])[0]
             caption = fallback.get('caption')
@@ -533,30 +739,11 @@ def preload_blip_model(timeout: int = 120) -> bool:
 
 
 @st.cache_resource(show_spinner=False)
-def _load_blip_resources():
-    from transformers import BlipProcessor, BlipForConditionalGeneration
-    import torch
-    
-    model_id = "Salesforce/blip-image-captioning-base"
-    
-    # helper to load with retry strategy
-    def load_with_fallback(cls, model_id):
-        # 1. Try local cache first
-        try:
-            return cls.from_pretrained(model_id, local_files_only=True)
-        except Exception:
-            # 2. Try download
-            return cls.from_pretrained(model_id, local_files_only=False)
-
-    processor = load_with_fallback(BlipProcessor, model_id)
-    model = load_with_fallback(BlipForConditionalGeneration, model_id)
-    
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model.to(device)
-    return processor, model, device
+def _load_blip_resources(backend: str = "torch"):
+    return load_blip(DEFAULT_MODEL_ID, backend=backend)
 
 def get_blip_model():
-    return _load_blip_resources()
+    return _load_blip_resources(caption_backend())
 
 def preload_blip_model_with_progress(progress_callback: Optional[Callable[[int, str], None]] = None) -> bool:
     """
@@ -574,7 +761,7 @@ def preload_blip_model_with_progress(progress_callback: Optional[Callable[[int,
              progress_callback(30, "Loading BLIP model items...")
         
         # This will block until loaded
-        _load_blip_resources()
+        _load_blip_resources(caption_backend())
         
         if progress_callback:
             progress_callback(100, "BLIP model ready")
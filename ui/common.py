@@ -3,6 +3,7 @@ from typing import Any, Dict, List
 import streamlit as st
 
 from ui.config import MODEL_PRICING
+from ui.token_budget import count_tokens
 
 
 def logout():
@@ -16,18 +17,18 @@ def logout():
     st.rerun()
 
 
-def estimate_tokens(text: str) -> int:
-    """Rough token estimate: ~4 chars per token for English"""
+def estimate_tokens(text: str, model: str = None) -> int:
+    """Token count with the model's tokenizer, or its provider's calibrated estimate"""
     if not text:
         return 0
-    return len(text) // 4
+    return count_tokens(text, model)
 
 
 def calculate_cost(model: str, input_text: str, output_text: str) -> float:
     """Calculate estimated cost for a request"""
     pricing = MODEL_PRICING.get(model, (1.0, 1.0))  # Default fallback
-    input_tokens = estimate_tokens(input_text)
-    output_tokens = estimate_tokens(output_text)
+    input_tokens = estimate_tokens(input_text, model)
+    output_tokens = estimate_tokens(output_text, model)
 
     input_cost = (input_tokens / 1_000_000) * pricing[0]
     output_cost = (output_tokens / 1_000_000) * pricing[1]
@@ -1,6 +1,10 @@
 import sqlite3
 import json
 import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 import uuid
 from typing import List, Dict, Optional, Tuple
@@ -8,116 +12,472 @@ from typing import List, Dict, Optional, Tuple
 DB_FILE = "chat_history.db"
 logger = logging.getLogger(__name__)
 
+# --- Connection pool ---
+# Connections are opened once, tuned, and handed out per thread. Streamlit
+# spins up a fresh script thread on every rerun, so idle connections go back
+# into a small shared pool instead of living in thread-locals forever.
+POOL_SIZE = 16
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+# SQL is kept in module constants so every call reuses the connection's
+# compiled statement cache instead of re-preparing the same text.
+SQL_INSERT_CONVERSATION = ("INSERT OR IGNORE INTO conversations (id, user_id, title, created_at, updated_at) "
+                           "VALUES (?, ?, ?, ?, ?)")
+SQL_TOUCH_CONVERSATION = "UPDATE conversations SET updated_at = ? WHERE id = ?"
+SQL_INSERT_MESSAGE = ("INSERT INTO messages (conversation_id, role, content, meta_json, timestamp) "
+                      "VALUES (?, ?, ?, ?, ?)")
+SQL_SELECT_USER_CONVERSATIONS = ("SELECT id, title, updated_at FROM conversations "
+                                 "WHERE user_id = ? ORDER BY updated_at DESC")
+SQL_SELECT_USER_CONVERSATIONS_PAGE = ("SELECT id, title, updated_at FROM conversations "
+                                      "WHERE user_id = ? ORDER BY updated_at DESC LIMIT ?")
+SQL_SELECT_MESSAGES = ("SELECT role, content, meta_json, timestamp FROM messages "
+                       "WHERE conversation_id = ? ORDER BY id ASC")
+# Newest-first pages walk the (conversation_id, id) index backwards, so the
+# cost depends on the page size rather than the conversation length.
+SQL_SELECT_MESSAGES_PAGE = ("SELECT id, role, content, meta_json, timestamp FROM messages "
+                            "WHERE conversation_id = ? ORDER BY id DESC LIMIT ? OFFSET ?")
+SQL_SELECT_MESSAGES_PAGE_BEFORE = ("SELECT id, role, content, meta_json, timestamp FROM messages "
+                                   "WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ? OFFSET ?")
+SQL_SELECT_MESSAGES_RANGE = ("SELECT role, content, meta_json, timestamp FROM messages "
+                             "WHERE conversation_id = ? ORDER BY id ASC LIMIT ? OFFSET ?")
+SQL_COUNT_MESSAGES = "SELECT COUNT(*) FROM messages WHERE conversation_id = ?"
+SQL_SELECT_SUMMARY = ("SELECT summary, covered_count FROM conversation_summaries "
+                      "WHERE conversation_id = ?")
+SQL_UPSERT_SUMMARY = ("INSERT OR REPLACE INTO conversation_summaries "
+                      "(conversation_id, summary, covered_count, updated_at) VALUES (?, ?, ?, ?)")
+SQL_DELETE_CONVERSATION = "DELETE FROM conversations WHERE id = ?"
+SQL_DELETE_CONVERSATION_MESSAGES = "DELETE FROM messages WHERE conversation_id = ?"
+SQL_DELETE_CONVERSATION_SUMMARY = "DELETE FROM conversation_summaries WHERE conversation_id = ?"
+SQL_UPDATE_TITLE = "UPDATE conversations SET title = ? WHERE id = ?"
+SQL_SEARCH_MESSAGES = ("SELECT m.id, m.conversation_id, c.title, m.role, "
+                       "snippet(messages_fts, 0, ?, ?, '…', 16), m.timestamp, bm25(messages_fts) "
+                       "FROM messages_fts "
+                       "JOIN messages m ON m.id = messages_fts.rowid "
+                       "JOIN conversations c ON c.id = m.conversation_id "
+                       "WHERE messages_fts MATCH ? AND c.user_id = ? "
+                       "ORDER BY bm25(messages_fts) LIMIT ?")
+SQL_SEARCH_MESSAGES_LIKE = ("SELECT m.id, m.conversation_id, c.title, m.role, m.content, m.timestamp "
+                            "FROM messages m JOIN conversations c ON c.id = m.conversation_id "
+                            "WHERE c.user_id = ? AND m.content LIKE ? ESCAPE '\\' "
+                            "ORDER BY m.id DESC LIMIT ?")
+SQL_INSERT_FEEDBACK = ("INSERT INTO feedback (user_id, category, rating, comment, timestamp) "
+                       "VALUES (?, ?, ?, ?, ?)")
+
+def _fts5_available(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _migrate_message_search(conn: sqlite3.Connection):
+    """External-content FTS5 index over messages.content, kept in sync by triggers."""
+    if not _fts5_available(conn):
+        logger.warning("SQLite built without FTS5; chat search will fall back to LIKE scans")
+        return
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                 "content, content='messages', content_rowid='id', "
+                 "tokenize='unicode61 remove_diacritics 2')")
+    conn.execute("CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+                 "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END")
+    conn.execute("CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+                 "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END")
+    conn.execute("CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+                 "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+                 "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END")
+    # Backfill history written before the index existed
+    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+
+def _ensure_message_search(conn: sqlite3.Connection):
+    """Build the search index if migration 2 ran on a SQLite without FTS5 and FTS5 is here now.
+
+    user_version alone cannot tell: it advances even when the index was skipped.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone():
+        return
+    if _fts5_available(conn):
+        logger.info("FTS5 is available now; building the chat search index")
+        _migrate_message_search(conn)
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# A step is a tuple of SQL statements or a callable taking the connection.
+# Append new steps; never edit or reorder the ones already shipped.
+SCHEMA_MIGRATIONS: List = [
+    # 1: composite indexes backing paginated history reads
+    (
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation_id "
+        "ON messages (conversation_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_user_updated "
+        "ON conversations (user_id, updated_at)",
+    ),
+    # 2: full-text search over message content
+    _migrate_message_search,
+    # 3: rolling summary of the messages that fell out of the context window
+    (
+        "CREATE TABLE IF NOT EXISTS conversation_summaries "
+        "(conversation_id TEXT PRIMARY KEY, summary TEXT, covered_count INTEGER, updated_at TIMESTAMP)",
+    ),
+]
+
+HISTORY_PAGE_SIZE = 50
+
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections for a single database file."""
+
+    def __init__(self, path: str, max_idle: int = POOL_SIZE):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not apply '{pragma}': {e}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the current thread.
+
+        Nested checkouts on the same thread reuse the outer connection, so
+        helpers can call each other without grabbing a second handle.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        """Close every idle connection held by the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(path: Optional[str] = None) -> ConnectionPool:
+    # DB_FILE is looked up at call time so tests can patch it per case
+    path = path or DB_FILE
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(path, ConnectionPool(path))
+    return pool
+
+
+def get_connection():
+    """Context manager yielding a pooled connection to the current DB_FILE."""
+    return _get_pool().connection()
+
+
+def close_all_connections():
+    """Close pooled connections for every database (used on shutdown and in tests)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _discard_pool(path: str):
+    with _pools_lock:
+        pool = _pools.pop(path, None)
+    if pool is not None:
+        pool.close()
+
+
 def init_db():
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        # conversations: id, user_id, title, created_at, updated_at
-        c.execute('''CREATE TABLE IF NOT EXISTS conversations
-                     (id TEXT PRIMARY KEY, user_id TEXT, title TEXT, 
-                      created_at TIMESTAMP, updated_at TIMESTAMP)''')
-        
-        # messages: id, conversation_id, role, content, meta_json, timestamp
-        c.execute('''CREATE TABLE IF NOT EXISTS messages
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT, 
-                      role TEXT, content TEXT, meta_json TEXT, timestamp TIMESTAMP)''')
-
-        # feedback: id, user_id, category, rating, comment, timestamp
-        c.execute('''CREATE TABLE IF NOT EXISTS feedback
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT,
-                      category TEXT, rating INTEGER, comment TEXT, timestamp TIMESTAMP)''')
-        conn.commit()
-        conn.close()
+        # A database file deleted underneath the pool leaves connections
+        # pointing at the old inode and orphaned WAL sidecars; start clean.
+        if not os.path.exists(DB_FILE):
+            _discard_pool(DB_FILE)
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(DB_FILE + suffix):
+                    os.remove(DB_FILE + suffix)
+
+        with get_connection() as conn, conn:
+            c = conn.cursor()
+            # conversations: id, user_id, title, created_at, updated_at
+            c.execute('''CREATE TABLE IF NOT EXISTS conversations
+                         (id TEXT PRIMARY KEY, user_id TEXT, title TEXT, 
+                          created_at TIMESTAMP, updated_at TIMESTAMP)''')
+
+            # messages: id, conversation_id, role, content, meta_json, timestamp
+            c.execute('''CREATE TABLE IF NOT EXISTS messages
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT, 
+                          role TEXT, content TEXT, meta_json TEXT, timestamp TIMESTAMP)''')
+
+            # feedback: id, user_id, category, rating, comment, timestamp
+            c.execute('''CREATE TABLE IF NOT EXISTS feedback
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT,
+                          category TEXT, rating INTEGER, comment TEXT, timestamp TIMESTAMP)''')
+
+            _apply_migrations(conn)
+            _ensure_message_search(conn)
     except Exception as e:
         logger.error(f"Database init error: {e}")
 
+def _apply_migrations(conn: sqlite3.Connection):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        if callable(step):
+            step(conn)
+        else:
+            for statement in step:
+                conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {target}")
+        logger.info(f"Database migrated to schema version {target}")
+
 def create_new_conversation(user_id: str, title: str = "New Chat") -> str:
     conversation_id = str(uuid.uuid4())
     save_conversation_metadata(conversation_id, user_id, title)
     return conversation_id
 
 def save_conversation_metadata(conversation_id: str, user_id: str, title: str):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
     now = datetime.now()
-    # Insert or Ignore
-    c.execute("INSERT OR IGNORE INTO conversations (id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
-              (conversation_id, user_id, title, now, now))
-    # Update updated_at if exists
-    c.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn, conn:
+        # Insert or Ignore, then bump updated_at if it already existed
+        conn.execute(SQL_INSERT_CONVERSATION, (conversation_id, user_id, title, now, now))
+        conn.execute(SQL_TOUCH_CONVERSATION, (now, conversation_id))
 
 def save_message(conversation_id: str, role: str, content: str, meta: Dict = None):
     if meta is None: meta = {}
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
     now = datetime.now()
-    
-    # Ensure raw content is saved, meta handles images/files references
-    c.execute("INSERT INTO messages (conversation_id, role, content, meta_json, timestamp) VALUES (?, ?, ?, ?, ?)",
-              (conversation_id, role, content, json.dumps(meta), now))
-    
-    # Update conversation timestamp
-    c.execute("UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
-    conn.commit()
-    conn.close()
-
-def get_user_conversations(user_id: str) -> List[Tuple]:
-    """Returns list of (id, title, updated_at)"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT id, title, updated_at FROM conversations WHERE user_id = ? ORDER BY updated_at DESC", (user_id,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def get_conversation_messages(conversation_id: str) -> List[Dict]:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT role, content, meta_json, timestamp FROM messages WHERE conversation_id = ? ORDER BY id ASC", (conversation_id,))
-    rows = c.fetchall()
-    conn.close()
-    
-    messages = []
-    for r in rows:
-        msg = {
-            "role": r[0],
-            "content": r[1],
-            "timestamp": str(r[3])
-        }
-        if r[2]:
-            try:
-                meta = json.loads(r[2])
-                msg.update(meta)
-            except: pass
-        messages.append(msg)
-    return messages
+    with get_connection() as conn, conn:
+        # Ensure raw content is saved, meta handles images/files references
+        conn.execute(SQL_INSERT_MESSAGE, (conversation_id, role, content, json.dumps(meta), now))
+        # Update conversation timestamp
+        conn.execute(SQL_TOUCH_CONVERSATION, (now, conversation_id))
+
+def save_batch(conversations: List[Tuple] = (), messages: List[Tuple] = (), deletes: List[str] = ()):
+    """
+    Persist queued writes in a single transaction.
+
+    ``conversations`` are (id, user_id, title, timestamp) tuples and
+    ``messages`` are (conversation_id, role, content, meta, timestamp)
+    tuples; timestamps are taken by the caller when the write was issued.
+    Each touched conversation gets one updated_at bump with its latest time.
+    ``deletes`` are conversation ids removed before anything is inserted.
+    """
+    touched: Dict[str, datetime] = {}
+    for conversation_id, _, _, ts in conversations:
+        touched[conversation_id] = max(ts, touched.get(conversation_id, ts))
+    for conversation_id, _, _, _, ts in messages:
+        touched[conversation_id] = max(ts, touched.get(conversation_id, ts))
+
+    with get_connection() as conn, conn:
+        # Take the write lock up front so concurrent batches wait on busy_timeout;
+        # a deferred transaction that has already read fails at once instead
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        for cid in deletes:
+            for statement in (SQL_DELETE_CONVERSATION, SQL_DELETE_CONVERSATION_MESSAGES,
+                              SQL_DELETE_CONVERSATION_SUMMARY):
+                conn.execute(statement, (cid,))
+        conn.executemany(SQL_INSERT_CONVERSATION,
+                         [(cid, user_id, title, ts, ts) for cid, user_id, title, ts in conversations])
+        conn.executemany(SQL_INSERT_MESSAGE,
+                         [(cid, role, content, json.dumps(meta or {}), ts)
+                          for cid, role, content, meta, ts in messages])
+        conn.executemany(SQL_TOUCH_CONVERSATION, [(ts, cid) for cid, ts in touched.items()])
+
+def get_user_conversations(user_id: str, limit: Optional[int] = None) -> List[Tuple]:
+    """Returns list of (id, title, updated_at), most recently updated first"""
+    with get_connection() as conn:
+        if limit is None:
+            return conn.execute(SQL_SELECT_USER_CONVERSATIONS, (user_id,)).fetchall()
+        return conn.execute(SQL_SELECT_USER_CONVERSATIONS_PAGE, (user_id, limit)).fetchall()
+
+def _row_to_message(r) -> Dict:
+    msg = {
+        "role": r[0],
+        "content": r[1],
+        "timestamp": str(r[3])
+    }
+    if r[2]:
+        try:
+            meta = json.loads(r[2])
+            msg.update(meta)
+        except: pass
+    return msg
+
+def get_conversation_messages(conversation_id: str, limit: Optional[int] = None,
+                              offset: int = 0, before_id: Optional[int] = None) -> List[Dict]:
+    """
+    Messages of a conversation in chronological order.
+
+    Without ``limit`` the whole conversation is returned. With ``limit`` the
+    newest page is returned (still oldest-to-newest); pass ``before_id`` to
+    page further back by keyset, or ``offset`` to skip pages from the end.
+    """
+    if limit is None and before_id is None and not offset:
+        with get_connection() as conn:
+            rows = conn.execute(SQL_SELECT_MESSAGES, (conversation_id,)).fetchall()
+        return [_row_to_message(r) for r in rows]
+    return get_conversation_page(conversation_id, limit, before_id, offset)[0]
+
+def get_message_range(conversation_id: str, start: int, count: int) -> List[Dict]:
+    """``count`` messages from chronological position ``start`` (0 = first message)."""
+    with get_connection() as conn:
+        rows = conn.execute(SQL_SELECT_MESSAGES_RANGE, (conversation_id, count, start)).fetchall()
+    return [_row_to_message(r) for r in rows]
+
+def count_conversation_messages(conversation_id: str) -> int:
+    with get_connection() as conn:
+        return conn.execute(SQL_COUNT_MESSAGES, (conversation_id,)).fetchone()[0]
+
+def get_conversation_summary(conversation_id: str) -> Tuple[str, int]:
+    """Rolling summary of a conversation and how many of its first messages it covers."""
+    with get_connection() as conn:
+        row = conn.execute(SQL_SELECT_SUMMARY, (conversation_id,)).fetchone()
+    return (row[0] or "", row[1] or 0) if row else ("", 0)
+
+def save_conversation_summary(conversation_id: str, summary: str, covered_count: int):
+    with get_connection() as conn, conn:
+        conn.execute(SQL_UPSERT_SUMMARY, (conversation_id, summary, covered_count, datetime.now()))
+
+def get_conversation_page(conversation_id: str, limit: Optional[int] = HISTORY_PAGE_SIZE,
+                          before_id: Optional[int] = None, offset: int = 0) -> Tuple[List[Dict], Optional[int]]:
+    """
+    Keyset-paginated history read.
+
+    Returns (messages, next_before_id). ``messages`` are in chronological
+    order; ``next_before_id`` is the cursor for the next older page, or None
+    when the start of the conversation has been reached.
+    """
+    page_size = -1 if limit is None else limit  # LIMIT -1 means "no limit" in SQLite
+    with get_connection() as conn:
+        if before_id is None:
+            rows = conn.execute(SQL_SELECT_MESSAGES_PAGE, (conversation_id, page_size, offset)).fetchall()
+        else:
+            rows = conn.execute(SQL_SELECT_MESSAGES_PAGE_BEFORE,
+                                (conversation_id, before_id, page_size, offset)).fetchall()
+    rows.reverse()
+    messages = [_row_to_message(r[1:]) for r in rows]
+    next_before_id = rows[0][0] if rows and limit is not None and len(rows) == limit else None
+    return messages, next_before_id
+
+def _fts_query(query: str) -> str:
+    """Turn free text into a safe FTS5 query: every term required, last one as a prefix."""
+    terms = re.findall(r"\w+", query, flags=re.UNICODE)
+    if not terms:
+        return ""
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _like_snippet(content: str, query: str, mark: Tuple[str, str], width: int = 80) -> str:
+    pos = content.lower().find(query.lower())
+    if pos < 0:
+        return content[:width]
+    start = max(0, pos - width // 2)
+    end = min(len(content), pos + len(query) + width // 2)
+    hit = content[pos:pos + len(query)]
+    snippet = content[start:pos] + mark[0] + hit + mark[1] + content[pos + len(query):end]
+    return ("…" if start else "") + snippet + ("…" if end < len(content) else "")
+
+def search_messages(user_id: str, query: str, limit: int = 20,
+                    highlight: Tuple[str, str] = ("**", "**")) -> List[Dict]:
+    """
+    Ranked full-text search across a user's conversations.
+
+    Returns dicts with message_id, conversation_id, title, role, snippet
+    (matches wrapped in ``highlight``), timestamp and score (lower is better).
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return []
+
+    with get_connection() as conn:
+        try:
+            rows = conn.execute(SQL_SEARCH_MESSAGES,
+                                (highlight[0], highlight[1], fts_query, user_id, limit)).fetchall()
+            return [
+                {"message_id": r[0], "conversation_id": r[1], "title": r[2], "role": r[3],
+                 "snippet": r[4], "timestamp": str(r[5]), "score": r[6]}
+                for r in rows
+            ]
+        except sqlite3.OperationalError as e:
+            # No FTS5 in this SQLite build: slower substring scan
+            logger.debug(f"FTS search unavailable, using LIKE fallback: {e}")
+            pattern = "%" + re.sub(r"([%_\\])", r"\\\1", query) + "%"
+            rows = conn.execute(SQL_SEARCH_MESSAGES_LIKE, (user_id, pattern, limit)).fetchall()
+    return [
+        {"message_id": r[0], "conversation_id": r[1], "title": r[2], "role": r[3],
+         "snippet": _like_snippet(r[4] or "", query, highlight), "timestamp": str(r[5]), "score": 0.0}
+        for r in rows
+    ]
 
 def delete_conversation(conversation_id: str):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
-    c.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn, conn:
+        conn.execute(SQL_DELETE_CONVERSATION, (conversation_id,))
+        conn.execute(SQL_DELETE_CONVERSATION_MESSAGES, (conversation_id,))
+        conn.execute(SQL_DELETE_CONVERSATION_SUMMARY, (conversation_id,))
 
 def update_conversation_title(conversation_id: str, title: str):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn, conn:
+        conn.execute(SQL_UPDATE_TITLE, (title, conversation_id))
 
 def save_feedback(user_id: str, category: str, rating: int, comment: str) -> bool:
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
         now = datetime.now()
-        c.execute("INSERT INTO feedback (user_id, category, rating, comment, timestamp) VALUES (?, ?, ?, ?, ?)",
-                  (user_id, category, rating, comment, now))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn, conn:
+            conn.execute(SQL_INSERT_FEEDBACK, (user_id, category, rating, comment, now))
         return True
     except Exception as e:
         logger.error(f"Error saving feedback: {e}")
@@ -6,9 +6,11 @@ Provides real-time web search capabilities for the chat interface
 import logging
 from typing import Dict, List, Optional
 
-import requests
 from duckduckgo_search import DDGS
 
+from page_fetch import attach_page_excerpts, get_page_fetcher
+from search_cache import cached_search
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,7 +31,7 @@ class InternetSearchEngine:
         Args:
             query: Search query string
             max_results: Maximum number of results to return
-            detailed: Whether to fetch full text (unused in basic text search)
+            detailed: Whether to fetch page excerpts for the results (concurrently)
             time_range: Time filter (Anytime, Past Day, Past Week, Past Month)
             domain: Optional domain to restrict search to
         """
@@ -52,7 +54,11 @@ class InternetSearchEngine:
 
             # Using backend='api' or 'html' is standard, typically 'api' is default.
             # timelimit argument expects 'd', 'w', 'm', 'y'
-            results = self.ddgs.text(final_query, max_results=max_results, timelimit=time_param)
+            results = cached_search(
+                query,
+                lambda: list(self.ddgs.text(final_query, max_results=max_results, timelimit=time_param) or []),
+                mode="web", time_range=time_range, domain=domain, max_results=max_results
+            )
 
             if not results:
                 logger.warning(f"No results found for: {final_query}")
@@ -67,6 +73,9 @@ class InternetSearchEngine:
                     'source': self._extract_domain(result.get('href', ''))
                 })
 
+            if detailed:
+                attach_page_excerpts(processed_results, max_pages=max_results, timeout=self.timeout)
+
             logger.info(f"Found {len(processed_results)} results")
             return processed_results
 
@@ -74,20 +83,25 @@ class InternetSearchEngine:
             logger.error(f"Search error: {str(e)}")
             return []
 
-    def search_news(self, query: str, max_results: int = 5) -> List[Dict]:
+    def search_news(self, query: str, max_results: int = 5, detailed: bool = False) -> List[Dict]:
         """
         Search for news articles
 
         Args:
             query: News search query
             max_results: Maximum number of news results
+            detailed: Whether to fetch article excerpts (concurrently)
 
         Returns:
             List of news result dictionaries
         """
         try:
             logger.info(f"Searching news for: {query}")
-            results = self.ddgs.news(query, max_results=max_results)
+            results = cached_search(
+                query,
+                lambda: list(self.ddgs.news(query, max_results=max_results) or []),
+                mode="news", max_results=max_results
+            )
 
             if not results:
                 return []
@@ -102,6 +116,9 @@ class InternetSearchEngine:
                     'href': result.get('href', '')
                 })
 
+            if detailed:
+                attach_page_excerpts(processed_results, max_pages=max_results, timeout=self.timeout)
+
             return processed_results
 
         except Exception as e:
@@ -121,7 +138,11 @@ class InternetSearchEngine:
         """
         try:
             logger.info(f"Searching images for: {query}")
-            results = self.ddgs.images(query, max_results=max_results)
+            results = cached_search(
+                query,
+                lambda: list(self.ddgs.images(query, max_results=max_results) or []),
+                mode="images", max_results=max_results
+            )
 
             if not results:
                 return []
@@ -152,40 +173,9 @@ class InternetSearchEngine:
         Returns:
             Extracted text content or None if fetch fails
         """
-        try:
-            logger.info(f"Fetching content from: {url}")
-            response = requests.get(url, timeout=self.timeout)
-            response.raise_for_status()
-
-            # Simple HTML text extraction
-            from html.parser import HTMLParser
-
-            class TextExtractor(HTMLParser):
-                def __init__(self):
-                    super().__init__()
-                    self.text = []
-                    self.skip_tags = {'script', 'style', 'meta', 'link'}
-                    self.current_tag = None
-
-                def handle_starttag(self, tag, attrs):
-                    self.current_tag = tag
-
-                def handle_data(self, data):
-                    if self.current_tag not in self.skip_tags:
-                        text = data.strip()
-                        if text:
-                            self.text.append(text)
-
-            parser = TextExtractor()
-            parser.feed(response.text)
-            content = ' '.join(parser.text)[:max_length]
-
-            logger.info(f"Successfully fetched {len(content)} characters from {url}")
-            return content
-
-        except Exception as e:
-            logger.error(f"Content fetch error: {str(e)}")
-            return None
+        # Streams the body through the shared fetcher and stops parsing at max_length
+        logger.info(f"Fetching content from: {url}")
+        return get_page_fetcher().fetch_text(url, max_chars=max_length, timeout=self.timeout)
 
     @staticmethod
     def _extract_domain(url: str) -> str:
@@ -259,6 +249,8 @@ def create_search_context(search_results: List[Dict], query: str) -> str:
         context += f"Title: {result.get('title', 'N/A')}\n"
         context += f"Source: {result.get('source', 'N/A')}\n"
         context += f"Content: {result.get('body', result.get('content', 'N/A'))}\n"
+        if result.get('body') and result.get('content'):
+            context += f"Page excerpt: {result['content']}\n"
         context += f"URL: {result.get('href', result.get('url', 'N/A'))}\n"
 
     context += "=" * 50 + "\n"
@@ -6,6 +6,7 @@ from typing import Any, Dict
 import pandas as pd
 import streamlit as st
 
+from brain import DEFAULT_DEADLINE, DEFAULT_PROVIDER_TIMEOUT
 from brain_learning import LearningBrain
 from multimodal_voice_integration import MultimodalVoiceIntegrator
 from ui.chat_utils import serialize_messages
@@ -89,7 +90,7 @@ def render_sidebar():
 
         # --- CHAT HISTORY ---
         try:
-            from ui.database import get_user_conversations, create_new_conversation, get_conversation_messages
+            from ui.database import get_user_conversations, create_new_conversation, get_conversation_page, search_messages
 
             c_hist1, c_hist2 = st.columns([0.2, 0.8])
             with c_hist1:
@@ -102,9 +103,46 @@ def render_sidebar():
                      # BUT to support "switching", we just clear the ID so a new one is made on first send.
                      if 'conversation_id' in st.session_state:
                         del st.session_state['conversation_id']
+                     st.session_state.history_before_id = None
                      st.rerun()
 
-            conversations = get_user_conversations(username)
+            # Reads that must see this session's latest turn first wait for its
+            # conversation's queued writes; plain renders never block on SQLite
+            from ui.write_behind import get_write_behind
+
+            def _settle(conversation_id):
+                if conversation_id:
+                    get_write_behind().flush_conversation(conversation_id, timeout=2.0)
+
+            # Full-text search across every past conversation
+            history_query = st.text_input(
+                "Search chats",
+                key="history_search_query",
+                placeholder="🔎 Search all chats...",
+                label_visibility="collapsed",
+            )
+            if history_query:
+                _settle(st.session_state.get("conversation_id"))
+                hits = search_messages(username, history_query, limit=10)
+                if not hits:
+                    st.caption("No matching messages")
+                for hit in hits:
+                    if st.button(
+                        f"{hit['title']}",
+                        key=f"search_hit_{hit['message_id']}",
+                        use_container_width=True,
+                    ):
+                        st.session_state.conversation_id = hit["conversation_id"]
+                        _settle(hit["conversation_id"])
+                        (
+                            st.session_state.messages,
+                            st.session_state.history_before_id,
+                        ) = get_conversation_page(hit["conversation_id"])
+                        st.rerun()
+                    st.caption(f"{hit['role']}: {hit['snippet']}")
+
+            # Only the 15 most recent are ever shown (5 + "Older Chats")
+            conversations = get_user_conversations(username, limit=15)
             if conversations:
                 # Show most recent first
                 for c_id, c_title, c_date in conversations[:5]:
@@ -121,7 +159,11 @@ def render_sidebar():
                         type=type_,
                     ):
                         st.session_state.conversation_id = c_id
-                        st.session_state.messages = get_conversation_messages(c_id)
+                        _settle(c_id)
+                        (
+                            st.session_state.messages,
+                            st.session_state.history_before_id,
+                        ) = get_conversation_page(c_id)
                         st.rerun()
 
 
@@ -134,9 +176,11 @@ def render_sidebar():
                                 use_container_width=True,
                             ):
                                 st.session_state.conversation_id = c_id
-                                st.session_state.messages = get_conversation_messages(
-                                    c_id
-                                )
+                                _settle(c_id)
+                                (
+                                    st.session_state.messages,
+                                    st.session_state.history_before_id,
+                                ) = get_conversation_page(c_id)
                                 st.rerun()
 
 
@@ -309,6 +353,11 @@ def render_sidebar():
             st.session_state.enable_streaming = st.checkbox(
                 "Enable Streaming", value=st.session_state.get("enable_streaming", True)
             )
+            st.session_state.response_cache_enabled = st.checkbox(
+                "Reuse identical responses", value=st.session_state.get("response_cache_enabled", False),
+                help="Replay the stored answer when the exact same request is sent again. "
+                     "Best with temperature 0; applies to Brain Mode models too.",
+            )
             st.session_state.system_instruction = st.text_area(
                 "System Prompt",
                 value=st.session_state.get("system_instruction", ""),
@@ -357,6 +406,25 @@ def render_sidebar():
                     "together": together,
                 }
 
+                st.caption("Response SLA:")
+                st.session_state.brain_deadline = st.slider(
+                    "Deadline (s)", 5, 120, int(st.session_state.get("brain_deadline", DEFAULT_DEADLINE)),
+                    help="Synthesize with whatever has arrived by then; slower models are marked late.",
+                )
+                st.session_state.brain_provider_timeout = st.slider(
+                    "Per-model timeout (s)", 5, 120,
+                    int(st.session_state.get("brain_provider_timeout", DEFAULT_PROVIDER_TIMEOUT)),
+                )
+                st.session_state.brain_quorum = st.number_input(
+                    "Quorum (0 = wait for all)", min_value=0, max_value=6,
+                    value=int(st.session_state.get("brain_quorum", 0)),
+                    help="Synthesize as soon as this many models have answered.",
+                )
+                st.session_state.brain_hedging = st.checkbox(
+                    "Hedge slow providers", value=st.session_state.get("brain_hedging", False),
+                    help="Send a duplicate request to providers with a high p95 latency.",
+                )
+
         st.divider()
 
         # 7. Multimodal
@@ -0,0 +1,166 @@
+"""
+Rolling summary memory for long conversations.
+
+Messages that fall out of the model's context window are folded into a
+compact running summary stored per conversation in the database. The
+summary is only extended when new messages drop out of the window, on a
+background worker, and every later turn reuses it instead of rebuilding
+one from scratch. Updates lag by at most one turn.
+"""
+
+import logging
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ui import database
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADER = "[Earlier conversation summary]"
+MAX_SUMMARY_CHARS = 4000
+LINE_CHARS = 240  # digest length for a newly folded message
+SHORT_LINE_CHARS = 100  # older digests are shortened to this before being merged away
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+Summarizer = Callable[[str, List[Dict]], str]
+
+
+def digest_message(message: Dict, max_chars: int = LINE_CHARS) -> str:
+    """One line per message: role plus its leading sentences."""
+    text = " ".join(str(message.get("content", "")).split())
+    line = ""
+    for sentence in _SENTENCE_RE.split(text):
+        candidate = f"{line} {sentence}".strip()
+        if len(candidate) > max_chars:
+            break
+        line = candidate
+    if not line:
+        line = text[:max_chars - 1] + "…" if len(text) > max_chars else text
+    return f"{message.get('role', 'unknown').upper()}: {line}"
+
+
+def _shorten(line: str, max_chars: int) -> str:
+    return line if len(line) <= max_chars else line[:max_chars - 1] + "…"
+
+
+def compact_lines(lines: List[str], max_chars: int = MAX_SUMMARY_CHARS) -> List[str]:
+    """Fit digest lines into ``max_chars``, oldest first.
+
+    The opening line is kept (it usually states what the conversation is
+    about); the lines after it are shortened, and then dropped, from the
+    oldest forward until the summary fits.
+    """
+    lines = list(lines)
+
+    def size() -> int:
+        return sum(len(line) + 1 for line in lines)
+
+    index = 1
+    while size() > max_chars and index < len(lines) - 1:
+        lines[index] = _shorten(lines[index], SHORT_LINE_CHARS)
+        index += 1
+    while size() > max_chars and len(lines) > 2:
+        del lines[1]
+    return lines
+
+
+def fold_summary(summary: str, messages: List[Dict], max_chars: int = MAX_SUMMARY_CHARS) -> str:
+    """Extend ``summary`` with digests of ``messages``; the default summarizer."""
+    lines = summary.splitlines() if summary else []
+    lines.extend(digest_message(m) for m in messages if m.get("content"))
+    return "\n".join(compact_lines(lines, max_chars))
+
+
+def summary_message(summary: str) -> Dict:
+    return {"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"}
+
+
+class SummaryMemory:
+    """Per-conversation rolling summaries, updated on a single background worker."""
+
+    def __init__(self, summarizer: Optional[Summarizer] = None):
+        self.summarizer = summarizer or fold_summary
+        self._cache: Dict[str, Tuple[str, int]] = {}
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # One worker: updates to the same conversation must not interleave
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary-memory")
+        self._stats = {"updates": 0, "folded_messages": 0, "coalesced": 0, "errors": 0}
+
+    def get(self, conversation_id: str) -> Tuple[str, int]:
+        """(summary, number of leading messages it covers) for a conversation."""
+        with self._lock:
+            cached = self._cache.get(conversation_id)
+        if cached is not None:
+            return cached
+        try:
+            cached = database.get_conversation_summary(conversation_id)
+        except Exception as e:
+            logger.error(f"Summary read failed for {conversation_id}: {e}")
+            return "", 0
+        with self._lock:
+            self._cache.setdefault(conversation_id, cached)
+        return cached
+
+    def schedule(self, conversation_id: str, keep_last: int) -> Optional[Future]:
+        """Fold every stored message except the newest ``keep_last`` into the summary.
+
+        Returns the queued update, or None when one is already queued for
+        the conversation (it picks up the newer ``keep_last``).
+        """
+        with self._lock:
+            if conversation_id in self._pending:
+                self._pending[conversation_id] = keep_last
+                self._stats["coalesced"] += 1
+                return None
+            self._pending[conversation_id] = keep_last
+        return self._executor.submit(self._update, conversation_id)
+
+    def _update(self, conversation_id: str) -> int:
+        with self._lock:
+            keep_last = self._pending.pop(conversation_id)
+        try:
+            summary, covered = self.get(conversation_id)
+            # Messages still queued in the write-behind writer are not counted,
+            # so they are never folded before they have left the window
+            end = database.count_conversation_messages(conversation_id) - keep_last
+            if end <= covered:
+                return 0
+            messages = database.get_message_range(conversation_id, covered, end - covered)
+            summary = self.summarizer(summary, messages)
+            database.save_conversation_summary(conversation_id, summary, covered + len(messages))
+            with self._lock:
+                self._cache[conversation_id] = (summary, covered + len(messages))
+                self._stats["updates"] += 1
+                self._stats["folded_messages"] += len(messages)
+            return len(messages)
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            logger.error(f"Summary update failed for {conversation_id}: {e}")
+            return 0
+
+    def forget(self, conversation_id: str):
+        with self._lock:
+            self._cache.pop(conversation_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, cached=len(self._cache), pending=len(self._pending))
+
+
+_memory: Optional[SummaryMemory] = None
+_memory_lock = threading.Lock()
+
+
+def get_summary_memory() -> SummaryMemory:
+    """Process-wide summary memory shared by every chat session."""
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = SummaryMemory()
+    return _memory
@@ -0,0 +1,354 @@
+"""
+Per-model context window budgeting.
+
+Counts tokens with the model's real tokenizer where one is installed
+(tiktoken for OpenAI-family models) and with a per-provider calibrated
+estimator otherwise. Counts are cached per message text, so a long chat
+history is only tokenized once. ``pack_context`` fits the system
+instruction, conversation history, search context and attachments into
+the model's window in that priority order, leaving room for the reply.
+"""
+
+import hashlib
+import logging
+import math
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    tiktoken = None
+
+from ui.config import MODEL_DETAILS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_WINDOW = 32_000
+DEFAULT_RESERVE_OUTPUT = 2048
+# Chat formats wrap every message in a few control tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+# Estimated counts can undershoot; keep this share of the window free
+ESTIMATE_SAFETY_MARGIN = 0.10
+MAX_CACHED_COUNTS = 8192
+TRUNCATION_MARKER = "\n[...truncated to fit the context window]"
+
+# Average characters per token of ASCII text, measured per provider family
+# on mixed English prose and code; non-ASCII text is much denser.
+CHARS_PER_TOKEN = {
+    "openai": 4.0,
+    "anthropic": 3.5,
+    "google": 4.0,
+    "together": 3.8,
+    "groq": 3.8,
+    "xai": 3.9,
+    "deepseek": 3.6,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.6
+NON_ASCII_CHARS_PER_TOKEN = 1.3
+
+# tiktoken encodings for OpenAI-family model name prefixes, most specific first
+TIKTOKEN_ENCODINGS = (
+    ("gpt-4o", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+)
+
+SEARCH_HEADER = "\n\n[SUPPLEMENTED WITH REAL-TIME WEB SEARCH RESULTS]:\n"
+SEARCH_FOOTER = "\n\nPlease use the above search results to provide a current and accurate answer."
+
+_NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+_CONTEXT_RE = re.compile(r"^\s*([\d.]+)\s*([kKmM]?)\s*$")
+
+
+def parse_context_window(value) -> Optional[int]:
+    """Token count for MODEL_DETAILS-style sizes such as "128k" or "1M"."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _CONTEXT_RE.match(str(value or ""))
+    if not match:
+        return None
+    number, unit = float(match.group(1)), match.group(2).lower()
+    return int(number * {"": 1, "k": 1_000, "m": 1_000_000}[unit])
+
+
+def context_window(model: Optional[str]) -> int:
+    details = MODEL_DETAILS.get(model or "", {})
+    return parse_context_window(details.get("context")) or DEFAULT_CONTEXT_WINDOW
+
+
+def model_provider(model: Optional[str]) -> Optional[str]:
+    return MODEL_DETAILS.get(model or "", {}).get("provider")
+
+
+class TokenCounter:
+    """Token counts for one tokenizer, cached by a digest of the text."""
+
+    def __init__(self, name: str, encoding=None, chars_per_token: float = DEFAULT_CHARS_PER_TOKEN):
+        self.name = name
+        self.encoding = encoding
+        self.chars_per_token = chars_per_token
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    def _tokenize_count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        non_ascii = len(_NON_ASCII_RE.findall(text))
+        ascii_chars = len(text) - non_ascii
+        return math.ceil(ascii_chars / self.chars_per_token + non_ascii / NON_ASCII_CHARS_PER_TOKEN)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        # Keyed by digest so the cache never pins large attachment texts in memory
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+        tokens = self._tokenize_count(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = tokens
+            while len(self._cache) > MAX_CACHED_COUNTS:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_message(self, message: Dict) -> int:
+        return self.count(str(message.get("content", ""))) + MESSAGE_OVERHEAD_TOKENS
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of ``text`` that fits ``max_tokens``, with a marker when cut."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        budget = max_tokens - self.count(TRUNCATION_MARKER)
+        if budget <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return self.encoding.decode(tokens[:budget]) + TRUNCATION_MARKER
+        # Estimator: binary search on the character cut
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self._tokenize_count(text[:mid]) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low] + TRUNCATION_MARKER
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def _tiktoken_encoding_name(model: str) -> Optional[str]:
+    for prefix, encoding_name in TIKTOKEN_ENCODINGS:
+        if model.startswith(prefix):
+            return encoding_name
+    return None
+
+
+def get_token_counter(model: Optional[str] = None, provider: Optional[str] = None) -> TokenCounter:
+    """Shared counter for a model: its real tokenizer when installed, else a calibrated estimate."""
+    provider = provider or model_provider(model) or ""
+    encoding_name = _tiktoken_encoding_name(model or "") if tiktoken is not None else None
+    name = f"tiktoken:{encoding_name}" if encoding_name else f"estimate:{provider or 'default'}"
+    counter = _counters.get(name)
+    if counter is None:
+        with _counters_lock:
+            counter = _counters.get(name)
+            if counter is None:
+                encoding = None
+                if encoding_name:
+                    try:
+                        encoding = tiktoken.get_encoding(encoding_name)
+                    except Exception as e:
+                        # Encodings are downloaded on first use; offline hosts fall back to the estimate
+                        logger.info(f"tiktoken {encoding_name} unavailable, estimating instead: {e}")
+                counter = TokenCounter(
+                    name, encoding, CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+                )
+                _counters[name] = counter
+    return counter
+
+
+def count_tokens(text: str, model: Optional[str] = None, provider: Optional[str] = None) -> int:
+    return get_token_counter(model, provider).count(text)
+
+
+def pack_history(messages: Sequence[Dict], max_tokens: int,
+                 counter: TokenCounter) -> Tuple[List[Dict], List[Dict], int]:
+    """Newest messages that fit ``max_tokens``: returns (kept, dropped, tokens used).
+
+    Messages are kept whole and in order; everything older than the first
+    message that does not fit is dropped.
+    """
+    kept: List[Dict] = []
+    used = 0
+    for index in range(len(messages) - 1, -1, -1):
+        tokens = counter.count_message(messages[index])
+        if used + tokens > max_tokens:
+            return kept[::-1], list(messages[:index + 1]), used
+        kept.append(messages[index])
+        used += tokens
+    return kept[::-1], [], used
+
+
+def compose_prompt(prompt: str, search_context: str = "",
+                   attachments: Iterable[Tuple[str, str]] = ()) -> str:
+    """The user turn: question, labelled attachment sections, then web search context."""
+    body = prompt
+    for label, text in attachments:
+        if text:
+            body += f"\n\n{label}:\n{text}"
+    if search_context:
+        body = f"{body}{SEARCH_HEADER}{search_context}{SEARCH_FOOTER}"
+    return body
+
+
+@dataclass
+class PackedContext:
+    system_instruction: str
+    history: List[Dict]
+    prompt: str
+    window: int
+    tokens: Dict[str, int] = field(default_factory=dict)
+    # The same content split for cache-friendly layouts: attachments that fit,
+    # and the volatile turn (question plus search context)
+    attachments: List[Tuple[str, str]] = field(default_factory=list)
+    turn: str = ""
+    dropped_messages: int = 0
+    summarized: bool = False
+    truncated: List[str] = field(default_factory=list)
+    exact: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+    def describe(self) -> str:
+        parts = [f"{name} {count}" for name, count in self.tokens.items() if count]
+        summary = f"{self.total_tokens}/{self.window} tokens ({', '.join(parts)})"
+        if self.dropped_messages:
+            summary += f", {self.dropped_messages} older messages dropped"
+            if self.summarized:
+                summary += " (summarized)"
+        if self.truncated:
+            summary += f", truncated: {', '.join(self.truncated)}"
+        return summary + ("" if self.exact else " [estimated]")
+
+
+def pack_context(
+    model: Optional[str],
+    prompt: str,
+    system_instruction: str = "",
+    history: Sequence[Dict] = (),
+    search_context: str = "",
+    attachments: Sequence[Tuple[str, str]] = (),
+    reserve_output: int = DEFAULT_RESERVE_OUTPUT,
+    provider: Optional[str] = None,
+    window: Optional[int] = None,
+    summary: Optional[Dict] = None,
+) -> PackedContext:
+    """Fit a turn into ``model``'s context window.
+
+    The question itself always goes in. The remaining space is handed out
+    in priority order: system instruction, conversation history (newest
+    first), search context, then attachments in the order given. A section
+    that does not fit whole is truncated; history drops its oldest messages.
+    ``summary`` is a message standing in for older turns; its room is set
+    aside before history and it leads the history only if messages were dropped.
+    """
+    counter = get_token_counter(model, provider)
+    window = window or context_window(model)
+    available = window - reserve_output - REPLY_PRIMING_TOKENS
+    if not counter.exact:
+        available -= int(window * ESTIMATE_SAFETY_MARGIN)
+    truncated: List[str] = []
+
+    prompt_tokens = counter.count(prompt) + MESSAGE_OVERHEAD_TOKENS
+    remaining = max(0, available - prompt_tokens)
+
+    system_tokens = 0
+    if system_instruction:
+        system_tokens = counter.count(system_instruction) + MESSAGE_OVERHEAD_TOKENS
+        if system_tokens > remaining:
+            system_instruction = counter.truncate(system_instruction, remaining - MESSAGE_OVERHEAD_TOKENS)
+            system_tokens = counter.count(system_instruction) + MESSAGE_OVERHEAD_TOKENS if system_instruction else 0
+            truncated.append("system")
+        remaining -= system_tokens
+
+    formatted = [{"role": m["role"], "content": m["content"]} for m in history if "role" in m and "content" in m]
+    summary_tokens = counter.count_message(summary) if summary else 0
+    if summary_tokens > remaining:
+        summary, summary_tokens = None, 0
+    kept, dropped, history_tokens = pack_history(formatted, remaining - summary_tokens, counter)
+    if summary and dropped:
+        kept = [summary] + kept
+        history_tokens += summary_tokens
+    else:
+        summary = None
+    remaining -= history_tokens
+
+    sections: List[Tuple[str, str]] = []
+    tokens = {"system": system_tokens, "history": history_tokens, "prompt": prompt_tokens}
+    if search_context:
+        remaining -= counter.count(SEARCH_HEADER) + counter.count(SEARCH_FOOTER)
+        search_tokens = counter.count(search_context)
+        if search_tokens > remaining:
+            search_context = counter.truncate(search_context, remaining)
+            search_tokens = counter.count(search_context)
+            truncated.append("search")
+        remaining -= search_tokens
+        tokens["search"] = search_tokens
+    for label, text in attachments:
+        if not text:
+            continue
+        # Label and separators cost a few tokens of their own
+        room = remaining - counter.count(label) - 2
+        section_tokens = counter.count(text)
+        if section_tokens > room:
+            text = counter.truncate(text, room)
+            truncated.append(label)
+            if not text:
+                continue
+            section_tokens = counter.count(text)
+        remaining -= section_tokens + counter.count(label) + 2
+        tokens[label] = tokens.get(label, 0) + section_tokens
+        sections.append((label, text))
+
+    return PackedContext(
+        system_instruction=system_instruction,
+        history=kept,
+        prompt=compose_prompt(prompt, search_context, sections),
+        window=window,
+        tokens=tokens,
+        attachments=sections,
+        turn=compose_prompt(prompt, search_context),
+        dropped_messages=len(dropped),
+        summarized=summary is not None,
+        truncated=truncated,
+        exact=counter.exact,
+    )
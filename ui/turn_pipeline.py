@@ -0,0 +1,156 @@
+"""
+Turn pre-processing pipeline.
+
+The work a chat turn does before calling a provider (image captioning,
+internet search, document extraction, Brain Mode grounding) is made of
+independent stages. They run concurrently on a shared worker pool, each
+under its own timeout, so the turn waits for the slowest stage instead of
+the sum of all of them. Per-stage timings are kept for display and logs.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_STAGE_WORKERS = 8
+DEFAULT_STAGE_TIMEOUT = 20.0  # seconds
+# Per-stage budgets; stages not listed use DEFAULT_STAGE_TIMEOUT
+STAGE_TIMEOUTS = {
+    "captions": 30.0,
+    "search": 15.0,
+    "brain_context": 15.0,
+    "recall": 5.0,
+    "document": 90.0,
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_STAGE_WORKERS, thread_name_prefix="turn-stage")
+    return _executor
+
+
+@dataclass
+class StageResult:
+    name: str
+    value: Any = None
+    error: Optional[str] = None
+    timed_out: bool = False
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.timed_out
+
+
+@dataclass
+class _Stage:
+    name: str
+    fn: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    timeout: float
+
+
+class TurnPipeline:
+    """Run named stages concurrently; each stage is a plain callable.
+
+    Stages run on worker threads, so they must not call Streamlit UI
+    functions; the caller renders their results after ``run`` returns, or
+    their progress from a ``poll`` callback while it runs.
+    """
+
+    def __init__(self):
+        self._stages: List[_Stage] = []
+        self.results: Dict[str, StageResult] = {}
+        self.wall_seconds = 0.0
+
+    def add(self, name: str, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs):
+        if timeout is None:
+            timeout = STAGE_TIMEOUTS.get(name.split(":", 1)[0], DEFAULT_STAGE_TIMEOUT)
+        self._stages.append(_Stage(name, fn, args, kwargs, timeout))
+
+    def __len__(self) -> int:
+        return len(self._stages)
+
+    def run(self, poll: Optional[Callable[[], None]] = None, poll_interval: float = 0.25) -> Dict[str, StageResult]:
+        """Run every stage and return results by name once all finish or time out.
+
+        ``poll`` is called on the calling thread every ``poll_interval``
+        seconds while stages run, so the caller can render progress that
+        stages report through thread-safe objects.
+        """
+        start = time.perf_counter()
+        executor = _get_executor()
+        futures: Dict[Future, _Stage] = {}
+        for stage in self._stages:
+            futures[executor.submit(self._timed, stage)] = stage
+
+        pending = set(futures)
+        while pending:
+            now = time.perf_counter()
+            next_deadline = min(start + futures[f].timeout for f in pending)
+            timeout = max(0.0, next_deadline - now)
+            if poll is not None:
+                timeout = min(timeout, poll_interval)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if poll is not None:
+                try:
+                    poll()
+                except Exception as e:
+                    logger.debug(f"Pipeline poll callback failed: {e}")
+            for future in done:
+                self.results[futures[future].name] = future.result()
+            now = time.perf_counter()
+            for future in [f for f in pending if now >= start + futures[f].timeout]:
+                stage = futures[future]
+                # The worker keeps running in the background; its result is discarded
+                future.cancel()
+                pending.discard(future)
+                self.results[stage.name] = StageResult(
+                    stage.name, error=f"timed out after {stage.timeout:.0f}s",
+                    timed_out=True, seconds=now - start
+                )
+                logger.warning(f"Turn stage '{stage.name}' timed out after {stage.timeout:.0f}s")
+
+        self.wall_seconds = time.perf_counter() - start
+        logger.info(f"Turn pre-processing {self.format_timings()}")
+        return self.results
+
+    @staticmethod
+    def _timed(stage: _Stage) -> StageResult:
+        start = time.perf_counter()
+        try:
+            value = stage.fn(*stage.args, **stage.kwargs)
+            return StageResult(stage.name, value=value, seconds=time.perf_counter() - start)
+        except Exception as e:
+            logger.error(f"Turn stage '{stage.name}' failed: {e}")
+            return StageResult(stage.name, error=str(e), seconds=time.perf_counter() - start)
+
+    def value(self, name: str, default: Any = None) -> Any:
+        result = self.results.get(name)
+        return result.value if result is not None and result.ok else default
+
+    def timings(self) -> Dict[str, float]:
+        """Seconds per stage plus the pipeline wall time under ``"total"``."""
+        timings = {name: round(result.seconds, 3) for name, result in self.results.items()}
+        timings["total"] = round(self.wall_seconds, 3)
+        return timings
+
+    def format_timings(self) -> str:
+        parts = []
+        for name, result in self.results.items():
+            flag = " ⏱" if result.timed_out else (" ⚠️" if result.error else "")
+            parts.append(f"{name} {result.seconds:.2f}s{flag}")
+        return " · ".join(parts) + f" (wall {self.wall_seconds:.2f}s)"
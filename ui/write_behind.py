@@ -0,0 +1,230 @@
+"""
+Write-behind persistence for chat history.
+
+Chat turns hand their writes to a background thread instead of waiting on
+SQLite commits. Writes are grouped into one transaction per flush, which
+happens when ``flush_size`` writes are pending or ``flush_interval``
+seconds have passed, and everything still queued is flushed at exit.
+Writes issued after ``close`` go straight to disk. Conversation deletes go
+through the same queue, so writes queued before a delete cannot bring the
+conversation back.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ui import database
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 64
+FLUSH_INTERVAL = 0.25  # seconds
+MAX_FLUSH_RETRIES = 3
+
+# Queue item kinds
+_CONVERSATION = "conversation"
+_MESSAGE = "message"
+_DELETE = "delete"
+
+
+class WriteBehindWriter:
+    """Background writer that batches chat persistence into grouped transactions."""
+
+    def __init__(self, flush_size: int = FLUSH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Tuple[str, Tuple]]" = queue.Queue()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        # Makes "is the writer closed?" and "enqueue" one step, so no write
+        # can be queued after close has taken its final look at the queue
+        self._put_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._in_flight = 0
+        self._pending_by_conversation: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "flushes": 0,
+            "writes": 0,
+            "errors": 0,
+            "dropped": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+
+    # --- Producer API ---
+    def save_conversation_metadata(self, conversation_id: str, user_id: str, title: str):
+        self._put(_CONVERSATION, (conversation_id, user_id, title, datetime.now()))
+
+    def save_message(self, conversation_id: str, role: str, content: str, meta: Optional[Dict] = None):
+        self._put(_MESSAGE, (conversation_id, role, content, meta or {}, datetime.now()))
+
+    def create_new_conversation(self, user_id: str, title: str = "New Chat") -> str:
+        conversation_id = str(uuid.uuid4())
+        self.save_conversation_metadata(conversation_id, user_id, title)
+        return conversation_id
+
+    def delete_conversation(self, conversation_id: str):
+        """Delete a conversation after the writes queued before it; they are discarded, not applied."""
+        self._put(_DELETE, (conversation_id,))
+
+    def _put(self, kind: str, payload: Tuple):
+        with self._put_lock:
+            closed = self._stopping.is_set()
+            if not closed:
+                with self._idle:
+                    self._in_flight += 1
+                    self._pending_by_conversation[payload[0]] = self._pending_by_conversation.get(payload[0], 0) + 1
+                self._queue.put((kind, payload))
+        if closed:
+            # The worker is gone: write through, and let errors reach the caller
+            self._write([(kind, payload)])
+            return
+        if self._queue.qsize() >= self.flush_size:
+            self._wake.set()
+
+    # --- Consumer ---
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._flush_batch(batch)
+
+    def _take_batch(self) -> List[Tuple[str, Tuple]]:
+        batch = []
+        while len(batch) < self.flush_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush_batch(self, batch: List[Tuple[str, Tuple]]):
+        for attempt in range(1, MAX_FLUSH_RETRIES + 1):
+            try:
+                self._write(batch)
+                break
+            except Exception as e:
+                with self._stats_lock:
+                    self._stats["errors"] += 1
+                if attempt == MAX_FLUSH_RETRIES:
+                    logger.error(f"Write-behind flush failed, dropping {len(batch)} writes: {e}")
+                    with self._stats_lock:
+                        self._stats["dropped"] += len(batch)
+                else:
+                    logger.warning(f"Write-behind flush failed (attempt {attempt}): {e}")
+                    time.sleep(0.05 * 2 ** attempt)
+
+        with self._idle:
+            self._in_flight -= len(batch)
+            for _, payload in batch:
+                left = self._pending_by_conversation.get(payload[0], 0) - 1
+                if left > 0:
+                    self._pending_by_conversation[payload[0]] = left
+                else:
+                    self._pending_by_conversation.pop(payload[0], None)
+            self._idle.notify_all()
+
+    def _write(self, batch: List[Tuple[str, Tuple]]):
+        start = time.perf_counter()
+        # Position of each conversation's last delete; writes queued before it are dropped
+        deleted_at = {payload[0]: i for i, (kind, payload) in enumerate(batch) if kind == _DELETE}
+        live = [(kind, payload) for i, (kind, payload) in enumerate(batch)
+                if kind != _DELETE and i > deleted_at.get(payload[0], -1)]
+        conversations = [payload for kind, payload in live if kind == _CONVERSATION]
+        messages = [payload for kind, payload in live if kind == _MESSAGE]
+        database.save_batch(conversations, messages, deletes=list(deleted_at))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._stats_lock:
+            self._stats["flushes"] += 1
+            self._stats["writes"] += len(batch)
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms
+
+    # --- Control ---
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every write queued so far is on disk. Returns False on timeout."""
+        self._wake.set()
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight <= 0, timeout=timeout)
+
+    def flush_conversation(self, conversation_id: str, timeout: Optional[float] = None) -> bool:
+        """Block until one conversation's queued writes are on disk; returns at once when it has none.
+
+        Cheaper than ``flush`` for a read of a single conversation: other
+        sessions' writes are not waited for beyond the batch they share.
+        """
+        def settled() -> bool:
+            return not self._pending_by_conversation.get(conversation_id)
+
+        with self._idle:
+            if settled():
+                return True
+        self._wake.set()
+        with self._idle:
+            return self._idle.wait_for(settled, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Stop the writer thread after flushing everything still queued."""
+        with self._put_lock:
+            if self._stopping.is_set():
+                return
+            self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        # Anything that slipped in while the thread was finishing up
+        self._drain()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and flush latency metrics."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._idle:
+            stats["pending"] = self._in_flight
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_flush_ms"] = (stats["total_flush_ms"] / stats["flushes"]) if stats["flushes"] else 0.0
+        del stats["total_flush_ms"]
+        return stats
+
+
+_writer: Optional[WriteBehindWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_write_behind() -> WriteBehindWriter:
+    """Process-wide writer, started on first use and flushed at interpreter exit."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehindWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def shutdown_write_behind():
+    """Flush and stop the process-wide writer (no-op if it was never started)."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
@@ -0,0 +1,231 @@
+"""
+Upload artifact cache
+Everything derived from an uploaded file (extracted document text, audio
+transcripts, video thumbnails) is cached by the SHA-256 of the file's
+bytes, so an attachment that stays in the uploader across turns, or is
+uploaded again under another name, is processed exactly once. Artifacts
+are JSON dicts held in a byte-bounded memory LRU over a byte-bounded
+SQLite store; concurrent requests for the same artifact share one
+extraction. Image captions have their own cache in captioning.py.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISK_PATH = "upload_cache.db"
+MAX_MEMORY_BYTES = 32 * 1024 * 1024
+MAX_DISK_BYTES = 256 * 1024 * 1024
+ARTIFACT_VERSION = 1  # bump when extraction output changes
+
+Artifact = Dict[str, Any]
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def artifact_key(kind: str, data: bytes, version: int = ARTIFACT_VERSION) -> str:
+    """Key for one kind of artifact (``pdf``, ``audio``...) of a file's content."""
+    return f"v{version}:{kind}:{content_hash(data)}"
+
+
+class _Flight:
+    """One in-progress extraction that concurrent identical requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Artifact] = None
+        self.error: Optional[BaseException] = None
+
+
+class UploadCache:
+    """Thread-safe artifact cache: byte-bounded memory LRU over a byte-bounded SQLite store."""
+
+    def __init__(self, disk_path: Optional[str] = DEFAULT_DISK_PATH, max_memory_bytes: int = MAX_MEMORY_BYTES,
+                 max_disk_bytes: int = MAX_DISK_BYTES):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, Tuple[int, Artifact]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+        if disk_path:
+            try:
+                self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self._disk.execute("PRAGMA journal_mode=WAL")
+                self._disk.execute("PRAGMA synchronous=NORMAL")
+                with self._disk:
+                    self._disk.execute(
+                        "CREATE TABLE IF NOT EXISTS upload_cache "
+                        "(key TEXT PRIMARY KEY, last_used REAL, size INTEGER, artifact_json TEXT)"
+                    )
+                    self._disk.execute("CREATE INDEX IF NOT EXISTS idx_upload_cache_last_used "
+                                       "ON upload_cache (last_used)")
+                self._disk_bytes = self._disk.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM upload_cache").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Upload cache disk tier disabled: {e}")
+                self._disk = None
+
+    # --- Lookups ---
+    def get_or_compute(self, key: str, compute: Callable[[], Artifact],
+                       cacheable: Callable[[Artifact], bool] = bool) -> Artifact:
+        """Cached artifact for ``key``, calling ``compute`` at most once per key at a time.
+
+        Results rejected by ``cacheable`` (by default, empty ones) are
+        returned but not stored, so a failed extraction is retried next time.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            artifact = self._disk_get(key)
+            if artifact is not None:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                    self._memory_put(key, artifact, len(json.dumps(artifact)))
+            else:
+                with self._lock:
+                    self._stats["misses"] += 1
+                artifact = compute()
+                if cacheable(artifact):
+                    self.put(key, artifact)
+            flight.result = artifact
+            return artifact
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def put(self, key: str, artifact: Artifact):
+        encoded = json.dumps(artifact)
+        with self._lock:
+            self._memory_put(key, artifact, len(encoded))
+        self._disk_put(key, encoded)
+
+    def _memory_put(self, key: str, artifact: Artifact, size: int):
+        if size > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[0]
+        self._memory[key] = (size, artifact)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted
+
+    def _disk_get(self, key: str) -> Optional[Artifact]:
+        if self._disk is None:
+            return None
+        try:
+            with self._disk_lock:
+                row = self._disk.execute("SELECT artifact_json FROM upload_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                with self._disk:
+                    self._disk.execute("UPDATE upload_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Upload cache disk read failed: {e}")
+            return None
+
+    def _disk_put(self, key: str, encoded: str):
+        if self._disk is None:
+            return
+        size = len(encoded.encode("utf-8"))
+        if size > self.max_disk_bytes:
+            return
+        try:
+            with self._disk_lock, self._disk:
+                old = self._disk.execute("SELECT size FROM upload_cache WHERE key = ?", (key,)).fetchone()
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO upload_cache (key, last_used, size, artifact_json) VALUES (?, ?, ?, ?)",
+                    (key, time.time(), size, encoded)
+                )
+                self._disk_bytes += size - (old[0] if old else 0)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict()
+        except sqlite3.Error as e:
+            logger.warning(f"Upload cache disk write failed: {e}")
+
+    def _evict(self):
+        """Drop least recently used rows down to 90% of the budget."""
+        target = int(self.max_disk_bytes * 0.9)
+        excess = self._disk_bytes - target
+        victims: List[Tuple[str, int]] = []
+        for key, size in self._disk.execute("SELECT key, size FROM upload_cache ORDER BY last_used ASC"):
+            if excess <= 0:
+                break
+            victims.append((key, size))
+            excess -= size
+        self._disk.executemany("DELETE FROM upload_cache WHERE key = ?", [(k,) for k, _ in victims])
+        self._disk_bytes -= sum(size for _, size in victims)
+        with self._lock:
+            self._stats["evictions"] += len(victims)
+
+    # --- Maintenance ---
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, memory_entries=len(self._memory), memory_bytes=self._memory_bytes)
+        stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self._disk is not None:
+            with self._disk_lock, self._disk:
+                self._disk.execute("DELETE FROM upload_cache")
+            self._disk_bytes = 0
+
+    def close(self):
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+
+_cache: Optional[UploadCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_upload_cache() -> UploadCache:
+    """Process-wide cache shared by every session."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UploadCache()
+    return _cache
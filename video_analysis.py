@@ -0,0 +1,420 @@
+"""
+Single-pass video analysis on the ffmpeg binary
+A video is probed once for its metadata, then each wanted frame is read
+with an input seek that lands on the nearest keyframe and decodes only
+that frame (``-noaccurate_seek -skip_frame nokey``), instead of decoding
+the whole GOP or the whole file. Optional scene-change detection runs one
+keyframe-only pass to pick the frames. Frames, thumbnails and info come
+back together from ``analyze_video``. ``transcode`` re-encodes a video to
+a quality preset, streaming ffmpeg's output into a spooled temp file.
+
+The ffmpeg binary is the one on PATH, or the one moviepy installs through
+imageio-ffmpeg; ffprobe is used when present, otherwise the metadata is
+read from ``ffmpeg -i``.
+"""
+import base64
+import contextlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRAME_SIDE = 1280  # longest side of extracted frames
+THUMBNAIL_SIZE = (320, 320)
+SCENE_THRESHOLD = 0.3  # ffmpeg scene score above which a keyframe starts a new scene
+MAX_PARALLEL_SEEKS = 4
+COMMAND_TIMEOUT = 120
+TRANSCODE_TIMEOUT = 30 * 60
+SPOOL_MAX_MEMORY = 16 * 1024 * 1024  # transcoded output beyond this goes to disk
+# Targets per quality; sources already below a target keep their own value
+QUALITY_PRESETS = {
+    "low": {"bitrate": "500k", "fps": 15, "max_height": 480, "audio_bitrate": "64k"},
+    "medium": {"bitrate": "2000k", "fps": 24, "max_height": 720, "audio_bitrate": "96k"},
+    "high": {"bitrate": "5000k", "fps": 30, "max_height": 1080, "audio_bitrate": "128k"},
+}
+
+Source = Union[str, bytes]
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg is missing or failed on the input."""
+
+
+def ffmpeg_exe() -> str:
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception as e:
+        raise FFmpegError(f"ffmpeg not found: {e}") from e
+
+
+def ffprobe_exe() -> Optional[str]:
+    return shutil.which("ffprobe")
+
+
+def _run(args: Sequence[str], timeout: float = COMMAND_TIMEOUT) -> subprocess.CompletedProcess:
+    return subprocess.run(list(args), capture_output=True, timeout=timeout)
+
+
+# --- Metadata ---
+@dataclass
+class VideoInfo:
+    duration: float
+    fps: float
+    width: int
+    height: int
+    codec: str = ""
+    bitrate: int = 0  # bits per second
+    has_audio: bool = False
+
+    @property
+    def frame_count(self) -> int:
+        return int(self.fps * self.duration)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same keys as the moviepy-based VideoProcessor.get_video_info, plus codec details."""
+        return {
+            "duration": self.duration,
+            "fps": self.fps,
+            "resolution": [self.width, self.height],
+            "width": self.width,
+            "height": self.height,
+            "frame_count": self.frame_count,
+            "codec": self.codec,
+            "bitrate": self.bitrate,
+            "has_audio": self.has_audio,
+        }
+
+
+def _rate(value: str) -> float:
+    if "/" in value:
+        num, den = value.split("/", 1)
+        return float(num) / float(den) if float(den) else 0.0
+    return float(value or 0)
+
+
+def parse_ffprobe(output: str) -> VideoInfo:
+    data = json.loads(output)
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None:
+        raise FFmpegError("no video stream")
+    width, height = int(video.get("width", 0)), int(video.get("height", 0))
+    rotation = int(float(video.get("tags", {}).get("rotate", 0) or 0))
+    for side_data in video.get("side_data_list", []):
+        rotation = int(float(side_data.get("rotation", rotation)))
+    if abs(rotation) % 180 == 90:
+        # ffmpeg autorotates decoded frames
+        width, height = height, width
+    fmt = data.get("format", {})
+    return VideoInfo(
+        duration=float(fmt.get("duration") or video.get("duration") or 0),
+        fps=_rate(video.get("avg_frame_rate") or video.get("r_frame_rate") or "0"),
+        width=width,
+        height=height,
+        codec=video.get("codec_name", ""),
+        bitrate=int(fmt.get("bit_rate") or 0),
+        has_audio=any(s.get("codec_type") == "audio" for s in streams),
+    )
+
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):([\d.]+)(?:.*?bitrate: (\d+) kb/s)?")
+_VIDEO_RE = re.compile(r"Stream #.*?Video: (\w+).*?, (\d{2,5})x(\d{2,5})")
+_FPS_RE = re.compile(r"([\d.]+) (?:fps|tbr)")
+_ROTATION_RE = re.compile(r"rotation of (-?[\d.]+) degrees")
+
+
+def parse_ffmpeg_banner(stderr: str) -> VideoInfo:
+    """Metadata from the input summary ``ffmpeg -i`` prints, for installs without ffprobe."""
+    video_line = next((line for line in stderr.splitlines() if _VIDEO_RE.search(line)), None)
+    if video_line is None:
+        raise FFmpegError("no video stream")
+    codec, width, height = _VIDEO_RE.search(video_line).groups()
+    width, height = int(width), int(height)
+    rotation = _ROTATION_RE.search(stderr)
+    if rotation and abs(int(float(rotation.group(1)))) % 180 == 90:
+        width, height = height, width
+    fps = _FPS_RE.search(video_line)
+    duration, bitrate = 0.0, 0
+    match = _DURATION_RE.search(stderr)
+    if match:
+        hours, minutes, seconds, kbps = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        bitrate = int(kbps) * 1000 if kbps else 0
+    return VideoInfo(duration=duration, fps=float(fps.group(1)) if fps else 0.0, width=width, height=height,
+                     codec=codec, bitrate=bitrate, has_audio=" Audio: " in stderr)
+
+
+def probe(path: str) -> VideoInfo:
+    ffprobe = ffprobe_exe()
+    if ffprobe:
+        result = _run([ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path])
+        if result.returncode == 0:
+            return parse_ffprobe(result.stdout.decode("utf-8", errors="replace"))
+    # Without an output file ffmpeg exits non-zero, but still prints the input summary
+    result = _run([ffmpeg_exe(), "-hide_banner", "-i", path])
+    return parse_ffmpeg_banner(result.stderr.decode("utf-8", errors="replace"))
+
+
+# --- Frames ---
+@dataclass
+class VideoFrame:
+    time: float
+    image: Any  # PIL.Image
+
+    def png(self) -> bytes:
+        buffer = BytesIO()
+        self.image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def thumbnail(self, size: Tuple[int, int] = THUMBNAIL_SIZE) -> Any:
+        thumb = self.image.copy()
+        thumb.thumbnail(size)
+        return thumb
+
+
+def frame_size(info: VideoInfo, max_side: Optional[int] = DEFAULT_FRAME_SIDE) -> Tuple[int, int]:
+    """Output size preserving aspect ratio, longest side at most ``max_side``, even dimensions."""
+    width, height = info.width, info.height
+    if max_side and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        width, height = width * scale, height * scale
+    return max(2, int(width) // 2 * 2), max(2, int(height) // 2 * 2)
+
+
+def evenly_spaced(duration: float, count: int) -> List[float]:
+    """``count`` timestamps splitting the clip into equal parts, avoiding the first and last frame."""
+    return [(i + 1) * duration / (count + 1) for i in range(count)]
+
+
+def seek_frame_command(path: str, time: float, size: Tuple[int, int], keyframes_only: bool = True) -> List[str]:
+    args = [ffmpeg_exe(), "-v", "error", "-nostdin"]
+    if keyframes_only:
+        # Land on the keyframe at or before ``time`` and decode nothing else
+        args += ["-noaccurate_seek", "-skip_frame", "nokey"]
+    args += ["-ss", f"{max(0.0, time):.3f}", "-i", path, "-frames:v", "1", "-an",
+             "-vf", f"scale={size[0]}:{size[1]}", "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+    return args
+
+
+def read_frame(path: str, time: float, size: Tuple[int, int], keyframes_only: bool = True) -> Optional[VideoFrame]:
+    from PIL import Image
+
+    result = _run(seek_frame_command(path, time, size, keyframes_only))
+    expected = size[0] * size[1] * 3
+    if result.returncode != 0 or len(result.stdout) < expected:
+        logger.debug(f"No frame at {time:.2f}s: {result.stderr.decode('utf-8', errors='replace')[-200:]}")
+        return None
+    return VideoFrame(time, Image.frombytes("RGB", size, result.stdout[:expected]))
+
+
+def read_frames(path: str, times: Sequence[float], size: Tuple[int, int],
+                keyframes_only: bool = True) -> List[VideoFrame]:
+    """Frames at ``times`` (in order), one short seek-and-decode per frame, run concurrently."""
+    if not times:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_SEEKS, len(times))) as pool:
+        frames = list(pool.map(lambda t: read_frame(path, t, size, keyframes_only), times))
+    return [frame for frame in frames if frame is not None]
+
+
+_SCENE_RE = re.compile(r"pts_time:([\d.]+).*?\n.*?lavfi\.scene_score=([\d.]+)")
+
+
+def parse_scene_scores(stderr: str) -> List[Tuple[float, float]]:
+    """(time, score) pairs from the ``metadata=print`` filter log."""
+    return [(float(t), float(s)) for t, s in _SCENE_RE.findall(stderr)]
+
+
+def scene_changes(path: str, threshold: float = SCENE_THRESHOLD) -> List[Tuple[float, float]]:
+    """Keyframes that start a new scene, from one pass that decodes keyframes only."""
+    args = [ffmpeg_exe(), "-hide_banner", "-nostats", "-nostdin", "-skip_frame", "nokey", "-i", path, "-an",
+            "-vf", f"select='gt(scene,{threshold})',metadata=print:key=lavfi.scene_score",
+            "-vsync", "vfr", "-f", "null", "-"]
+    result = _run(args)
+    if result.returncode != 0:
+        raise FFmpegError(result.stderr.decode("utf-8", errors="replace")[-500:])
+    return parse_scene_scores(result.stderr.decode("utf-8", errors="replace"))
+
+
+def pick_scene_times(scenes: Sequence[Tuple[float, float]], duration: float, count: int) -> List[float]:
+    """The ``count`` strongest scene changes in time order, topped up with evenly spaced times."""
+    strongest = sorted(scenes, key=lambda scene: scene[1], reverse=True)[:count]
+    times = sorted(t for t, _ in strongest)
+    # Too few cuts (a single-shot clip): add the evenly spaced times farthest from those chosen
+    candidates = evenly_spaced(duration, count)
+    while len(times) < count and candidates:
+        best = max(candidates, key=lambda c: min((abs(c - t) for t in times), default=duration))
+        candidates.remove(best)
+        times.append(best)
+    return sorted(times)
+
+
+# --- One-call analysis ---
+@dataclass
+class VideoAnalysis:
+    info: VideoInfo
+    frames: List[VideoFrame] = field(default_factory=list)
+    scene_detection: bool = False
+
+    def thumbnails(self, size: Tuple[int, int] = THUMBNAIL_SIZE) -> List[str]:
+        """PNG data URLs, resized from the extracted frames rather than decoded again."""
+        urls = []
+        for frame in self.frames:
+            buffer = BytesIO()
+            frame.thumbnail(size).save(buffer, format="PNG")
+            urls.append("data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8"))
+        return urls
+
+
+@contextlib.contextmanager
+def _as_path(source: Source, suffix: str = ".mp4") -> Iterator[str]:
+    """A path ffmpeg can seek in; uploaded bytes are written to one temp file for the whole analysis."""
+    if isinstance(source, str):
+        yield source
+        return
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(handle, "wb") as f:
+            f.write(source)
+        yield path
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+
+def analyze_video(source: Source, num_frames: int = 3, scene_detection: bool = False,
+                  max_frame_side: Optional[int] = DEFAULT_FRAME_SIDE, times: Optional[Sequence[float]] = None,
+                  positions: Optional[Sequence[float]] = None, keyframes_only: bool = True,
+                  scene_threshold: float = SCENE_THRESHOLD) -> VideoAnalysis:
+    """Probe once, then read only the frames needed.
+
+    Frames are taken at ``times`` (seconds) or ``positions`` (fractions of
+    the duration) when given, at the strongest scene changes with
+    ``scene_detection``, and evenly spaced otherwise. ``keyframes_only=False``
+    decodes from the keyframe to the exact time.
+    """
+    with _as_path(source) as path:
+        info = probe(path)
+        if times is None and positions is not None:
+            times = [p * info.duration for p in positions]
+        if times is None:
+            if scene_detection and info.duration > 0:
+                times = pick_scene_times(scene_changes(path, scene_threshold), info.duration, num_frames)
+            else:
+                times = evenly_spaced(info.duration, num_frames)
+        # Never seek past the end
+        last = max(0.0, info.duration - 0.1)
+        times = [min(max(0.0, t), last) for t in times]
+        frames = read_frames(path, times, frame_size(info, max_frame_side), keyframes_only)
+    return VideoAnalysis(info, frames, scene_detection)
+
+
+# --- Transcoding ---
+@dataclass
+class TranscodeResult:
+    output: Any  # SpooledTemporaryFile positioned at the start
+    input_bytes: int
+    output_bytes: int
+    seconds: float
+    transcoded: bool = True  # False when the original was smaller and is returned instead
+
+    @property
+    def ratio(self) -> float:
+        """Output size over input size; 0.25 means four times smaller."""
+        return self.output_bytes / self.input_bytes if self.input_bytes else 1.0
+
+    def read(self) -> bytes:
+        self.output.seek(0)
+        return self.output.read()
+
+    def close(self):
+        self.output.close()
+
+
+def _bits(rate: str) -> int:
+    rate = rate.strip().lower()
+    scale = {"k": 1000, "m": 1000 * 1000}.get(rate[-1:], 1)
+    return int(float(rate.rstrip("km")) * scale)
+
+
+def transcode_command(path: str, info: VideoInfo, bitrate: str, fps: float, max_height: int,
+                      audio_bitrate: str = "96k") -> List[str]:
+    """H.264/AAC fragmented MP4 on stdout, never upscaling or raising the frame rate or bitrate."""
+    video_bits = _bits(bitrate)
+    if info.bitrate:
+        video_bits = min(video_bits, info.bitrate)
+    fps = min(fps, info.fps) if info.fps else fps
+    args = [ffmpeg_exe(), "-v", "error", "-nostdin", "-i", path,
+            "-vf", f"scale=-2:'min({max_height},ih)'", "-r", f"{fps:g}",
+            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            "-b:v", str(video_bits), "-maxrate", str(video_bits), "-bufsize", str(2 * video_bits)]
+    if info.has_audio:
+        args += ["-c:a", "aac", "-b:a", audio_bitrate]
+    else:
+        args += ["-an"]
+    # Fragmented MP4 can be written to a pipe (no seeking back to patch the header)
+    args += ["-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4", "-"]
+    return args
+
+
+def transcode(source: Source, quality: str = "medium", bitrate: Optional[str] = None, fps: Optional[float] = None,
+              max_height: Optional[int] = None, keep_smaller_original: bool = True) -> TranscodeResult:
+    """Re-encode to a quality preset (overridable per target), streaming ffmpeg's output into a spooled file.
+
+    When the result is not smaller than the input and ``keep_smaller_original``
+    is set, the original bytes are returned instead.
+    """
+    preset = dict(QUALITY_PRESETS.get(quality, QUALITY_PRESETS["medium"]))
+    start = time.perf_counter()
+    with _as_path(source) as path:
+        info = probe(path)
+        args = transcode_command(path, info, bitrate or preset["bitrate"], fps or preset["fps"],
+                                 max_height or preset["max_height"], preset["audio_bitrate"])
+        input_bytes = os.path.getsize(path)
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        errors: List[bytes] = []
+        # Drain stderr concurrently so a chatty ffmpeg cannot block on a full pipe
+        drain = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+        drain.start()
+        killer = threading.Timer(TRANSCODE_TIMEOUT, process.kill)
+        killer.start()
+        try:
+            for chunk in iter(lambda: process.stdout.read(1024 * 1024), b""):
+                output.write(chunk)
+            returncode = process.wait()
+        finally:
+            killer.cancel()
+            drain.join(timeout=5)
+        if returncode != 0:
+            output.close()
+            detail = b"".join(errors).decode("utf-8", errors="replace")[-500:]
+            raise FFmpegError(f"transcoding failed ({returncode}): {detail}")
+        output_bytes = output.tell()
+        transcoded = True
+        if keep_smaller_original and output_bytes >= input_bytes:
+            output.close()
+            output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+            with open(path, "rb") as original:
+                shutil.copyfileobj(original, output)
+            output_bytes, transcoded = input_bytes, False
+    output.seek(0)
+    result = TranscodeResult(output, input_bytes, output_bytes, time.perf_counter() - start, transcoded)
+    logger.info(f"Transcoded video ({quality}): {input_bytes / 2**20:.1f} MB -> {output_bytes / 2**20:.1f} MB "
+                f"(ratio {result.ratio:.2f}) in {result.seconds:.1f}s")
+    return result
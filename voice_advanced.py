@@ -3,12 +3,14 @@ Advanced Voice & Speech Processing Module
 Handles text-to-speech, speech-to-text, voice profiles, and real-time processing
 """
 
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, Callable
 from dataclasses import dataclass
 from enum import Enum
 import io
 from datetime import datetime
 
+from provider_clients import get_client
+
 
 class VoiceGender(Enum):
     """Voice gender options"""
@@ -69,6 +71,7 @@ class STTConfig:
     enable_profanity_filter: bool = True
     use_context_hints: bool = True
     context_hints: List[str] = None
+    max_parallel_segments: int = 4  # concurrent provider calls for long audio
     
     def __post_init__(self):
         if self.context_hints is None:
@@ -83,6 +86,7 @@ class STTConfig:
             "enable_profanity_filter": self.enable_profanity_filter,
             "use_context_hints": self.use_context_hints,
             "context_hints": self.context_hints,
+            "max_parallel_segments": self.max_parallel_segments,
         }
 
 
@@ -275,9 +279,7 @@ class TextToSpeech:
     def _synthesize_openai(self, text: str, output_format: str) -> Tuple[bytes, Dict]:
         """Synthesize using OpenAI TTS"""
         try:
-            from openai import OpenAI
-            
-            client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+            client = get_client("openai", os.environ.get("OPENAI_API_KEY"))
             
             response = client.audio.speech.create(
                 model="tts-1-hd",
@@ -317,18 +319,21 @@ class SpeechToText:
         self.config = config
         self.transcription_history: List[Dict] = []
     
-    def transcribe(self, audio_file: str) -> Tuple[str, Dict]:
-        """Transcribe audio file to text"""
+    # Audio longer than this is split at silences and sent in parallel
+    SEGMENTED_MIN_SECONDS = 60.0
+    
+    def transcribe(self, audio_file: str, segmented: Optional[bool] = None,
+                   on_partial: Optional[Callable] = None) -> Tuple[str, Dict]:
+        """Transcribe audio file to text
         
-        # Provider-specific transcription
-        if self.config.provider == "google":
-            text, metadata = self._transcribe_google(audio_file)
-        elif self.config.provider == "azure":
-            text, metadata = self._transcribe_azure(audio_file)
-        elif self.config.provider == "openai":
-            text, metadata = self._transcribe_openai(audio_file)
-        else:
-            raise ValueError(f"Unsupported provider: {self.config.provider}")
+        Long audio (or any audio with ``segmented=True``) is split into
+        speech segments that are transcribed concurrently and stitched in
+        order; ``on_partial(done, total, transcript)`` receives each step.
+        """
+        result = None
+        if segmented is not False:
+            result = self._transcribe_segmented(audio_file, bool(segmented), on_partial)
+        text, metadata = result if result is not None else self._transcribe_file(audio_file)
         
         # Apply filters
         if self.config.enable_profanity_filter:
@@ -347,6 +352,66 @@ class SpeechToText:
         
         return text, metadata
     
+    def _transcribe_file(self, audio_file: str) -> Tuple[str, Dict]:
+        """Provider-specific transcription of a whole file"""
+        if self.config.provider == "google":
+            return self._transcribe_google(audio_file)
+        elif self.config.provider == "azure":
+            return self._transcribe_azure(audio_file)
+        elif self.config.provider == "openai":
+            return self._transcribe_openai(audio_file)
+        raise ValueError(f"Unsupported provider: {self.config.provider}")
+    
+    def _transcribe_segmented(self, audio_file: str, force: bool,
+                              on_partial: Optional[Callable]) -> Optional[Tuple[str, Dict]]:
+        """Segmented transcription, or None when the file is short or its length unknown"""
+        from transcription import (AudioDecodeError, SAMPLE_RATE, SAMPLE_WIDTH, audio_duration,
+                                   decode_audio, segment_speech, transcribe_segments)
+        
+        # The header gives the length cheaply; only long files are decoded
+        if not force:
+            duration = audio_duration(audio_file)
+            if duration is None or duration <= self.SEGMENTED_MIN_SECONDS:
+                return None
+        try:
+            with open(audio_file, "rb") as audio_file_obj:
+                pcm = decode_audio(audio_file_obj.read())
+        except AudioDecodeError:
+            if force:
+                raise
+            return None
+        duration = len(pcm) / SAMPLE_WIDTH / SAMPLE_RATE
+        
+        segments = segment_speech(pcm)
+        transcript = transcribe_segments(
+            segments, self._transcribe_segment,
+            max_workers=self.config.max_parallel_segments, on_partial=on_partial,
+        )
+        if not transcript.ok:
+            errors = [p.error for p in transcript.pieces if p.error]
+            raise Exception(f"All {len(segments)} segments failed: {errors[0]}")
+        
+        metadata = {
+            "provider": self.config.provider,
+            "language": self.config.language,
+            "duration": duration,
+            "segments": len(segments),
+            "failed_segments": transcript.failed,
+            "timestamped": transcript.timestamped(),
+        }
+        return transcript.text, metadata
+    
+    def _transcribe_segment(self, segment) -> str:
+        """Send one speech segment to the provider as a WAV file"""
+        import tempfile
+        
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+            tmp.write(segment.wav())
+        try:
+            return self._transcribe_file(tmp.name)[0]
+        finally:
+            os.unlink(tmp.name)
+    
     def _transcribe_google(self, audio_file: str) -> Tuple[str, Dict]:
         """Transcribe using Google Cloud Speech"""
         try:
@@ -359,7 +424,9 @@ class SpeechToText:
             
             audio = speech_v1.RecognitionAudio(content=content)
             config = speech_v1.RecognitionConfig(
-                encoding=speech_v1.RecognitionConfig.AudioEncoding.MP3,
+                encoding=(speech_v1.RecognitionConfig.AudioEncoding.LINEAR16
+                          if audio_file.lower().endswith(".wav")
+                          else speech_v1.RecognitionConfig.AudioEncoding.MP3),
                 language_code=self.config.language,
                 enable_automatic_punctuation=self.config.enable_punctuation,
                 model="default",
@@ -416,9 +483,8 @@ class SpeechToText:
     def _transcribe_openai(self, audio_file: str) -> Tuple[str, Dict]:
         """Transcribe using OpenAI Whisper"""
         try:
-            from openai import OpenAI
-            
-            client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+            # Shared client: segmented transcription reuses its warm connections
+            client = get_client("openai", os.environ.get("OPENAI_API_KEY"))
             
             with open(audio_file, "rb") as audio_file_obj:
                 transcript = client.audio.transcriptions.create(
@@ -552,7 +618,9 @@ class RealTimeAudioProcessor:
         """Get audio level (0-1) for current chunk"""
         try:
             import numpy as np
-            audio_data = np.frombuffer(chunk, dtype=np.int16)
+            audio_data = np.frombuffer(chunk, dtype=np.int16).astype(np.float64)
+            if audio_data.size == 0:
+                return 0.0
             rms = np.sqrt(np.mean(audio_data**2))
             level = min(rms / 32768.0, 1.0)
             return level